@@ -0,0 +1,606 @@
+"""
+Audio analysis helpers for the SPYNNERS backend.
+
+Plain numpy/soundfile code with no FastAPI or Mongo imports, so it can be
+used from request handlers, threads and worker processes alike.
+"""
+import io
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import soxr
+    SOXR_AVAILABLE = True
+except ImportError:
+    SOXR_AVAILABLE = False
+
+# scipy's FFT keeps float32 input in single precision (numpy's always computes in float64)
+try:
+    from scipy import fft as fft_backend
+except ImportError:
+    fft_backend = np.fft
+
+
+# ==================== QUALITY GATE ====================
+
+# Reason codes returned when a snippet is rejected
+REASON_UNDECODABLE = "undecodable"
+REASON_TOO_SHORT = "too_short"
+REASON_SILENCE = "silence"
+REASON_CLIPPED = "clipped"
+REASON_NOISE = "noise"
+
+FRAME_SECONDS = 0.1        # Energy frames used for window selection
+FLATNESS_FFT_SIZE = 2048
+FLATNESS_MAX_FRAMES = 32   # Spectral flatness is estimated on a subset of frames
+CLIP_LEVEL = 0.999         # |sample| at/above this counts as clipped (full scale = 1.0)
+
+
+def decode_audio(audio_data: bytes, max_seconds: float = None):
+    """
+    Decode to mono float32 samples -> (samples, sample_rate). Raises on unsupported formats.
+    With `max_seconds` only the start of the file is decoded.
+    """
+    with sf.SoundFile(io.BytesIO(audio_data)) as f:
+        sample_rate = f.samplerate
+        frames = int(max_seconds * sample_rate) if max_seconds else -1
+        # libsndfile's int16 path is a plain copy for PCM16 input (the float path is ~10x slower)
+        pcm = f.read(frames, dtype="int16", always_2d=True)
+    channels = pcm.shape[1]
+    if channels > 1:
+        samples = pcm.astype(np.float32) @ np.full(channels, 1.0 / (32768 * channels), dtype=np.float32)
+    else:
+        samples = pcm[:, 0].astype(np.float32)
+        samples *= 1.0 / 32768
+    return samples, sample_rate
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Encode mono float samples as 16-bit PCM WAV"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, sample_rate * 2, 2, 16, b"data", len(pcm)
+    )
+    return header + pcm
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """Resample mono float samples with soxr (returned unchanged without soxr)"""
+    if not SOXR_AVAILABLE or sample_rate == target_rate:
+        return samples
+    return soxr.resample(samples, sample_rate, target_rate, quality="MQ")
+
+
+def best_window(samples: np.ndarray, sample_rate: int, window_seconds: float):
+    """(start, end) sample indices of the highest-energy window of `window_seconds`"""
+    window = int(window_seconds * sample_rate)
+    if len(samples) <= window:
+        return 0, len(samples)
+    frame = max(1, int(FRAME_SECONDS * sample_rate))
+    n_frames = len(samples) // frame
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    frames_per_window = min(n_frames, max(1, window // frame))
+    cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+    window_energy = cumulative[frames_per_window:] - cumulative[:-frames_per_window]
+    start = int(np.argmax(window_energy)) * frame
+    return start, min(len(samples), start + window)
+
+
+def rms_dbfs(samples: np.ndarray) -> float:
+    rms = float(np.sqrt(np.dot(samples, samples) / len(samples))) if len(samples) else 0.0
+    return float(20 * np.log10(rms)) if rms > 0 else -120.0
+
+
+def clipping_ratio(samples: np.ndarray) -> float:
+    if not len(samples):
+        return 0.0
+    return float(np.count_nonzero(np.abs(samples) >= CLIP_LEVEL)) / len(samples)
+
+
+def spectral_flatness(samples: np.ndarray) -> float:
+    """Spectral flatness (0 = tonal, 1 = white noise) of the averaged spectrum of evenly spaced frames"""
+    n_frames = len(samples) // FLATNESS_FFT_SIZE
+    if n_frames == 0:
+        return 0.0
+    step = max(1, n_frames // FLATNESS_MAX_FRAMES)
+    frames = samples[:n_frames * FLATNESS_FFT_SIZE].reshape(n_frames, FLATNESS_FFT_SIZE)[::step]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FLATNESS_FFT_SIZE).astype(np.float32), axis=1)) ** 2
+    power = spectrum.mean(axis=0)[1:] + 1e-12  # Welch average, DC dropped
+    return float(np.exp(np.mean(np.log(power))) / np.mean(power))
+
+
+def prepare_sample(audio_data: bytes, window_seconds: float = 12.0, target_rate: int = None,
+                   max_seconds: float = None, check_quality: bool = True, min_seconds: float = 2.0,
+                   min_rms_dbfs: float = -45.0, max_clipping_ratio: float = 0.05,
+                   max_flatness: float = 0.6, workspace: "AudioWorkspace" = None) -> dict:
+    """
+    Decode a snippet, check its quality and cut the payload sent for recognition.
+    An already decoded `workspace` of the same audio is used instead of decoding again.
+
+    Returns {"ok", "reason", "metrics", "audio", "sample_rate", "trimmed",
+    "resampled", "prepared", "decoder", "elapsed_ms"}. When `prepared`,
+    `audio` is the loudest `window_seconds` of the snippet as mono 16-bit WAV
+    at `target_rate` (or the source rate) and `sample_rate` is its rate;
+    otherwise it is the original bytes (also kept for compressed input
+    smaller than that WAV). Formats soundfile can't decode
+    (e.g. AAC/m4a) need a `workspace` decoded by the caller (the server uses
+    ffmpeg, see AudioWorkspace.from_pcm16); without one they pass through
+    unchecked with reason "undecodable".
+    """
+    started = time.perf_counter()
+    report = {"ok": True, "reason": None, "metrics": {}, "audio": audio_data, "sample_rate": None,
+              "trimmed": False, "resampled": False, "prepared": False, "decoder": None, "elapsed_ms": 0.0}
+
+    def done():
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return report
+
+    if workspace is None:
+        try:
+            workspace = AudioWorkspace.decode(audio_data, max_seconds)
+        except Exception:
+            report["reason"] = REASON_UNDECODABLE
+            return done()
+    elif max_seconds:
+        workspace = workspace.head(max_seconds)
+    report["decoder"] = workspace.decoder
+
+    samples, sample_rate = workspace.samples, workspace.sample_rate
+    duration = workspace.duration
+    start, end = workspace.loudest_window(window_seconds)
+    window = samples[start:end]
+
+    metrics = {
+        "duration_s": round(duration, 2),
+        "window_start_s": round(start / sample_rate, 2),
+        "window_s": round(len(window) / sample_rate, 2),
+        "rms_dbfs": round(rms_dbfs(window), 1),
+        "clipping_ratio": round(clipping_ratio(window), 4),
+        "spectral_flatness": round(spectral_flatness(window), 3),
+    }
+    report["metrics"] = metrics
+
+    if check_quality:
+        if duration < min_seconds:
+            report["ok"], report["reason"] = False, REASON_TOO_SHORT
+        elif metrics["rms_dbfs"] < min_rms_dbfs:
+            report["ok"], report["reason"] = False, REASON_SILENCE
+        elif metrics["clipping_ratio"] > max_clipping_ratio:
+            report["ok"], report["reason"] = False, REASON_CLIPPED
+        elif metrics["spectral_flatness"] > max_flatness:
+            report["ok"], report["reason"] = False, REASON_NOISE
+        if not report["ok"]:
+            return done()
+
+    report["trimmed"] = end - start < len(samples)
+    if target_rate and SOXR_AVAILABLE and target_rate != sample_rate:
+        window = resample(window, sample_rate, target_rate)
+        sample_rate = target_rate
+        report["resampled"] = True
+    report["sample_rate"] = sample_rate
+    if report["trimmed"] or report["resampled"]:
+        # Compressed input (AAC, MP3...) may already be smaller than the PCM window
+        wav = encode_wav(window, sample_rate)
+        if len(wav) < len(audio_data):
+            report["audio"] = wav
+            report["prepared"] = True
+    return done()
+
+
+# ==================== STREAMING ====================
+
+SIGNATURE_BANDS = 24
+SIGNATURE_MIN_HZ = 100.0
+SIGNATURE_MAX_HZ = 8000.0
+
+
+def pcm16_to_float(pcm: bytes) -> np.ndarray:
+    """Little-endian 16-bit PCM bytes -> float32 samples"""
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) * (1.0 / 32768)
+
+
+class RingBuffer:
+    """Fixed-size float32 buffer keeping the most recent `capacity` samples"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.write_pos = 0
+        self.size = 0
+        self.total = 0  # Samples written since creation
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        self.total += n
+        if n >= self.capacity:
+            self.buffer[:] = samples[-self.capacity:]
+            self.write_pos = 0
+            self.size = self.capacity
+            return
+        end = self.write_pos + n
+        if end <= self.capacity:
+            self.buffer[self.write_pos:end] = samples
+        else:
+            split = self.capacity - self.write_pos
+            self.buffer[self.write_pos:] = samples[:split]
+            self.buffer[:n - split] = samples[split:]
+        self.write_pos = end % self.capacity
+        self.size = min(self.capacity, self.size + n)
+
+    def latest(self, n: int = None) -> np.ndarray:
+        """The last `n` samples (all buffered by default), oldest first"""
+        n = self.size if n is None else min(n, self.size)
+        start = (self.write_pos - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.buffer[start:start + n].copy()
+        return np.concatenate((self.buffer[start:], self.buffer[:n - (self.capacity - start)]))
+
+
+def band_signature(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Coarse spectral shape (log band energies, unit length) used to tell whether the audio changed"""
+    n_frames = len(samples) // FLATNESS_FFT_SIZE
+    if n_frames == 0:
+        return np.zeros(SIGNATURE_BANDS, dtype=np.float32)
+    step = max(1, n_frames // FLATNESS_MAX_FRAMES)
+    frames = samples[:n_frames * FLATNESS_FFT_SIZE].reshape(n_frames, FLATNESS_FFT_SIZE)[::step]
+    power = (np.abs(np.fft.rfft(frames * np.hanning(FLATNESS_FFT_SIZE).astype(np.float32), axis=1)) ** 2).mean(axis=0)
+    freqs = np.fft.rfftfreq(FLATNESS_FFT_SIZE, 1.0 / sample_rate)
+    edges = np.geomspace(SIGNATURE_MIN_HZ, min(SIGNATURE_MAX_HZ, sample_rate / 2), SIGNATURE_BANDS + 1)
+    bins = np.searchsorted(edges, freqs) - 1
+    valid = (bins >= 0) & (bins < SIGNATURE_BANDS)
+    bands = np.bincount(bins[valid], weights=power[valid], minlength=SIGNATURE_BANDS)
+    # Bands more than 30 dB under the loudest are floored so background noise doesn't dominate
+    signature = np.log10(np.maximum(bands, bands.max() * 1e-3 + 1e-12))
+    signature -= signature.mean()
+    norm = np.linalg.norm(signature)
+    return (signature / norm).astype(np.float32) if norm > 0 else signature.astype(np.float32)
+
+
+def signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """0 = same spectral shape, up to 2 = opposite"""
+    return float(1.0 - np.dot(a, b))
+
+
+# ==================== WORKSPACE ====================
+
+# A track is decoded once into an AudioWorkspace and every stage (quality
+# gate, recognition sample, tempo/key analysis, waveform) reads from it.
+# Derived views are computed on first use and cached on the workspace.
+WAVEFORM_POINTS = 200
+
+
+def frame_view(samples: np.ndarray, size: int, hop: int) -> np.ndarray:
+    """Overlapping frames of `size` samples every `hop`, as a read-only view (frames x size)"""
+    if len(samples) < size:
+        return np.zeros((0, size), dtype=samples.dtype)
+    return np.lib.stride_tricks.sliding_window_view(samples, size)[::hop]
+
+
+def stft_magnitude(samples: np.ndarray, fft_size: int, hop: int) -> np.ndarray:
+    """Magnitude spectrogram, frames x bins (no padding: trailing samples are dropped)"""
+    frames = frame_view(samples, fft_size, hop)
+    if not len(frames):
+        return np.zeros((0, fft_size // 2 + 1), dtype=np.float32)
+    return np.abs(fft_backend.rfft(frames * np.hanning(fft_size).astype(np.float32), axis=1)).astype(np.float32)
+
+
+class AudioWorkspace:
+    """Mono float32 samples of one decoded file plus lazily computed, cached views of them"""
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, decoder: str = "soundfile"):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.decoder = decoder
+        self.decode_ms = 0.0
+        self.views = {}
+
+    @classmethod
+    def decode(cls, audio_data: bytes, max_seconds: float = None) -> "AudioWorkspace":
+        """Decode (the first `max_seconds` of) a file. Raises on unsupported formats."""
+        started = time.perf_counter()
+        workspace = cls(*decode_audio(audio_data, max_seconds))
+        workspace.decode_ms = round((time.perf_counter() - started) * 1000, 2)
+        return workspace
+
+    @classmethod
+    def from_pcm16(cls, pcm: bytes, sample_rate: int, decoder: str = "ffmpeg") -> "AudioWorkspace":
+        """Workspace of mono 16-bit PCM decoded elsewhere (ffmpeg for m4a/AAC, webm...)"""
+        return cls(pcm16_to_float(pcm[:len(pcm) - len(pcm) % 2]), sample_rate, decoder)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate if self.sample_rate else 0.0
+
+    def view(self, key, compute):
+        if key not in self.views:
+            self.views[key] = compute()
+        return self.views[key]
+
+    def head(self, seconds: float) -> "AudioWorkspace":
+        """The first `seconds` as a workspace sharing this buffer (views are cached per head)"""
+        if not seconds or seconds >= self.duration:
+            return self
+        return self.view(("head", seconds), lambda: AudioWorkspace(
+            self.samples[:int(seconds * self.sample_rate)], self.sample_rate, self.decoder))
+
+    def resampled(self, rate: int):
+        """(samples, sample_rate) at `rate` - the source rate when soxr is unavailable"""
+        if rate == self.sample_rate or not SOXR_AVAILABLE:
+            return self.samples, self.sample_rate
+        return self.view(("rate", rate), lambda: (resample(self.samples, self.sample_rate, rate), rate))
+
+    def frames(self, size: int, hop: int, rate: int = None) -> np.ndarray:
+        samples, _ = self.resampled(rate) if rate else (self.samples, self.sample_rate)
+        return frame_view(samples, size, hop)
+
+    def stft(self, fft_size: int, hop: int, rate: int = None) -> np.ndarray:
+        """Magnitude spectrogram at `rate` (source rate by default), frames x bins"""
+        return self.view(("stft", rate, fft_size, hop), lambda: stft_magnitude(
+            self.resampled(rate)[0] if rate else self.samples, fft_size, hop))
+
+    def loudest_window(self, seconds: float):
+        """(start, end) sample indices of the highest-energy `seconds`"""
+        return self.view(("window", seconds), lambda: best_window(self.samples, self.sample_rate, seconds))
+
+    def waveform(self, points: int = WAVEFORM_POINTS) -> list:
+        """Peak level (0-1) of `points` equal slices of the audio, for drawing"""
+        def compute():
+            usable = len(self.samples) // points * points
+            if not usable:
+                return []
+            peaks = np.abs(self.samples[:usable]).reshape(points, -1).max(axis=1)
+            return [round(float(p), 3) for p in np.minimum(peaks, 1.0)]
+        return self.view(("waveform", points), compute)
+
+
+# ==================== TRACK ANALYSIS ====================
+
+# Tempo, key and energy of a whole track, tuned for electronic music: one
+# decode at a low rate, one STFT for the onset envelope and one for chroma.
+TRACK_SAMPLE_RATE = 11025
+TRACK_MAX_SECONDS = 120.0
+ONSET_FFT_SIZE = 1024
+ONSET_HOP = 128            # ~86 envelope frames per second at TRACK_SAMPLE_RATE
+ONSET_SMOOTHING = np.hanning(7)[1:-1] / np.hanning(7)[1:-1].sum()
+CHROMA_FFT_SIZE = 4096     # ~2.7 Hz bins, fine enough to separate semitones above CHROMA_MIN_HZ
+CHROMA_HOP = 2048
+CHROMA_MIN_HZ = 100.0
+CHROMA_MAX_HZ = 2000.0
+TEMPO_MIN_BPM = 88.0       # One octave: every tempo has a single candidate in range,
+TEMPO_MAX_BPM = 176.0      # and drum & bass (172-176) is not halved
+TEMPO_PRIOR_BPM = 125.0    # Ties between metrical levels go to the one nearest this
+TEMPO_PRIOR_OCTAVES = 0.7
+TEMPO_REFINE_BEATS = 8     # Lag resolution is refined on the peak 8 beats (two bars) away
+
+PITCH_CLASSES = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Energy levels used by the upload form, with the score each one starts at
+ENERGY_LEVELS = [("low", 0.0), ("medium", 0.4), ("high", 0.6), ("very_high", 0.8)]
+ENERGY_MIN_DBFS = -24.0
+ENERGY_MAX_DBFS = -6.0
+
+
+def onset_envelope(magnitude: np.ndarray) -> np.ndarray:
+    """Spectral flux of the log-compressed spectrogram (rises in energy, summed over bins)"""
+    if len(magnitude) < 2:
+        return np.zeros(0, dtype=np.float32)
+    compressed = np.log1p(100.0 * magnitude)
+    flux = np.maximum(np.diff(compressed, axis=0), 0.0).sum(axis=1)
+    # Light smoothing (~50 ms) so autocorrelation peaks are wider than one lag step
+    return np.convolve(flux, ONSET_SMOOTHING, mode="same").astype(np.float32)
+
+
+def autocorrelation(envelope: np.ndarray) -> np.ndarray:
+    """Autocorrelation of the mean-removed envelope via FFT, normalised so lag 0 = 1"""
+    envelope = envelope - envelope.mean()
+    size = 1 << int(2 * len(envelope) - 1).bit_length()
+    spectrum = np.fft.rfft(envelope, size)
+    corr = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, size)[:len(envelope)]
+    return corr / corr[0] if corr[0] > 0 else corr
+
+
+def peak_lag(corr: np.ndarray, low: int, high: int) -> float:
+    """Fractional lag of the highest autocorrelation value in [low, high] (parabolic interpolation)"""
+    low, high = max(1, low), min(len(corr) - 2, high)
+    lag = low + int(np.argmax(corr[low:high + 1]))
+    a, b, c = corr[lag - 1], corr[lag], corr[lag + 1]
+    denominator = a - 2 * b + c
+    return lag + (0.5 * (a - c) / denominator if denominator < 0 else 0.0)
+
+
+def estimate_tempo(envelope: np.ndarray, frame_rate: float, min_bpm: float = TEMPO_MIN_BPM,
+                   max_bpm: float = TEMPO_MAX_BPM):
+    """
+    Tempo from the onset envelope -> (bpm, confidence 0-1), (None, 0.0) without a beat.
+    Each beat period in range is scored by its autocorrelation plus that at
+    two beats and at one bar (so a dotted period that lines up with
+    off-beat hats loses), weighted by a log-normal prior around TEMPO_PRIOR_BPM.
+    """
+    if len(envelope) < frame_rate * 60 / min_bpm * 4:
+        return None, 0.0
+    corr = autocorrelation(envelope)
+    lags = np.arange(int(frame_rate * 60 / max_bpm), int(np.ceil(frame_rate * 60 / min_bpm)) + 1)
+    lags = lags[lags * 4 < len(corr)]
+    if not len(lags):
+        return None, 0.0
+    scores = corr[lags] + corr[lags * 2] + corr[lags * 4]
+    prior = np.exp(-0.5 * (np.log2(frame_rate * 60 / lags / TEMPO_PRIOR_BPM) / TEMPO_PRIOR_OCTAVES) ** 2)
+    best = int(lags[np.argmax(np.maximum(scores, 0.0) * prior)])
+    confidence = float(np.clip(corr[best], 0.0, 1.0))
+    if confidence <= 0:
+        return None, 0.0
+    # A one-frame error at lag ~40 is ~3 BPM; measuring the period over several beats divides that
+    lag = peak_lag(corr, best - 1, best + 1)
+    for beats in (TEMPO_REFINE_BEATS, 4, 2):
+        if (best + 1) * beats + 1 < len(corr):
+            lag = peak_lag(corr, (best - 1) * beats, (best + 1) * beats) / beats
+            break
+    bpm = frame_rate * 60 / lag
+    # The lag grid spills a little past the range edges: fold those back by octaves
+    while bpm > max_bpm * 1.01 and bpm / 2 >= min_bpm:
+        bpm /= 2
+    while bpm < min_bpm * 0.99 and bpm * 2 <= max_bpm:
+        bpm *= 2
+    return round(float(bpm), 1), round(confidence, 3)
+
+
+def chroma_profile(magnitude: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Average pitch class distribution (12 values, C first) of a CHROMA_FFT_SIZE spectrogram, each frame normalised"""
+    freqs = np.fft.rfftfreq(CHROMA_FFT_SIZE, 1.0 / sample_rate)
+    band = (freqs >= CHROMA_MIN_HZ) & (freqs <= CHROMA_MAX_HZ)
+    pitch_class = np.round(12 * np.log2(freqs[band] / 440.0) + 69).astype(int) % 12
+    # frames x 12: sum the bins of each pitch class (one matrix product for all frames)
+    mapping = np.zeros((band.sum(), 12), dtype=np.float32)
+    mapping[np.arange(len(pitch_class)), pitch_class] = 1.0
+    chroma = np.sqrt(magnitude[:, band]) @ mapping
+    totals = chroma.sum(axis=1, keepdims=True)
+    chroma = chroma[totals[:, 0] > 0] / totals[totals[:, 0] > 0]
+    return chroma.mean(axis=0) if len(chroma) else np.zeros(12, dtype=np.float32)
+
+
+def camelot(tonic: int, minor: bool) -> str:
+    """Camelot wheel code of a key (C major = 8B, A minor = 8A)"""
+    relative_major = (tonic + 3) % 12 if minor else tonic
+    return f"{(7 * relative_major + 7) % 12 + 1}{'A' if minor else 'B'}"
+
+
+def estimate_key(chroma: np.ndarray):
+    """Best matching key -> (tonic pitch class, minor, correlation), None for a flat profile"""
+    if not chroma.any() or np.allclose(chroma, chroma[0]):
+        return None
+    # Correlate against all 24 rotations of the two profiles at once
+    rotations = np.arange(12)[None, :] - np.arange(12)[:, None]  # [tonic, pitch class]
+    profiles = np.concatenate((MAJOR_PROFILE[rotations % 12], MINOR_PROFILE[rotations % 12]))
+    profiles = profiles - profiles.mean(axis=1, keepdims=True)
+    centred = chroma - chroma.mean()
+    scores = profiles @ centred / (np.linalg.norm(profiles, axis=1) * np.linalg.norm(centred))
+    best = int(np.argmax(scores))
+    return best % 12, best >= 12, float(scores[best])
+
+
+def energy_score(samples: np.ndarray, bpm) -> float:
+    """0-1 energy: mostly loudness of the analysed audio, partly tempo"""
+    loudness = (rms_dbfs(samples) - ENERGY_MIN_DBFS) / (ENERGY_MAX_DBFS - ENERGY_MIN_DBFS)
+    pace = (bpm - TEMPO_MIN_BPM) / (TEMPO_MAX_BPM - TEMPO_MIN_BPM) if bpm else 0.0
+    return float(np.clip(0.7 * np.clip(loudness, 0.0, 1.0) + 0.3 * np.clip(pace, 0.0, 1.0), 0.0, 1.0))
+
+
+def energy_level(score: float) -> str:
+    level = ENERGY_LEVELS[0][0]
+    for name, threshold in ENERGY_LEVELS:
+        if score >= threshold:
+            level = name
+    return level
+
+
+def analyze_workspace(workspace: AudioWorkspace, min_bpm: float = TEMPO_MIN_BPM,
+                      max_bpm: float = TEMPO_MAX_BPM) -> dict:
+    """Tempo, key and energy of decoded audio, see analyze_track"""
+    _, sample_rate = workspace.resampled(TRACK_SAMPLE_RATE)
+    envelope = onset_envelope(workspace.stft(ONSET_FFT_SIZE, ONSET_HOP, TRACK_SAMPLE_RATE))
+    bpm, bpm_confidence = estimate_tempo(envelope, sample_rate / ONSET_HOP, min_bpm, max_bpm)
+    key = estimate_key(chroma_profile(workspace.stft(CHROMA_FFT_SIZE, CHROMA_HOP, TRACK_SAMPLE_RATE), sample_rate))
+    score = energy_score(workspace.samples, bpm)
+    return {
+        "bpm": bpm,
+        "bpm_confidence": bpm_confidence,
+        "key": camelot(key[0], key[1]) if key else None,
+        "key_name": f"{PITCH_CLASSES[key[0]]} {'minor' if key[1] else 'major'}" if key else None,
+        "key_confidence": round(key[2], 3) if key else 0.0,
+        "energy": round(score, 3),
+        "energy_level": energy_level(score),
+        "duration_s": round(workspace.duration, 2),
+    }
+
+
+def analyze_track(audio_data: bytes, max_seconds: float = TRACK_MAX_SECONDS,
+                  min_bpm: float = TEMPO_MIN_BPM, max_bpm: float = TEMPO_MAX_BPM) -> dict:
+    """
+    Decode the first `max_seconds` of a track and estimate its tempo, key and energy.
+
+    Returns {"bpm", "bpm_confidence", "key", "key_name", "key_confidence",
+    "energy", "energy_level", "duration_s", "elapsed_ms"}; `key` is a
+    Camelot code ("8A") and `energy_level` one of low/medium/high/very_high,
+    as on the upload form. Raises when soundfile can't decode the format.
+    """
+    started = time.perf_counter()
+    result = analyze_workspace(AudioWorkspace.decode(audio_data, max_seconds), min_bpm, max_bpm)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def ingest_track(audio_data: bytes, max_seconds: float = TRACK_MAX_SECONDS, analysis_seconds: float = None,
+                 sample_options: dict = None, waveform_points: int = WAVEFORM_POINTS) -> dict:
+    """
+    Everything the upload flow needs from one decode of the first
+    `max_seconds` of a track -> {"analysis" (see analyze_track, on the first
+    `analysis_seconds` or all decoded audio), "sample" (prepare_sample report
+    with `sample_options`, None without), "waveform" (of the decoded audio),
+    "duration_s" (decoded), "decode_ms", "elapsed_ms"}.
+    Raises when soundfile can't decode the format.
+    """
+    started = time.perf_counter()
+    workspace = AudioWorkspace.decode(audio_data, max_seconds)
+    analysis = analyze_workspace(workspace.head(analysis_seconds))
+    sample = prepare_sample(audio_data, workspace=workspace, **sample_options) if sample_options is not None else None
+    return {
+        "analysis": analysis,
+        "sample": sample,
+        "waveform": workspace.waveform(waveform_points),
+        "duration_s": round(workspace.duration, 2),
+        "decode_ms": workspace.decode_ms,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+# ==================== WORKER POOL ====================
+
+# CPU-heavy analysis runs in a process pool (see the AUDIO ANALYSIS POOL
+# section of server.py); these functions are the jobs and the worker setup.
+LIBROSA_MAX_SECONDS = 60.0
+
+
+def warm_up_worker():
+    """
+    Process pool initializer: import librosa and run beat tracking once on a
+    synthetic click track, so numba compiles its kernels before the first job
+    """
+    try:
+        import librosa
+    except ImportError:
+        return
+    sample_rate = 22050
+    clicks = np.zeros(sample_rate * 4, dtype=np.float32)
+    clicks[::sample_rate // 2] = 1.0  # 120 BPM
+    librosa.beat.beat_track(y=clicks, sr=sample_rate)
+
+
+def worker_ready() -> int:
+    return os.getpid()
+
+
+def librosa_bpm(audio_data: bytes, max_seconds: float = LIBROSA_MAX_SECONDS):
+    """librosa tempo estimate (BPM) of the first `max_seconds` of a file, None if undetected"""
+    import librosa
+    try:
+        samples, sample_rate = decode_audio(audio_data, max_seconds)
+    except Exception:
+        # Formats libsndfile can't read go through librosa's own loader, which needs a path
+        with tempfile.NamedTemporaryFile(suffix=".audio") as tmp_file:
+            tmp_file.write(audio_data)
+            tmp_file.flush()
+            samples, sample_rate = librosa.load(tmp_file.name, sr=None, duration=max_seconds)
+    tempo, _ = librosa.beat.beat_track(y=samples, sr=sample_rate)
+    tempo = np.atleast_1d(tempo)
+    return float(tempo[0]) if len(tempo) and tempo[0] > 0 else None
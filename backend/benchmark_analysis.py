@@ -0,0 +1,229 @@
+"""
+Benchmark of the track analyzer (audio_analysis.analyze_track) against
+librosa.beat.beat_track: tempo accuracy, key accuracy and time per track.
+
+    python benchmark_analysis.py                      # synthetic corpus, 24 tracks
+    python benchmark_analysis.py --corpus ./fixtures  # real tracks + manifest.csv
+
+A corpus directory holds audio files and a manifest.csv with the columns
+file,bpm,key (key as a Camelot code such as 8A, may be empty). Without
+--corpus a synthetic corpus of electronic patterns (kick, hats, clap, bass,
+chord pads) with known tempo and key is generated in a temporary directory.
+librosa is optional: without it only the analyzer is measured.
+"""
+import argparse
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+import audio_analysis
+
+try:
+    import librosa  # noqa: F401 - imported here so its import time isn't measured
+    LIBROSA_AVAILABLE = True
+except ImportError:
+    LIBROSA_AVAILABLE = False
+
+SYNTH_SAMPLE_RATE = 44100
+SYNTH_TEMPOS = [118, 120, 122, 124, 125, 126, 128, 130, 132, 135, 138, 140, 145, 150, 160, 174]
+TEMPO_TOLERANCE = 0.04  # MIREX tempo tolerance: within 4% of the reference
+# Chord roots (semitones above the tonic) of a four-bar progression
+MAJOR_PROGRESSION = [(0, False), (5, False), (0, False), (7, False)]  # I - IV - I - V
+MINOR_PROGRESSION = [(0, True), (8, False), (0, True), (10, False)]   # i - VI - i - VII
+
+
+# ==================== SYNTHETIC CORPUS ====================
+
+def decaying(length: int, seconds: float, sample_rate: int) -> np.ndarray:
+    return np.exp(-np.arange(length) / (seconds * sample_rate))
+
+
+def tone(freq: float, length: int, sample_rate: int, partials: int = 3) -> np.ndarray:
+    t = np.arange(length) / sample_rate
+    return sum(np.sin(2 * np.pi * freq * k * t) / k for k in range(1, partials + 1))
+
+
+def synth_track(bpm: float, tonic: int, minor: bool, seconds: float, rng: np.random.Generator) -> np.ndarray:
+    """A four-on-the-floor loop at `bpm` whose harmony stays in the given key"""
+    sr = SYNTH_SAMPLE_RATE
+    out = np.zeros(int(seconds * sr))
+    beat = 60.0 / bpm
+    n_beats = int(seconds / beat)
+
+    kick_len = int(0.25 * sr)
+    t = np.arange(kick_len) / sr
+    kick = np.sin(2 * np.pi * (50 * t + 60 * 0.04 * (1 - np.exp(-t / 0.04)))) * decaying(kick_len, 0.08, sr)
+    hat_len = int(0.05 * sr)
+    clap_len = int(0.15 * sr)
+
+    def add(signal, start_s):
+        start = int(start_s * sr)
+        end = min(len(out), start + len(signal))
+        if start < end:
+            out[start:end] += signal[:end - start]
+
+    for i in range(n_beats):
+        at = i * beat
+        add(0.9 * kick, at)
+        add(0.15 * np.diff(rng.standard_normal(hat_len + 1)) * decaying(hat_len, 0.01, sr), at + beat / 2)
+        if i % 2 == 1:
+            add(0.25 * rng.standard_normal(clap_len) * decaying(clap_len, 0.03, sr), at)
+
+    progression = MINOR_PROGRESSION if minor else MAJOR_PROGRESSION
+    bar = 4 * beat
+    for b in range(int(seconds / bar) + 1):
+        root, chord_minor = progression[b % len(progression)]
+        root_pc = (tonic + root) % 12
+        chord = [root_pc, root_pc + (3 if chord_minor else 4), root_pc + 7]
+        pad_len = int(bar * sr)
+        pad = sum(tone(261.63 * 2 ** (pc / 12), pad_len, sr) for pc in chord)
+        add(0.06 * pad * np.minimum(1.0, np.arange(pad_len) / (0.05 * sr)), b * bar)
+        bass_len = int(beat / 2 * sr)
+        bass = tone(65.41 * 2 ** (root_pc / 12), bass_len, sr, partials=2) * decaying(bass_len, 0.12, sr)
+        for i in range(4):
+            add(0.3 * bass, b * bar + i * beat + beat / 2)
+
+    return (out / np.max(np.abs(out)) * 0.8).astype(np.float32)
+
+
+def synthetic_corpus(directory: str, count: int, seconds: float, seed: int) -> list:
+    """Write `count` synthetic tracks as WAV into `directory` -> manifest rows"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(count):
+        bpm = float(SYNTH_TEMPOS[i % len(SYNTH_TEMPOS)])
+        tonic, minor = int(rng.integers(12)), bool(rng.integers(2))
+        samples = synth_track(bpm, tonic, minor, seconds, rng)
+        filename = f"synth_{i:02d}_{int(bpm)}bpm_{audio_analysis.camelot(tonic, minor)}.wav"
+        sf.write(os.path.join(directory, filename), samples, SYNTH_SAMPLE_RATE, subtype="PCM_16")
+        rows.append({"file": filename, "bpm": bpm, "key": audio_analysis.camelot(tonic, minor)})
+    return rows
+
+
+def load_manifest(directory: str) -> list:
+    with open(os.path.join(directory, "manifest.csv"), newline="") as f:
+        return [
+            {"file": row["file"], "bpm": float(row["bpm"]), "key": (row.get("key") or "").strip().upper() or None}
+            for row in csv.DictReader(f)
+        ]
+
+
+# ==================== MEASUREMENT ====================
+
+def tempo_correct(estimate, reference: float, octave_errors: bool = False) -> bool:
+    if not estimate:
+        return False
+    factors = (1.0, 2.0, 0.5, 3.0, 1 / 3) if octave_errors else (1.0,)
+    return any(abs(estimate - reference * factor) <= TEMPO_TOLERANCE * reference * factor for factor in factors)
+
+
+def key_neighbours(code: str) -> set:
+    """The key itself, its relative and its two fifths on the Camelot wheel"""
+    number, mode = int(code[:-1]), code[-1]
+    return {code, f"{number}{'B' if mode == 'A' else 'A'}",
+            f"{number % 12 + 1}{mode}", f"{(number - 2) % 12 + 1}{mode}"}
+
+
+def measure(name: str, fn, tracks: list, max_seconds: float, repeat: int) -> dict:
+    estimates, times = [], []
+    for track in tracks:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            estimate = fn(track["audio"], max_seconds)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        estimates.append(estimate)
+        times.append(best * 1000)
+    return {"name": name, "estimates": estimates, "times_ms": times}
+
+
+def summarize(run: dict, tracks: list) -> dict:
+    bpms = [e["bpm"] if isinstance(e, dict) else e for e in run["estimates"]]
+    references = [t["bpm"] for t in tracks]
+    errors = [abs(b - r) for b, r in zip(bpms, references) if b]
+    summary = {
+        "method": run["name"],
+        "acc1": sum(tempo_correct(b, r) for b, r in zip(bpms, references)) / len(tracks),
+        "acc2": sum(tempo_correct(b, r, octave_errors=True) for b, r in zip(bpms, references)) / len(tracks),
+        "exact_bpm": sum(bool(b) and round(b) == round(r) for b, r in zip(bpms, references)) / len(tracks),
+        "mean_abs_error": statistics.mean(errors) if errors else None,
+        "median_ms": statistics.median(run["times_ms"]),
+        "p95_ms": sorted(run["times_ms"])[max(0, int(round(0.95 * len(run["times_ms"]))) - 1)],
+    }
+    keyed = [(e, t["key"]) for e, t in zip(run["estimates"], tracks) if isinstance(e, dict) and t["key"]]
+    if keyed:
+        summary["key_exact"] = sum(e["key"] == key for e, key in keyed) / len(keyed)
+        summary["key_related"] = sum(e["key"] in key_neighbours(key) for e, key in keyed) / len(keyed)
+    return summary
+
+
+def print_report(summaries: list, tracks: list, runs: list, verbose: bool):
+    if verbose:
+        header = f"{'file':<36} {'ref':>6} " + " ".join(f"{run['name']:>10}" for run in runs)
+        print(header)
+        for i, track in enumerate(tracks):
+            values = []
+            for run in runs:
+                estimate = run["estimates"][i]
+                bpm = estimate["bpm"] if isinstance(estimate, dict) else estimate
+                values.append(f"{bpm:>10.1f}" if bpm else f"{'-':>10}")
+            print(f"{track['file'][:36]:<36} {track['bpm']:>6.1f} " + " ".join(values))
+        print()
+    print(f"{len(tracks)} tracks, tempo tolerance {TEMPO_TOLERANCE:.0%}")
+    print(f"{'method':<10} {'acc1':>6} {'acc2':>6} {'exact':>6} {'mae':>6} {'key':>6} {'key~':>6} {'med ms':>8} {'p95 ms':>8}")
+    for s in summaries:
+        mae = f"{s['mean_abs_error']:.2f}" if s["mean_abs_error"] is not None else "-"
+        key_exact = f"{s['key_exact']:.0%}" if "key_exact" in s else "-"
+        key_related = f"{s['key_related']:.0%}" if "key_related" in s else "-"
+        print(f"{s['method']:<10} {s['acc1']:>6.0%} {s['acc2']:>6.0%} {s['exact_bpm']:>6.0%} {mae:>6} "
+              f"{key_exact:>6} {key_related:>6} {s['median_ms']:>8.1f} {s['p95_ms']:>8.1f}")
+    by_method = {s["method"]: s for s in summaries}
+    if "librosa" in by_method:
+        speedup = by_method["librosa"]["median_ms"] / by_method["analyzer"]["median_ms"]
+        print(f"\nanalyzer is {speedup:.1f}x faster than librosa (median)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directory with audio files and manifest.csv (file,bpm,key)")
+    parser.add_argument("--tracks", type=int, default=24, help="synthetic tracks to generate")
+    parser.add_argument("--track-seconds", type=float, default=60.0, help="length of synthetic tracks")
+    parser.add_argument("--seconds", type=float, default=60.0, help="audio analysed per track by both methods")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per track, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-librosa", action="store_true", help="only measure the analyzer")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print per-track estimates")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.corpus or tmp_dir
+        if args.corpus:
+            tracks = load_manifest(directory)
+        else:
+            print(f"Generating {args.tracks} synthetic tracks...")
+            tracks = synthetic_corpus(directory, args.tracks, args.track_seconds, args.seed)
+        for track in tracks:
+            with open(os.path.join(directory, track["file"]), "rb") as f:
+                track["audio"] = f.read()
+
+    # Warm-up outside the measurements (librosa compiles its numba kernels on first use)
+    audio_analysis.analyze_track(tracks[0]["audio"], args.seconds)
+    runs = [measure("analyzer", audio_analysis.analyze_track, tracks, args.seconds, args.repeat)]
+    if LIBROSA_AVAILABLE and not args.no_librosa:
+        audio_analysis.warm_up_worker()
+        runs.insert(0, measure("librosa", audio_analysis.librosa_bpm, tracks, args.seconds, args.repeat))
+    elif not args.no_librosa:
+        print("librosa is not installed: measuring the analyzer only", file=sys.stderr)
+
+    print_report([summarize(run, tracks) for run in runs], tracks, runs, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,47 +8,187 @@ SPYNNERS Backend Server
 """
 
 import os
+import re
+import asyncio
+import importlib.util
+import multiprocessing
 import base64
 import hashlib
 import hmac
 import time
 import json
 import uuid
+import shutil
+import struct
 import tempfile
-from datetime import datetime
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
 from typing import Optional, List
 from io import BytesIO
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Depends, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
+from starlette.requests import ClientDisconnect
 import httpx
 
 # For MP3 metadata extraction
 try:
-    from mutagen.mp3 import MP3
+    from mutagen.mp3 import MP3, MPEGInfo
     from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TCON, TBPM
-    from mutagen.easyid3 import EasyID3
+    import mutagen
     MUTAGEN_AVAILABLE = True
 except ImportError:
     MUTAGEN_AVAILABLE = False
     print("Warning: mutagen not available, MP3 metadata extraction disabled")
 
-# For automatic BPM detection
+# For cover art thumbnails
 try:
-    import librosa
-    LIBROSA_AVAILABLE = True
+    from PIL import Image
+    PIL_AVAILABLE = True
 except ImportError:
-    LIBROSA_AVAILABLE = False
+    PIL_AVAILABLE = False
+    print("Warning: Pillow not available, cover art is stored without resizing")
+
+# For automatic BPM detection - librosa is only imported by the analysis
+# worker processes (see AUDIO ANALYSIS POOL), never by the web process
+LIBROSA_AVAILABLE = importlib.util.find_spec("librosa") is not None
+if not LIBROSA_AVAILABLE:
     print("Warning: librosa not available, automatic BPM detection disabled")
 
+# For the audio quality gate (numpy + soundfile)
+try:
+    import audio_analysis
+    AUDIO_ANALYSIS_AVAILABLE = True
+except ImportError:
+    AUDIO_ANALYSIS_AVAILABLE = False
+    print("Warning: numpy/soundfile not available, audio quality gate disabled")
+
+# For fast (C-backed) fuzzy title matching - difflib is used as a fallback
+try:
+    from rapidfuzz import fuzz
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+    print("Warning: rapidfuzz not available, title matching will use difflib")
+
+# For HTTP/2 on the pooled upstream clients
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    print("Warning: h2 not available, upstream HTTP clients will use HTTP/1.1")
+
 load_dotenv()
 
-app = FastAPI(title="SPYNNERS API", version="1.0.0")
+
+# ==================== UPSTREAM HTTP CLIENTS ====================
+# One long-lived httpx client per upstream, so requests reuse keep-alive
+# connections instead of paying a TCP + TLS handshake on every call.
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# Per-upstream settings - each can be overridden with <UPSTREAM>_TIMEOUT,
+# <UPSTREAM>_HTTP2 and <UPSTREAM>_MAX_CONNECTIONS (e.g. ACRCLOUD_TIMEOUT=10)
+UPSTREAM_DEFAULTS = {
+    "acrcloud": {"timeout": 30.0, "http2": False},  # identify API is HTTP/1.1 only
+    "base44": {"timeout": 30.0, "http2": True},     # app.base44.com / api.base44.com
+    "spynners": {"timeout": 30.0, "http2": True},   # spynners.com / spynners.base44.app
+    "google": {"timeout": 10.0, "http2": True},     # maps.googleapis.com
+    "media": {"timeout": 60.0, "http2": True},      # track audio files (audio_url), downloaded for analysis
+}
+
+http_clients = {}
+
+
+def get_upstream_config(upstream: str) -> dict:
+    """Resolve timeout / HTTP2 / pool size for an upstream from env + defaults"""
+    defaults = UPSTREAM_DEFAULTS[upstream]
+    prefix = upstream.upper()
+    return {
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", defaults["timeout"])),
+        "http2": os.getenv(f"{prefix}_HTTP2", str(defaults["http2"])).lower() == "true" and HTTP2_AVAILABLE,
+        "max_connections": int(os.getenv(f"{prefix}_MAX_CONNECTIONS", HTTP_POOL_MAX_CONNECTIONS)),
+    }
+
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream, creating it on first use"""
+    http_client = http_clients.get(upstream)
+    if http_client is None or http_client.is_closed:
+        config = get_upstream_config(upstream)
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config["timeout"], connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=config["max_connections"],
+                max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            http2=config["http2"],
+        )
+        http_clients[upstream] = http_client
+    return http_client
+
+
+@asynccontextmanager
+async def upstream_client(upstream: str):
+    """
+    Borrow the pooled client for an upstream.
+    Unlike `async with httpx.AsyncClient()`, leaving the block keeps the
+    connections open for the next request.
+    """
+    yield get_http_client(upstream)
+
+
+async def close_http_clients():
+    for upstream, http_client in list(http_clients.items()):
+        try:
+            await http_client.aclose()
+        except Exception as e:
+            print(f"[HTTP] Error closing {upstream} client: {e}")
+    http_clients.clear()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup / shutdown"""
+    for upstream in UPSTREAM_DEFAULTS:
+        config = get_upstream_config(upstream)
+        get_http_client(upstream)
+        print(f"[HTTP] {upstream} client ready (timeout={config['timeout']}s, http2={config['http2']}, max_connections={config['max_connections']})")
+    catalog_task = asyncio.create_task(catalog_refresh_loop())
+    recording_task = asyncio.create_task(recording_maintenance_loop())
+    await ensure_offline_indexes()
+    offline_workers = start_offline_job_workers()
+    await resume_offline_jobs()
+    start_analysis_pool()
+    await interrupt_backfill_jobs()
+    yield
+    catalog_task.cancel()
+    recording_task.cancel()
+    for worker in offline_workers:
+        worker.cancel()
+    for task in list(backfill_tasks.values()):
+        task.cancel()
+    stop_analysis_pool()
+    await close_http_clients()
+    client.close()
+
+
+app = FastAPI(title="SPYNNERS API", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -59,10 +199,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB
+# MongoDB (Motor - never blocks the event loop)
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "spynners_db")
-client = MongoClient(MONGO_URL)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
 db = client[DB_NAME]
 
 # Spynners Native API Base URL
@@ -74,6 +226,10 @@ tracks_collection = db["tracks"]
 messages_collection = db["messages"]
 playlists_collection = db["playlists"]
 recognition_history_collection = db["recognition_history"]
+offline_sessions_collection = db["offline_sessions"]
+offline_recordings_collection = db["offline_recordings"]  # Audio + result per recording while a session job runs
+recording_sessions_collection = db["recording_sessions"]  # SPYN Record segments assembled server-side
+backfill_jobs_collection = db["backfill_jobs"]  # Catalog BPM/key/energy backfill jobs and their checkpoints
 
 # ACRCloud Configuration - OFFLINE (Spynners Catalog) - Primary
 ACRCLOUD_HOST = os.getenv("ACRCLOUD_HOST", "identify-eu-west-1.acrcloud.com")
@@ -82,9 +238,15 @@ ACRCLOUD_ACCESS_SECRET = os.getenv("ACRCLOUD_ACCESS_SECRET", "")
 ACRCLOUD_BUCKET_ID = os.getenv("ACRCLOUD_BUCKET_ID", "")
 
 # ACRCloud Configuration - ONLINE (Global Catalog) - Fallback
+ACRCLOUD_ONLINE_HOST = os.getenv("ACRCLOUD_ONLINE_HOST", ACRCLOUD_HOST)
 ACRCLOUD_ONLINE_ACCESS_KEY = os.getenv("ACRCLOUD_ONLINE_ACCESS_KEY", "")
 ACRCLOUD_ONLINE_ACCESS_SECRET = os.getenv("ACRCLOUD_ONLINE_ACCESS_SECRET", "")
 
+# Recognition mode: "hedged" queries the online bucket too when the primary is slow or misses,
+# "primary" only ever queries the Spynners bucket
+ACRCLOUD_RECOGNITION_MODE = os.getenv("ACRCLOUD_RECOGNITION_MODE", "hedged")
+ACRCLOUD_HEDGE_DELAY_MS = int(os.getenv("ACRCLOUD_HEDGE_DELAY_MS", "1500"))
+
 # Log loaded keys (masked for security)
 print(f"[ACRCloud Config] Primary Key: {ACRCLOUD_ACCESS_KEY[:8]}...{ACRCLOUD_ACCESS_KEY[-4:] if ACRCLOUD_ACCESS_KEY else 'NOT SET'}")
 print(f"[ACRCloud Config] Fallback Key: {ACRCLOUD_ONLINE_ACCESS_KEY[:8]}...{ACRCLOUD_ONLINE_ACCESS_KEY[-4:] if ACRCLOUD_ONLINE_ACCESS_KEY else 'NOT SET'}")
@@ -104,6 +266,7 @@ def serialize_doc(doc):
 
 class AudioRecognitionRequest(BaseModel):
     audio_base64: str
+    session_id: Optional[str] = None  # SPYN session, for track-change detection
 
 class MessageSendRequest(BaseModel):
     sender_id: str
@@ -128,7 +291,7 @@ class LocalSignupRequest(BaseModel):
 @app.post("/api/auth/local/signup")
 async def local_signup(request: LocalSignupRequest):
     """Local signup fallback when Base44 is unavailable"""
-    existing = users_collection.find_one({"email": request.email.lower()})
+    existing = await users_collection.find_one({"email": request.email.lower()})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -145,7 +308,7 @@ async def local_signup(request: LocalSignupRequest):
         "is_vip": False
     }
     
-    result = users_collection.insert_one(user)
+    result = await users_collection.insert_one(user)
     user_id = str(result.inserted_id)
     
     # Generate simple token
@@ -165,7 +328,7 @@ async def local_signup(request: LocalSignupRequest):
 @app.post("/api/auth/local/login")
 async def local_login(request: LocalLoginRequest):
     """Local login fallback when Base44 is unavailable"""
-    user = users_collection.find_one({"email": request.email.lower()})
+    user = await users_collection.find_one({"email": request.email.lower()})
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -188,6 +351,528 @@ async def local_login(request: LocalLoginRequest):
     }
 
 
+# ==================== SPYNNERS CATALOG INDEX ====================
+
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "200"))
+CATALOG_MAX_PAGES = int(os.getenv("CATALOG_MAX_PAGES", "500"))  # Safety limit
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "120"))  # Incremental refresh (seconds)
+CATALOG_FULL_RELOAD_INTERVAL = float(os.getenv("CATALOG_FULL_RELOAD_INTERVAL", "3600"))  # Full reload picks up deletions
+CATALOG_RETRY_INTERVAL = 30.0  # Don't retry a failed load on every request
+
+
+def normalize_title(title):
+    """Normalize a title/artist for matching: drop (...) parts and punctuation, lowercase"""
+    if not title:
+        return ""
+    # Remove parentheses content
+    title = re.sub(r'\s*\([^)]*\)\s*', ' ', title)
+    # Remove special characters except spaces
+    title = re.sub(r'[^\w\s]', ' ', title)
+    # Normalize spaces
+    title = ' '.join(title.split())
+    return title.lower().strip()
+
+
+def similarity_score(a, b):
+    """Calculate similarity between two strings (0-1)"""
+    if RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(a, b) / 100.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+MATCH_THRESHOLD = 0.45  # Minimum score to accept a fuzzy match
+# Offline sessions email the producer of the matched track, so they also need
+# 0.7 * title + 0.3 * artist similarity above this and a close title on its own
+OFFLINE_MATCH_THRESHOLD = 0.5
+OFFLINE_MIN_TITLE_SIMILARITY = 0.75
+MATCH_SHORTLIST_SIZE = int(os.getenv("MATCH_SHORTLIST_SIZE", "50"))
+MATCH_MAX_GRAMS = 12  # Only the rarest query trigrams are used for shortlisting
+MATCH_STOPGRAM_RATIO = 0.02  # Trigrams found in more than 2% of titles don't discriminate
+
+
+def title_trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def score_title_match(clean_title: str, clean_artist: str, t_title_norm: str, t_producer_norm: str,
+                      clean_words: Optional[frozenset] = None, t_words: Optional[frozenset] = None) -> float:
+    """
+    Score a catalog track against a recognized title/artist (all normalized).
+    Title similarity plus artist, contains, word-overlap and remix bonuses;
+    an exact title match scores 2.0.
+    """
+    # Exact match - perfect score
+    if t_title_norm == clean_title:
+        return 2.0
+    
+    # Calculate title similarity
+    title_score = similarity_score(clean_title, t_title_norm)
+    
+    # Bonus if artist/producer matches
+    artist_bonus = 0
+    if clean_artist and t_producer_norm:
+        artist_score = similarity_score(clean_artist, t_producer_norm)
+        if artist_score > 0.5:
+            artist_bonus = 0.2
+        # Check if artist name is in producer name or vice versa
+        if clean_artist in t_producer_norm or t_producer_norm in clean_artist:
+            artist_bonus = 0.3
+    
+    # Check if title contains the search term or vice versa
+    contains_bonus = 0
+    if clean_title in t_title_norm or t_title_norm in clean_title:
+        contains_bonus = 0.2
+    
+    # Check for key words match
+    clean_words = clean_words if clean_words is not None else frozenset(clean_title.split())
+    t_words = t_words if t_words is not None else frozenset(t_title_norm.split())
+    common_words = clean_words & t_words
+    if len(common_words) > 0:
+        word_bonus = len(common_words) / max(len(clean_words), len(t_words)) * 0.3
+    else:
+        word_bonus = 0
+    
+    # Special bonus for remix tracks - check if original artist matches
+    remix_bonus = 0
+    if 'remix' in clean_title or 'remix' in t_title_norm:
+        # Extract potential original artist from title
+        for word in clean_words:
+            if len(word) > 3 and word in t_title_norm:
+                remix_bonus = 0.15
+                break
+    
+    return title_score + artist_bonus + contains_bonus + word_bonus + remix_bonus
+
+
+def strict_title_match(clean_title: str, clean_artist: str, t_title_norm: str, t_producer_norm: str) -> bool:
+    """Offline-session rule: an unrelated track by the same producer never matches on the artist bonus"""
+    title_score = similarity_score(clean_title, t_title_norm)
+    artist_score = similarity_score(clean_artist, t_producer_norm) if clean_artist and t_producer_norm else 0.0
+    return title_score >= OFFLINE_MIN_TITLE_SIMILARITY and 0.7 * title_score + 0.3 * artist_score > OFFLINE_MATCH_THRESHOLD
+
+
+class TitleMatcher:
+    """
+    Fuzzy title matcher with normalized titles/producers precomputed once.
+    A trigram + word inverted index shortlists candidates, so a lookup only
+    scores a few dozen titles instead of the whole catalog.
+    """
+
+    def __init__(self):
+        self.entries = {}          # id -> (title, producer, words, trigrams), all normalized
+        self.ids_by_title = {}     # normalized title -> {ids}
+        self.ids_by_producer = {}  # normalized producer -> {ids}
+        self.ids_by_gram = {}      # title trigram -> {ids}
+        self.ids_by_word = {}      # title word -> {ids}
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _index(table: dict, key: str, item_id: str):
+        table.setdefault(key, set()).add(item_id)
+
+    @staticmethod
+    def _unindex(table: dict, key: str, item_id: str):
+        ids = table.get(key)
+        if ids:
+            ids.discard(item_id)
+            if not ids:
+                del table[key]
+
+    def add(self, item_id: str, title: str, producer: str):
+        self.remove(item_id)
+        title_key = normalize_title(title)
+        producer_key = normalize_title(producer)
+        words = frozenset(title_key.split())
+        grams = title_trigrams(title_key) if title_key else frozenset()
+        self.entries[item_id] = (title_key, producer_key, words, grams)
+        if title_key:
+            self._index(self.ids_by_title, title_key, item_id)
+        if producer_key:
+            self._index(self.ids_by_producer, producer_key, item_id)
+        for gram in grams:
+            self._index(self.ids_by_gram, gram, item_id)
+        for word in words:
+            self._index(self.ids_by_word, word, item_id)
+
+    def remove(self, item_id: str):
+        entry = self.entries.pop(item_id, None)
+        if entry is None:
+            return
+        title_key, producer_key, words, grams = entry
+        self._unindex(self.ids_by_title, title_key, item_id)
+        self._unindex(self.ids_by_producer, producer_key, item_id)
+        for gram in grams:
+            self._unindex(self.ids_by_gram, gram, item_id)
+        for word in words:
+            self._unindex(self.ids_by_word, word, item_id)
+
+    def shortlist(self, clean_title: str, clean_words: frozenset, limit: int) -> List[str]:
+        """Ids sharing the most rare trigrams/words with the query, best first"""
+        max_postings = max(limit, int(len(self.entries) * MATCH_STOPGRAM_RATIO))
+        postings = [p for p in (self.ids_by_gram.get(g) for g in title_trigrams(clean_title)) if p]
+        postings.sort(key=len)
+        selective = [p for p in postings[:MATCH_MAX_GRAMS] if len(p) <= max_postings] or postings[:3]
+        counts = Counter()
+        for ids in selective:
+            counts.update(ids)
+        for word in clean_words:
+            ids = self.ids_by_word.get(word)
+            if ids and len(ids) <= max_postings:
+                counts.update(ids)
+        return [item_id for item_id, _ in counts.most_common(limit)]
+
+    def match(self, title: str, artist: str, accept=None, limit: int = MATCH_SHORTLIST_SIZE):
+        """Return (best id, score) for a title/artist; `accept(id)` can filter candidates"""
+        clean_title = normalize_title(title)
+        clean_artist = normalize_title(artist)
+        if not clean_title:
+            return None, 0.0
+        clean_words = frozenset(clean_title.split())
+        
+        # Exact title: prefer the one whose producer matches the artist
+        exact = [i for i in self.ids_by_title.get(clean_title, ()) if accept is None or accept(i)]
+        if exact:
+            exact.sort(key=lambda i: similarity_score(clean_artist, self.entries[i][1]) if clean_artist else 0, reverse=True)
+            return exact[0], 2.0
+        
+        best_id = None
+        best_score = 0.0
+        for item_id in self.shortlist(clean_title, clean_words, limit * 2 if accept else limit):
+            if accept is not None and not accept(item_id):
+                continue
+            t_title_norm, t_producer_norm, t_words, _ = self.entries[item_id]
+            score = score_title_match(clean_title, clean_artist, t_title_norm, t_producer_norm, clean_words, t_words)
+            if score > best_score:
+                best_id, best_score = item_id, score
+        return best_id, best_score
+
+
+class SpynnersCatalog:
+    """
+    Process-resident index of Spynners Track entities.
+    Loaded at startup and refreshed in the background by created/updated date,
+    so recognitions are enriched with a local lookup instead of a Base44 fetch.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self.last_attempt = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.tracks_by_id = {}
+        self.tracks_by_acrcloud_id = {}
+        self.matcher = TitleMatcher()  # normalized title/producer keys + fuzzy index
+        self.last_modified = ""        # newest updated_date/created_date seen
+
+    def __len__(self):
+        return len(self.tracks_by_id)
+
+    @staticmethod
+    def _modified(track: dict) -> str:
+        return track.get("updated_date") or track.get("created_date") or ""
+
+    def _unindex(self, track_id: str):
+        old = self.tracks_by_id.pop(track_id, None)
+        if old is None:
+            return
+        acr_id = old.get("acrcloud_id")
+        if acr_id and (self.tracks_by_acrcloud_id.get(acr_id) or {}).get("id") == track_id:
+            del self.tracks_by_acrcloud_id[acr_id]
+        self.matcher.remove(track_id)
+
+    def upsert(self, track: dict):
+        """Add or replace a track in every lookup table"""
+        track_id = track.get("id") or track.get("_id")
+        if not track_id:
+            return
+        self._unindex(track_id)
+        self.tracks_by_id[track_id] = track
+        if track.get("acrcloud_id"):
+            self.tracks_by_acrcloud_id[track["acrcloud_id"]] = track
+        self.matcher.add(track_id, track.get("title") or "", track.get("producer_name") or "")
+        modified = self._modified(track)
+        if modified > self.last_modified:
+            self.last_modified = modified
+
+    def get(self, track_id: str) -> Optional[dict]:
+        return self.tracks_by_id.get(track_id)
+
+    def get_by_acrcloud_id(self, acr_id: str) -> Optional[dict]:
+        return self.tracks_by_acrcloud_id.get(acr_id)
+
+    def find_by_title(self, title: str) -> List[dict]:
+        """Tracks whose normalized title is exactly `title` (after normalization)"""
+        ids = self.matcher.ids_by_title.get(normalize_title(title), ())
+        return [self.tracks_by_id[i] for i in ids]
+
+    def match(self, title: str, artist: str, approved_only: bool = False, strict: bool = False):
+        """
+        Best fuzzy match as (track, score) - track is None below MATCH_THRESHOLD,
+        or with `strict` when a non-exact title fails strict_title_match
+        """
+        accept = None
+        if approved_only:
+            accept = lambda i: self.tracks_by_id[i].get("status") == "approved"
+        track_id, score = self.matcher.match(title, artist, accept=accept)
+        if track_id is None:
+            return None, 0.0
+        track = self.tracks_by_id[track_id]
+        if score < MATCH_THRESHOLD:
+            return None, score
+        if strict and score < 2.0:
+            t_title_norm, t_producer_norm, _, _ = self.matcher.entries[track_id]
+            if not strict_title_match(normalize_title(title), normalize_title(artist), t_title_norm, t_producer_norm):
+                return None, score
+        return track, score
+
+    async def _fetch_page(self, offset: int, sort: str) -> list:
+        async with upstream_client("base44") as http_client:
+            response = await http_client.get(
+                f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track",
+                params={"limit": CATALOG_PAGE_SIZE, "offset": offset, "sort": sort},
+                headers={"X-Base44-App-Id": BASE44_APP_ID}
+            )
+        if response.status_code != 200:
+            raise Exception(f"Base44 returned {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        if isinstance(data, dict):
+            data = data.get('items', data.get('data', []))
+        return data or []
+
+    async def load(self, only_if_empty: bool = False):
+        """Full (re)load, paging through every Track entity"""
+        async with self._lock:
+            if only_if_empty and self.loaded:
+                return
+            self.last_attempt = time.time()
+            started = time.time()
+            tracks = {}
+            offset = 0
+            for _ in range(CATALOG_MAX_PAGES):
+                page = await self._fetch_page(offset, "-created_date")
+                for t in page:
+                    track_id = t.get("id") or t.get("_id")
+                    if track_id:
+                        tracks[track_id] = t
+                if len(page) < CATALOG_PAGE_SIZE:
+                    break
+                offset += CATALOG_PAGE_SIZE
+            # Rebuild without awaiting so lookups never see a half-built index
+            self._reset()
+            for t in tracks.values():
+                self.upsert(t)
+            self.loaded = True
+            self.loaded_at = self.refreshed_at = time.time()
+            print(f"[Catalog] Loaded {len(self)} tracks in {time.time() - started:.2f}s")
+
+    async def refresh(self):
+        """Pull only the tracks created/updated since the newest one we have"""
+        async with self._lock:
+            since = self.last_modified
+            offset = 0
+            updated = 0
+            for _ in range(CATALOG_MAX_PAGES):
+                page = await self._fetch_page(offset, "-updated_date")
+                newer = [t for t in page if self._modified(t) > since]
+                for t in newer:
+                    self.upsert(t)
+                updated += len(newer)
+                # Sorted newest first: stop at the first already-known track
+                if len(newer) < len(page) or len(page) < CATALOG_PAGE_SIZE:
+                    break
+                offset += CATALOG_PAGE_SIZE
+            self.refreshed_at = time.time()
+            if updated:
+                print(f"[Catalog] Refreshed {updated} tracks (total: {len(self)})")
+
+    async def ensure_loaded(self):
+        """Make sure the first load happened (the background task normally does it)"""
+        if self.loaded or time.time() - self.last_attempt < CATALOG_RETRY_INTERVAL:
+            return
+        try:
+            await self.load(only_if_empty=True)
+        except Exception as e:
+            print(f"[Catalog] Initial load failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "tracks": len(self),
+            "with_acrcloud_id": len(self.tracks_by_acrcloud_id),
+            "last_modified": self.last_modified,
+            "refreshed_at": datetime.utcfromtimestamp(self.refreshed_at).isoformat() if self.refreshed_at else None,
+        }
+
+
+spynners_catalog = SpynnersCatalog()
+
+
+async def catalog_refresh_loop():
+    """Background task: initial load, then incremental refreshes"""
+    while True:
+        try:
+            if not spynners_catalog.loaded or time.time() - spynners_catalog.loaded_at > CATALOG_FULL_RELOAD_INTERVAL:
+                await spynners_catalog.load()
+            else:
+                await spynners_catalog.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Catalog] Refresh error: {e}")
+        await asyncio.sleep(CATALOG_REFRESH_INTERVAL)
+
+
+async def find_spynners_track(acr_id: str, track_title: str, track_artist: str) -> Optional[dict]:
+    """Find the Spynners track for an ACRCloud match: by acrcloud_id, then by fuzzy title"""
+    await spynners_catalog.ensure_loaded()
+    
+    # Search by acrcloud_id first
+    if acr_id:
+        spynners_track = spynners_catalog.get_by_acrcloud_id(acr_id) or track_by_acrcloud_cache.get(acr_id)
+        if spynners_track:
+            print(f"[SPYNNERS] ✅ Found track by acrcloud_id: {spynners_track.get('title')}")
+            return spynners_track
+    
+    print(f"[SPYNNERS] Searching for: '{track_title}' by '{track_artist}' in {len(spynners_catalog)} tracks...")
+    
+    started = time.perf_counter()
+    spynners_track, score = spynners_catalog.match(track_title, track_artist)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    if spynners_track:
+        print(f"[SPYNNERS] ✅ Found track by fuzzy match (score: {score:.2f}, {elapsed_ms:.2f}ms): '{spynners_track.get('title')}'")
+        if acr_id:
+            track_by_acrcloud_cache.set(acr_id, spynners_track)
+    elif score:
+        print(f"[SPYNNERS] ⚠️ Best match score too low ({score:.2f}, {elapsed_ms:.2f}ms)")
+    return spynners_track
+
+
+# ==================== LOOKUP CACHES ====================
+
+TRACK_CACHE_TTL = float(os.getenv("TRACK_CACHE_TTL", "600"))
+TRACK_CACHE_SIZE = int(os.getenv("TRACK_CACHE_SIZE", "5000"))
+PRODUCER_CACHE_TTL = float(os.getenv("PRODUCER_CACHE_TTL", "1800"))
+PRODUCER_CACHE_SIZE = int(os.getenv("PRODUCER_CACHE_SIZE", "2000"))
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, name: str, ttl: float, max_size: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key):
+        self._items.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose value matches `predicate(value)`"""
+        for key in [k for k, (_, v) in self._items.items() if predicate(v)]:
+            del self._items[key]
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+track_cache = TTLCache("track_by_id", TRACK_CACHE_TTL, TRACK_CACHE_SIZE)
+track_by_acrcloud_cache = TTLCache("track_by_acrcloud_id", TRACK_CACHE_TTL, TRACK_CACHE_SIZE)
+producer_email_cache = TTLCache("producer_email_by_id", PRODUCER_CACHE_TTL, PRODUCER_CACHE_SIZE)
+lookup_caches = [track_cache, track_by_acrcloud_cache, producer_email_cache]
+
+
+async def get_spynners_track(track_id: str) -> Optional[dict]:
+    """Spynners Track by id: catalog index, then cache, then Base44"""
+    track = spynners_catalog.get(track_id) or track_cache.get(track_id)
+    if track:
+        return track
+    async with upstream_client("base44") as client:
+        response = await client.get(
+            f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track/{track_id}",
+            headers={"X-Base44-App-Id": BASE44_APP_ID},
+            timeout=5.0
+        )
+    if response.status_code != 200:
+        return None
+    track = response.json()
+    track_cache.set(track_id, track)
+    return track
+
+
+async def get_producer_email(producer_id: str) -> Optional[str]:
+    """Producer email by user id (cached)"""
+    email = producer_email_cache.get(producer_id)
+    if email:
+        return email
+    async with upstream_client("base44") as client:
+        response = await client.get(
+            f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User/{producer_id}",
+            headers={"X-Base44-App-Id": BASE44_APP_ID},
+            timeout=5.0
+        )
+    if response.status_code != 200:
+        return None
+    email = response.json().get("email")
+    if email:
+        producer_email_cache.set(producer_id, email)
+    return email
+
+
+def invalidate_track(track_id: str, updated: Optional[dict] = None):
+    """Forget cached copies of a track after an update (and refresh the catalog entry)"""
+    track_cache.invalidate(track_id)
+    track_by_acrcloud_cache.invalidate_where(lambda t: t.get("id") == track_id)
+    if isinstance(updated, dict) and updated.get("id") == track_id:
+        spynners_catalog.upsert(updated)
+
+
+def invalidate_user(user_id: str):
+    """Forget cached producer data after a user update"""
+    producer_email_cache.invalidate(user_id)
+
+
 # ==================== ACRCLOUD RECOGNITION ====================
 
 def generate_acrcloud_signature(http_method: str, http_uri: str, access_key: str, 
@@ -204,505 +889,1436 @@ def generate_acrcloud_signature(http_method: str, http_uri: str, access_key: str
     ).decode('ascii')
     return sign
 
-@app.post("/api/recognize-audio")
-async def recognize_audio(request: AudioRecognitionRequest, authorization: Optional[str] = Header(None)):
+RECOGNITION_CACHE_TTL = float(os.getenv("RECOGNITION_CACHE_TTL", "600"))
+RECOGNITION_CACHE_SIZE = int(os.getenv("RECOGNITION_CACHE_SIZE", "1000"))
+CACHEABLE_ACRCLOUD_CODES = (0, 1001)  # Found / no result - errors and rate limits are retried
+
+# Keyed by sha256 of the decoded audio: retried or resubmitted snippets skip ACRCloud
+acrcloud_result_cache = TTLCache("acrcloud_result_by_audio_hash", RECOGNITION_CACHE_TTL, RECOGNITION_CACHE_SIZE)
+recognition_cache = TTLCache("recognition_by_audio_hash", RECOGNITION_CACHE_TTL, RECOGNITION_CACHE_SIZE)
+lookup_caches.extend([acrcloud_result_cache, recognition_cache])
+recognitions_in_flight = {}  # audio hash -> task, so concurrent retries share one upstream call
+
+
+# Sample preparation: decoded samples are cut to their loudest window and resampled
+# to mono at ACRCloud's fingerprint rate before upload (0 keeps the source rate)
+RECOGNITION_WINDOW_SECONDS = float(os.getenv("RECOGNITION_WINDOW_SECONDS", "12"))
+ACRCLOUD_SAMPLE_RATE = int(os.getenv("ACRCLOUD_SAMPLE_RATE", "8000"))
+TRACK_SAMPLE_SECONDS = 60  # Only the start of full tracks is decoded when sampling them
+
+# Quality gate: hopeless snippets (silence, clipping, noise) are rejected before ACRCloud
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "true").lower() == "true"
+QUALITY_MIN_SECONDS = float(os.getenv("QUALITY_MIN_SECONDS", "2"))
+QUALITY_MIN_RMS_DBFS = float(os.getenv("QUALITY_MIN_RMS_DBFS", "-45"))
+QUALITY_MAX_CLIPPING_RATIO = float(os.getenv("QUALITY_MAX_CLIPPING_RATIO", "0.05"))
+QUALITY_MAX_FLATNESS = float(os.getenv("QUALITY_MAX_FLATNESS", "0.6"))
+
+QUALITY_REJECTION_MESSAGES = {
+    "too_short": "Audio sample too short",
+    "silence": "Audio sample is silent or too quiet",
+    "clipped": "Audio sample is clipped/saturated",
+    "noise": "Audio sample is mostly noise",
+}
+# "checked" only counts samples that could be decoded (and so inspected); "undecodable"
+# ones (neither soundfile nor ffmpeg could read them) were forwarded to ACRCloud unchecked
+quality_gate_stats = {"samples": 0, "checked": 0, "undecodable": 0, "by_decoder": {}, "rejected": 0, "saved_calls": 0,
+                      "trimmed": 0, "resampled": 0, "bytes_in": 0, "bytes_out": 0, "by_reason": {}, "total_ms": 0.0}
+
+MAX_RECOGNITION_UPLOAD_BYTES = int(os.getenv("MAX_RECOGNITION_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+AUDIO_MIME_TYPES = {
+    "wav": "audio/wav",
+    "webm": "audio/webm",
+    "m4a": "audio/mp4",
+    "aac": "audio/aac",
+    "mp3": "audio/mpeg",
+    "ogg": "audio/ogg",
+}
+
+
+def audio_hash(audio_data: bytes) -> str:
+    return hashlib.sha256(audio_data).hexdigest()
+
+
+def detect_audio_format(audio_data: bytes) -> str:
+    """Detect the container from magic bytes (m4a when unknown)"""
+    if audio_data[:4] == b'RIFF':
+        return "wav"
+    if audio_data[:4] == b'\x1aE\xdf\xa3':
+        return "webm"
+    if audio_data[:4] == b'ftyp' or audio_data[4:8] == b'ftyp':
+        return "m4a"
+    if audio_data[:3] == b'ID3' or audio_data[:2] == b'\xff\xfb':
+        return "mp3"
+    if audio_data[:2] in (b'\xff\xf1', b'\xff\xf9'):
+        return "aac"  # Raw ADTS AAC
+    if audio_data[:4] == b'OggS':
+        return "ogg"  # Ogg Vorbis/Opus
+    return "m4a"
+
+
+def recognition_sample_options(check_quality: bool = True, max_seconds: Optional[float] = None) -> dict:
+    """Keyword arguments of audio_analysis.prepare_sample for a recognition sample"""
+    return {
+        "window_seconds": RECOGNITION_WINDOW_SECONDS,
+        "target_rate": ACRCLOUD_SAMPLE_RATE or None,
+        "max_seconds": max_seconds,
+        "check_quality": check_quality and QUALITY_GATE_ENABLED,
+        "min_seconds": QUALITY_MIN_SECONDS,
+        "min_rms_dbfs": QUALITY_MIN_RMS_DBFS,
+        "max_clipping_ratio": QUALITY_MAX_CLIPPING_RATIO,
+        "max_flatness": QUALITY_MAX_FLATNESS,
+    }
+
+
+async def decode_recognition_audio(audio_data: bytes, max_seconds: Optional[float] = None):
     """
-    Recognize audio using ACRCloud
-    Expects base64 encoded audio data
+    Decode a recognition sample -> audio_analysis.AudioWorkspace, None when
+    nothing can read it. soundfile reads WAV/FLAC/Ogg/MP3; what it can't
+    (m4a/AAC recorded by the app, webm) goes through ffmpeg, decoded straight
+    to mono PCM at ACRCLOUD_SAMPLE_RATE.
     """
-    if not ACRCLOUD_ACCESS_KEY or not ACRCLOUD_ACCESS_SECRET:
-        raise HTTPException(
-            status_code=503, 
-            detail="ACRCloud not configured. Please set ACRCLOUD_ACCESS_KEY and ACRCLOUD_ACCESS_SECRET in backend/.env"
+    try:
+        return await asyncio.to_thread(audio_analysis.AudioWorkspace.decode, audio_data, max_seconds)
+    except Exception:
+        pass
+    started = time.perf_counter()
+    sample_rate = ACRCLOUD_SAMPLE_RATE or 16000
+    try:
+        pcm = await ffmpeg_decode_pcm(audio_data, sample_rate, max_seconds)
+    except Exception as e:
+        print(f"[Quality] Sample not decodable ({detect_audio_format(audio_data)}): {str(e)[-200:]}")
+        return None
+    workspace = audio_analysis.AudioWorkspace.from_pcm16(pcm, sample_rate)
+    workspace.decode_ms = round((time.perf_counter() - started) * 1000, 2)
+    return workspace
+
+
+async def prepare_recognition_sample(audio_data: bytes, check_quality: bool = True,
+                                     max_seconds: Optional[float] = None,
+                                     workspace=None) -> Optional[dict]:
+    """
+    Run audio_analysis.prepare_sample off the event loop: quality gate, loudest
+    window, mono resampling (None when numpy/soundfile are unavailable).
+    `workspace` is the already decoded audio (audio_analysis.AudioWorkspace);
+    otherwise the sample is decoded here, through ffmpeg when soundfile can't.
+    """
+    if not AUDIO_ANALYSIS_AVAILABLE:
+        return None
+    if workspace is None:
+        workspace = await decode_recognition_audio(audio_data, max_seconds)
+    report = await asyncio.to_thread(
+        audio_analysis.prepare_sample, audio_data,
+        workspace=workspace, **recognition_sample_options(check_quality, max_seconds)
+    )
+    return record_quality_report(audio_data, report)
+
+
+def record_quality_report(audio_data: bytes, report: dict) -> dict:
+    """Count a prepare_sample report in the quality gate stats"""
+    quality_gate_stats["samples"] += 1
+    quality_gate_stats["bytes_in"] += len(audio_data)
+    if report["reason"] == "undecodable":
+        quality_gate_stats["undecodable"] += 1
+        quality_gate_stats["bytes_out"] += len(report["audio"])
+        return report
+    quality_gate_stats["checked"] += 1
+    quality_gate_stats["total_ms"] += report["elapsed_ms"]
+    by_decoder = quality_gate_stats["by_decoder"]
+    by_decoder[report["decoder"]] = by_decoder.get(report["decoder"], 0) + 1
+    if not report["ok"]:
+        quality_gate_stats["rejected"] += 1
+        quality_gate_stats["saved_calls"] += 1
+        by_reason = quality_gate_stats["by_reason"]
+        by_reason[report["reason"]] = by_reason.get(report["reason"], 0) + 1
+        print(f"[Quality] Rejected sample ({report['reason']}): {report['metrics']} in {report['elapsed_ms']}ms")
+        return report
+    quality_gate_stats["trimmed"] += report["trimmed"]
+    quality_gate_stats["resampled"] += report["resampled"]
+    quality_gate_stats["bytes_out"] += len(report["audio"])
+    return report
+
+
+def recognition_payload(audio_data: bytes, report: Optional[dict], audio_format: Optional[str] = None):
+    """(bytes, audio_format, extra ACRCloud fields) to submit, labelled with the real format/rate"""
+    if report and report["prepared"]:
+        return report["audio"], "wav", {'sample_rate': str(report["sample_rate"]), 'audio_format': 'wav'}
+    audio_format = audio_format or detect_audio_format(audio_data)
+    return audio_data, audio_format, {'audio_format': audio_format}
+
+
+def mp3_head(audio_data: bytes, seconds: float) -> bytes:
+    """First `seconds` of an MP3 (ID3 tag skipped, byte count from the bitrate)"""
+    start = 0
+    if audio_data[:3] == b'ID3' and len(audio_data) >= 10:
+        # Synchsafe tag size, plus header (and footer when flagged)
+        size = (audio_data[6] << 21) | (audio_data[7] << 14) | (audio_data[8] << 7) | audio_data[9]
+        start = 10 + size + (10 if audio_data[5] & 0x10 else 0)
+    bitrate = 320000  # Upper bound when the bitrate can't be read
+    if MUTAGEN_AVAILABLE:
+        try:
+            bitrate = MP3(BytesIO(audio_data)).info.bitrate or bitrate
+        except Exception:
+            pass
+    return audio_data[start:start + int(seconds * bitrate / 8)]
+
+
+def quality_rejection(report: dict) -> dict:
+    """Recognition response for a sample rejected by the quality gate"""
+    return {
+        "success": False,
+        "message": QUALITY_REJECTION_MESSAGES.get(report["reason"], "Audio sample rejected"),
+        "reason": report["reason"],
+        "quality": report["metrics"]
+    }
+
+
+ACRCLOUD_SOURCES = {
+    "primary": (ACRCLOUD_HOST, ACRCLOUD_ACCESS_KEY, ACRCLOUD_ACCESS_SECRET),
+    "online": (ACRCLOUD_ONLINE_HOST, ACRCLOUD_ONLINE_ACCESS_KEY, ACRCLOUD_ONLINE_ACCESS_SECRET),
+}
+hedge_stats = {"primary_wins": 0, "online_wins": 0, "hedges_sent": 0, "losers_cancelled": 0}
+
+
+async def acrcloud_identify(audio_data: bytes, extra_fields: Optional[dict] = None, audio_format: str = "wav",
+                            source: str = "primary") -> dict:
+    """Send an audio sample to ACRCloud /v1/identify and return the raw JSON result"""
+    host, access_key, access_secret = ACRCLOUD_SOURCES[source]
+
+    # ACRCloud API parameters
+    http_method = "POST"
+    http_uri = "/v1/identify"
+    data_type = "audio"
+    signature_version = "1"
+    timestamp = str(int(time.time()))
+    
+    # Generate signature
+    signature = generate_acrcloud_signature(
+        http_method, http_uri, access_key,
+        data_type, signature_version, timestamp, access_secret
+    )
+    
+    # bytes are streamed as-is by httpx (no BytesIO copy)
+    files = {
+        'sample': (f'audio.{audio_format}', audio_data, AUDIO_MIME_TYPES.get(audio_format, 'application/octet-stream'))
+    }
+    
+    data = {
+        'access_key': access_key,
+        'sample_bytes': str(len(audio_data)),
+        'timestamp': timestamp,
+        'signature': signature,
+        'data_type': data_type,
+        'signature_version': signature_version,
+        **(extra_fields or {})
+    }
+    
+    print(f"[ACRCloud] Sending {len(audio_data)} bytes to ACRCloud ({source})...")
+    
+    async with upstream_client("acrcloud") as client:
+        response = await client.post(
+            f"https://{host}{http_uri}",
+            data=data,
+            files=files
         )
     
+    return response.json()
+
+
+def acrcloud_found(result) -> bool:
+    return isinstance(result, dict) and result.get("status", {}).get("code", -1) == 0
+
+
+async def acrcloud_identify_hedged(audio_data: bytes, extra_fields: Optional[dict] = None, audio_format: str = "wav"):
+    """
+    Query the Spynners (primary) bucket; if it misses, fails or hasn't answered
+    after ACRCLOUD_HEDGE_DELAY_MS, query the online bucket in parallel.
+    The first match wins and the other request is cancelled.
+    Returns (result, source) - source is "primary" or "online".
+    """
+    hedging = ACRCLOUD_RECOGNITION_MODE == "hedged" and ACRCLOUD_ONLINE_ACCESS_KEY and ACRCLOUD_ONLINE_ACCESS_SECRET
+    if not hedging:
+        return await acrcloud_identify(audio_data, extra_fields, audio_format), "primary"
+    
+    tasks = {
+        asyncio.ensure_future(acrcloud_identify(audio_data, extra_fields, audio_format, "primary")): "primary"
+    }
+    done, _ = await asyncio.wait(tasks, timeout=ACRCLOUD_HEDGE_DELAY_MS / 1000)
+    
+    outcomes = {}  # source -> result or exception
+    pending = set(tasks) - done
     try:
-        # Decode base64 audio
-        audio_data = base64.b64decode(request.audio_base64)
-        
-        print(f"[ACRCloud] Received audio: {len(audio_data)} bytes")
-        print(f"[ACRCloud] First 20 bytes (hex): {audio_data[:20].hex()}")
-        
-        # Skip format detection and conversion - send raw audio as wav
-        # ACRCloud can handle various formats when sent with audio_format parameter
-        # This matches the working implementation from the website
-        
-        # ACRCloud API parameters
-        http_method = "POST"
-        http_uri = "/v1/identify"
-        data_type = "audio"
-        signature_version = "1"
-        timestamp = str(int(time.time()))
-        
-        # Generate signature
-        signature = generate_acrcloud_signature(
-            http_method, http_uri, ACRCLOUD_ACCESS_KEY,
-            data_type, signature_version, timestamp, ACRCLOUD_ACCESS_SECRET
-        )
-        
-        # Prepare request - Match the working implementation exactly
-        # Send as audio.wav with explicit parameters
-        files = {
-            'sample': ('audio.wav', BytesIO(audio_data), 'audio/wav')
-        }
-        
-        data = {
-            'access_key': ACRCLOUD_ACCESS_KEY,
-            'sample_bytes': str(len(audio_data)),
-            'timestamp': timestamp,
-            'signature': signature,
-            'data_type': data_type,
-            'signature_version': signature_version,
-            'sample_rate': '48000',
-            'audio_format': 'wav'
-        }
-        
-        print(f"[ACRCloud] Sending {len(audio_data)} bytes to ACRCloud...")
-        print(f"[ACRCloud] Using key: {ACRCLOUD_ACCESS_KEY[:8]}...{ACRCLOUD_ACCESS_KEY[-4:]}")
-        
-        # Send to ACRCloud
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"https://{ACRCLOUD_HOST}{http_uri}",
-                data=data,
-                files=files
-            )
-        
-        result = response.json()
-        print(f"[ACRCloud] Full response: {json.dumps(result, indent=2)[:500]}")
+        while True:
+            for task in done:
+                source = tasks[task]
+                try:
+                    outcomes[source] = task.result()
+                except Exception as e:
+                    print(f"[ACRCloud] {source} request failed: {e}")
+                    outcomes[source] = e
+                if acrcloud_found(outcomes[source]):
+                    hedge_stats[f"{source}_wins"] += 1
+                    if len(tasks) > 1:
+                        print(f"[ACRCloud] Hedged recognition won by {source}")
+                    return outcomes[source], source
+            
+            # Primary is slow or missed: send the hedge request (once)
+            if "online" not in tasks.values():
+                hedge_stats["hedges_sent"] += 1
+                tasks[asyncio.ensure_future(acrcloud_identify(audio_data, extra_fields, audio_format, "online"))] = "online"
+                pending = set(t for t in tasks if not t.done())
+            
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                hedge_stats["losers_cancelled"] += 1
+    
+    # No match from either bucket: report the primary answer
+    for source in ("primary", "online"):
+        if isinstance(outcomes.get(source), dict):
+            return outcomes[source], source
+    raise outcomes["primary"]
+
+
+async def acrcloud_identify_cached(audio_data: bytes, extra_fields: Optional[dict] = None, audio_format: str = "wav"):
+    """acrcloud_identify_hedged() through the audio-hash cache - returns (result, source, cached)"""
+    digest = audio_hash(audio_data)
+    cached = acrcloud_result_cache.get(digest)
+    if cached is not None:
+        print(f"[ACRCloud] Cache hit for audio {digest[:12]}")
+        return cached[0], cached[1], True
+    result, source = await acrcloud_identify_hedged(audio_data, extra_fields, audio_format)
+    if result.get("status", {}).get("code", -1) in CACHEABLE_ACRCLOUD_CODES:
+        acrcloud_result_cache.set(digest, (result, source))
+    return result, source, False
+
+
+async def enrich_recognition(result: dict) -> dict:
+    """Turn an ACRCloud result into the SPYN recognition response (Spynners track, producer, artwork)"""
+    # Parse ACRCloud response
+    status_code = result.get("status", {}).get("code", -1)
+    if status_code == 0:
+        # Check for custom_files first (Spynners tracks), then music (general tracks)
+        custom_files = result.get("metadata", {}).get("custom_files", [])
+        music = result.get("metadata", {}).get("music", [])
+        
+        track = None
+        is_custom = False
+        
+        if custom_files:
+            track = custom_files[0]
+            is_custom = True
+            print(f"[ACRCloud] Found in custom_files (Spynners track)")
+        elif music:
+            track = music[0]
+            print(f"[ACRCloud] Found in music (general track)")
         
-        # Parse ACRCloud response
-        status_code = result.get("status", {}).get("code", -1)
-        if status_code == 0:
-            # Check for custom_files first (Spynners tracks), then music (general tracks)
-            custom_files = result.get("metadata", {}).get("custom_files", [])
-            music = result.get("metadata", {}).get("music", [])
+        if track:
+            # Get ACRCloud ID and track info
+            acr_id = track.get("acrid", "")
+            track_title = track.get("title", "Unknown")
             
-            track = None
-            is_custom = False
+            # For custom files, artist might be in producer_name
+            if is_custom:
+                track_artist = track.get("producer_name") or track.get("artist", "Unknown")
+            else:
+                track_artist = ", ".join([a.get("name", "") for a in track.get("artists", [])]) or "Unknown"
             
-            if custom_files:
-                track = custom_files[0]
-                is_custom = True
-                print(f"[ACRCloud] Found in custom_files (Spynners track)")
-            elif music:
-                track = music[0]
-                print(f"[ACRCloud] Found in music (general track)")
+            print(f"[ACRCloud] Identified: {track_title} by {track_artist}")
+            print(f"[ACRCloud] ACR ID: {acr_id}")
             
-            if track:
-                # Get ACRCloud ID and track info
-                acr_id = track.get("acrid", "")
-                track_title = track.get("title", "Unknown")
-                
-                # For custom files, artist might be in producer_name
-                if is_custom:
-                    track_artist = track.get("producer_name") or track.get("artist", "Unknown")
-                else:
-                    track_artist = ", ".join([a.get("name", "") for a in track.get("artists", [])]) or "Unknown"
-                
-                print(f"[ACRCloud] Identified: {track_title} by {track_artist}")
-                print(f"[ACRCloud] ACR ID: {acr_id}")
-                
-                # For custom files, we already have Spynners data directly
-                if is_custom:
-                    cover_image = track.get("artwork_url")
-                    spynners_track_id = track.get("spynners_track_id")
-                    genre = track.get("genre", "")
-                    producer_id = None
-                    producer_email = None
-                    
-                    print(f"[ACRCloud] Custom file - artwork_url: {cover_image}")
-                    print(f"[ACRCloud] Custom file - spynners_track_id: {spynners_track_id}")
-                    
-                    # Fetch full track details from Spynners to get producer_id
-                    if spynners_track_id:
-                        try:
-                            async with httpx.AsyncClient(timeout=5.0) as spynners_client:
-                                track_resp = await spynners_client.get(
-                                    f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track/{spynners_track_id}",
-                                    headers={"X-Base44-App-Id": BASE44_APP_ID}
-                                )
-                                if track_resp.status_code == 200:
-                                    spynners_track_data = track_resp.json()
-                                    producer_id = spynners_track_data.get("producer_id")
-                                    if not cover_image:
-                                        cover_image = spynners_track_data.get("artwork_url")
-                                    if not genre:
-                                        genre = spynners_track_data.get("genre", "")
-                                    print(f"[SPYNNERS] Fetched track details - producer_id: {producer_id}")
-                                    
-                                    # Get producer email
-                                    if producer_id:
-                                        try:
-                                            user_resp = await spynners_client.get(
-                                                f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User/{producer_id}",
-                                                headers={"X-Base44-App-Id": BASE44_APP_ID}
-                                            )
-                                            if user_resp.status_code == 200:
-                                                producer = user_resp.json()
-                                                producer_email = producer.get("email")
-                                                print(f"[SPYNNERS] Producer email: {producer_email}")
-                                        except Exception as e:
-                                            print(f"[SPYNNERS] Could not get producer email: {e}")
-                        except Exception as e:
-                            print(f"[SPYNNERS] Could not fetch track details: {e}")
-                    
-                    # Build result directly from custom_files data + Spynners lookup
-                    recognition_result = {
-                        "success": True,
-                        "title": track_title,
-                        "artist": track_artist,
-                        "album": track.get("album", ""),
-                        "cover_image": cover_image,
-                        "genre": genre,
-                        "genres": [genre] if genre else [],
-                        "release_date": track.get("release_date", ""),
-                        "label": track.get("label", ""),
-                        "duration_ms": track.get("duration_ms", 0),
-                        "score": track.get("score", 0),
-                        "bpm": track.get("bpm"),
-                        "spynners_track_id": spynners_track_id,
-                        "producer_id": producer_id,
-                        "producer_email": producer_email,
-                        "acrcloud_id": acr_id,
-                        "play_offset_ms": track.get("play_offset_ms", 0),
-                        "is_spynners_track": True
-                    }
-                    
-                    print(f"[SPYNNERS] ✅ Direct match from custom_files: {track_title}")
-                    print(f"[SPYNNERS] Producer ID: {producer_id}, Email: {producer_email}")
-                    return recognition_result
-                
-                # ==================== SEARCH IN SPYNNERS DATABASE ====================
-                # For non-custom tracks, search in Spynners by acrcloud_id or title
-                spynners_track = None
-                cover_image = None
+            # For custom files, we already have Spynners data directly
+            if is_custom:
+                cover_image = track.get("artwork_url")
+                spynners_track_id = track.get("spynners_track_id")
+                genre = track.get("genre", "")
+                producer_id = None
                 producer_email = None
                 
-                try:
-                    # Clean title for search (remove parentheses content like "Extended", "Original Mix")
-                    import re
-                    from difflib import SequenceMatcher
-                    
-                    # Normalize function for better matching
-                    def normalize_title(title):
-                        if not title:
-                            return ""
-                        # Remove parentheses content
-                        title = re.sub(r'\s*\([^)]*\)\s*', ' ', title)
-                        # Remove special characters except spaces
-                        title = re.sub(r'[^\w\s]', ' ', title)
-                        # Normalize spaces
-                        title = ' '.join(title.split())
-                        return title.lower().strip()
-                    
-                    def similarity_score(a, b):
-                        """Calculate similarity between two strings (0-1)"""
-                        return SequenceMatcher(None, a, b).ratio()
-                    
-                    clean_title = normalize_title(track_title)
-                    clean_artist = normalize_title(track_artist)
-                    
-                    print(f"[SPYNNERS] Searching for: '{track_title}' (normalized: '{clean_title}')")
-                    print(f"[SPYNNERS] Artist: '{track_artist}' (normalized: '{clean_artist}')")
-                    
-                    # Search by acrcloud_id first
-                    if acr_id:
-                        spynners_search_url = f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track"
-                        async with httpx.AsyncClient(timeout=10.0) as search_client:
-                            search_resp = await search_client.get(
-                                spynners_search_url,
-                                params={"acrcloud_id": acr_id, "limit": 1},
-                                headers={"X-Base44-App-Id": BASE44_APP_ID}
-                            )
-                            if search_resp.status_code == 200:
-                                tracks = search_resp.json()
-                                if tracks and len(tracks) > 0:
-                                    spynners_track = tracks[0]
-                                    print(f"[SPYNNERS] ✅ Found track by acrcloud_id: {spynners_track.get('title')}")
-                    
-                    # If not found by acrcloud_id, search by title with fuzzy matching
-                    if not spynners_track:
-                        async with httpx.AsyncClient(timeout=10.0) as search_client:
-                            search_resp = await search_client.get(
-                                f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track",
-                                params={"limit": 500},
-                                headers={"X-Base44-App-Id": BASE44_APP_ID}
-                            )
-                            if search_resp.status_code == 200:
-                                all_tracks = search_resp.json()
-                                print(f"[SPYNNERS] Searching through {len(all_tracks)} tracks...")
-                                
-                                best_match = None
-                                best_score = 0
-                                
-                                for t in all_tracks:
-                                    t_title = t.get("title") or ""
-                                    t_producer = t.get("producer_name") or ""
-                                    
-                                    if not t_title:
-                                        continue
-                                    
-                                    t_title_norm = normalize_title(t_title)
-                                    t_producer_norm = normalize_title(t_producer)
-                                    
-                                    # Calculate title similarity
-                                    title_score = similarity_score(clean_title, t_title_norm)
-                                    
-                                    # Bonus if artist/producer matches
-                                    artist_bonus = 0
-                                    if clean_artist and t_producer_norm:
-                                        artist_score = similarity_score(clean_artist, t_producer_norm)
-                                        if artist_score > 0.5:
-                                            artist_bonus = 0.2
-                                        # Check if artist name is in producer name or vice versa
-                                        if clean_artist in t_producer_norm or t_producer_norm in clean_artist:
-                                            artist_bonus = 0.3
-                                    
-                                    # Check if title contains the search term or vice versa
-                                    contains_bonus = 0
-                                    if clean_title in t_title_norm or t_title_norm in clean_title:
-                                        contains_bonus = 0.2
-                                    
-                                    # Check for key words match
-                                    clean_words = set(clean_title.split())
-                                    t_words = set(t_title_norm.split())
-                                    common_words = clean_words & t_words
-                                    if len(common_words) > 0:
-                                        word_bonus = len(common_words) / max(len(clean_words), len(t_words)) * 0.3
-                                    else:
-                                        word_bonus = 0
-                                    
-                                    # Special bonus for remix tracks - check if original artist matches
-                                    remix_bonus = 0
-                                    if 'remix' in clean_title or 'remix' in t_title_norm:
-                                        # Extract potential original artist from title
-                                        for word in clean_words:
-                                            if len(word) > 3 and word in t_title_norm:
-                                                remix_bonus = 0.15
-                                                break
-                                    
-                                    total_score = title_score + artist_bonus + contains_bonus + word_bonus + remix_bonus
-                                    
-                                    # Exact match - perfect score
-                                    if t_title_norm == clean_title:
-                                        total_score = 2.0
-                                    
-                                    # Log potential matches for debugging
-                                    if total_score > 0.3:
-                                        print(f"[SPYNNERS] Candidate: '{t.get('title')}' score={total_score:.2f}")
-                                    
-                                    if total_score > best_score:
-                                        best_score = total_score
-                                        best_match = t
-                                
-                                # Accept match if score is above threshold (lowered to 0.45)
-                                if best_match and best_score >= 0.45:
-                                    spynners_track = best_match
-                                    print(f"[SPYNNERS] ✅ Found track by fuzzy match (score: {best_score:.2f}): '{best_match.get('title')}'")
-                                elif best_match:
-                                    print(f"[SPYNNERS] ⚠️ Best match score too low ({best_score:.2f}): '{best_match.get('title')}'")
-                    
-                    # Get artwork and producer info from Spynners track
-                    if spynners_track:
-                        cover_image = spynners_track.get("artwork_url")
-                        producer_id = spynners_track.get("producer_id")
-                        
-                        print(f"[SPYNNERS] Artwork URL: {cover_image}")
-                        print(f"[SPYNNERS] Producer ID: {producer_id}")
-                        
-                        # Update the acrcloud_id in Spynners if it was empty
-                        if acr_id and not spynners_track.get("acrcloud_id"):
-                            try:
-                                async with httpx.AsyncClient(timeout=5.0) as update_client:
-                                    await update_client.put(
-                                        f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track/{spynners_track.get('id')}",
-                                        json={"acrcloud_id": acr_id},
-                                        headers={"X-Base44-App-Id": BASE44_APP_ID}
-                                    )
-                                    print(f"[SPYNNERS] Updated acrcloud_id for track")
-                            except:
-                                pass
-                        
-                        # Get producer email for notification
-                        if producer_id:
-                            try:
-                                async with httpx.AsyncClient(timeout=5.0) as user_client:
-                                    user_resp = await user_client.get(
-                                        f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User/{producer_id}",
-                                        headers={"X-Base44-App-Id": BASE44_APP_ID}
-                                    )
-                                    if user_resp.status_code == 200:
-                                        producer = user_resp.json()
-                                        producer_email = producer.get("email")
-                                        print(f"[SPYNNERS] Producer email: {producer_email}")
-                            except Exception as e:
-                                print(f"[SPYNNERS] Could not get producer email: {e}")
-                    else:
-                        print(f"[SPYNNERS] Track NOT found in Spynners database: '{track_title}' by '{track_artist}'")
-                        
-                except Exception as e:
-                    print(f"[SPYNNERS] Error searching Spynners database: {e}")
+                print(f"[ACRCloud] Custom file - artwork_url: {cover_image}")
+                print(f"[ACRCloud] Custom file - spynners_track_id: {spynners_track_id}")
                 
-                # Extract genre from Spynners track or ACRCloud
-                genre = ""
-                if spynners_track:
-                    genre = spynners_track.get("genre", "")
-                if not genre:
-                    genres = [g.get("name") for g in track.get("genres", [])]
-                    genre = genres[0] if genres else ""
+                # Fetch full track details from Spynners to get producer_id
+                if spynners_track_id:
+                    try:
+                        spynners_track_data = await get_spynners_track(spynners_track_id)
+                        if spynners_track_data:
+                            producer_id = spynners_track_data.get("producer_id")
+                            if not cover_image:
+                                cover_image = spynners_track_data.get("artwork_url")
+                            if not genre:
+                                genre = spynners_track_data.get("genre", "")
+                            print(f"[SPYNNERS] Fetched track details - producer_id: {producer_id}")
+                            
+                            # Get producer email
+                            if producer_id:
+                                try:
+                                    producer_email = await get_producer_email(producer_id)
+                                    print(f"[SPYNNERS] Producer email: {producer_email}")
+                                except Exception as e:
+                                    print(f"[SPYNNERS] Could not get producer email: {e}")
+                    except Exception as e:
+                        print(f"[SPYNNERS] Could not fetch track details: {e}")
                 
-                # Build recognition result using SPYNNERS data
+                # Build result directly from custom_files data + Spynners lookup
                 recognition_result = {
                     "success": True,
-                    "title": spynners_track.get("title") if spynners_track else track_title,
-                    "artist": spynners_track.get("producer_name") if spynners_track else track_artist,
-                    "album": spynners_track.get("album", "") if spynners_track else track.get("album", {}).get("name", ""),
-                    "cover_image": cover_image,  # From Spynners artwork_url
+                    "title": track_title,
+                    "artist": track_artist,
+                    "album": track.get("album", ""),
+                    "cover_image": cover_image,
                     "genre": genre,
                     "genres": [genre] if genre else [],
-                    "release_date": spynners_track.get("release_date", "") if spynners_track else "",
-                    "label": spynners_track.get("label", "") if spynners_track else "",
+                    "release_date": track.get("release_date", ""),
+                    "label": track.get("label", ""),
                     "duration_ms": track.get("duration_ms", 0),
                     "score": track.get("score", 0),
-                    "bpm": spynners_track.get("bpm") if spynners_track else None,
-                    "energy_level": spynners_track.get("energy_level") if spynners_track else None,
-                    "mood": spynners_track.get("mood") if spynners_track else None,
-                    "spynners_track_id": spynners_track.get("id") if spynners_track else None,
-                    "producer_id": spynners_track.get("producer_id") if spynners_track else None,
+                    "bpm": track.get("bpm"),
+                    "spynners_track_id": spynners_track_id,
+                    "producer_id": producer_id,
                     "producer_email": producer_email,
                     "acrcloud_id": acr_id,
-                    "isrc": spynners_track.get("isrc") if spynners_track else None,
-                    "play_offset_ms": result.get("metadata", {}).get("played_duration", 0) * 1000
+                    "play_offset_ms": track.get("play_offset_ms", 0),
+                    "is_spynners_track": True
                 }
                 
-                print(f"[SPYNNERS] Final result: {recognition_result['title']} by {recognition_result['artist']}")
-                print(f"[SPYNNERS] Cover image: {cover_image}")
-                
-                # Save to history
-                if authorization:
-                    try:
-                        token_data = base64.b64decode(authorization.replace("Bearer ", "")).decode()
-                        user_id = token_data.split(":")[0]
-                        recognition_history_collection.insert_one({
-                            "user_id": user_id,
-                            "result": recognition_result,
-                            "timestamp": datetime.utcnow().isoformat()
-                        })
-                    except:
-                        pass
-                
+                print(f"[SPYNNERS] ✅ Direct match from custom_files: {track_title}")
+                print(f"[SPYNNERS] Producer ID: {producer_id}, Email: {producer_email}")
                 return recognition_result
+            
+            # ==================== SEARCH IN SPYNNERS DATABASE ====================
+            # For non-custom tracks, look the match up in the in-memory catalog
+            # index (by acrcloud_id, then by fuzzy title)
+            spynners_track = None
+            cover_image = None
+            producer_email = None
+            
+            try:
+                spynners_track = await find_spynners_track(acr_id, track_title, track_artist)
+                
+                # Get artwork and producer info from Spynners track
+                if spynners_track:
+                    cover_image = spynners_track.get("artwork_url")
+                    producer_id = spynners_track.get("producer_id")
+                    
+                    print(f"[SPYNNERS] Artwork URL: {cover_image}")
+                    print(f"[SPYNNERS] Producer ID: {producer_id}")
+                    
+                    # Update the acrcloud_id in Spynners if it was empty
+                    if acr_id and not spynners_track.get("acrcloud_id"):
+                        try:
+                            async with upstream_client("base44") as update_client:
+                                await update_client.put(
+                                    f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track/{spynners_track.get('id')}",
+                                    json={"acrcloud_id": acr_id},
+                                    headers={"X-Base44-App-Id": BASE44_APP_ID},
+                                    timeout=5.0
+                                )
+                                spynners_catalog.upsert({**spynners_track, "acrcloud_id": acr_id})
+                                print(f"[SPYNNERS] Updated acrcloud_id for track")
+                        except:
+                            pass
+                    
+                    # Get producer email for notification
+                    if producer_id:
+                        try:
+                            producer_email = await get_producer_email(producer_id)
+                            print(f"[SPYNNERS] Producer email: {producer_email}")
+                        except Exception as e:
+                            print(f"[SPYNNERS] Could not get producer email: {e}")
+                else:
+                    print(f"[SPYNNERS] Track NOT found in Spynners database: '{track_title}' by '{track_artist}'")
+                    
+            except Exception as e:
+                print(f"[SPYNNERS] Error searching Spynners database: {e}")
+            
+            # Extract genre from Spynners track or ACRCloud
+            genre = ""
+            if spynners_track:
+                genre = spynners_track.get("genre", "")
+            if not genre:
+                genres = [g.get("name") for g in track.get("genres", [])]
+                genre = genres[0] if genres else ""
+            
+            # Build recognition result using SPYNNERS data
+            recognition_result = {
+                "success": True,
+                "title": spynners_track.get("title") if spynners_track else track_title,
+                "artist": spynners_track.get("producer_name") if spynners_track else track_artist,
+                "album": spynners_track.get("album", "") if spynners_track else track.get("album", {}).get("name", ""),
+                "cover_image": cover_image,  # From Spynners artwork_url
+                "genre": genre,
+                "genres": [genre] if genre else [],
+                "release_date": spynners_track.get("release_date", "") if spynners_track else "",
+                "label": spynners_track.get("label", "") if spynners_track else "",
+                "duration_ms": track.get("duration_ms", 0),
+                "score": track.get("score", 0),
+                "bpm": spynners_track.get("bpm") if spynners_track else None,
+                "energy_level": spynners_track.get("energy_level") if spynners_track else None,
+                "mood": spynners_track.get("mood") if spynners_track else None,
+                "spynners_track_id": spynners_track.get("id") if spynners_track else None,
+                "producer_id": spynners_track.get("producer_id") if spynners_track else None,
+                "producer_email": producer_email,
+                "acrcloud_id": acr_id,
+                "isrc": spynners_track.get("isrc") if spynners_track else None,
+                "play_offset_ms": track.get("play_offset_ms") or result.get("metadata", {}).get("played_duration", 0) * 1000
+            }
+            
+            print(f"[SPYNNERS] Final result: {recognition_result['title']} by {recognition_result['artist']}")
+            print(f"[SPYNNERS] Cover image: {cover_image}")
+            return recognition_result
+    
+    # Not recognized
+    return {
+        "success": False,
+        "message": "Could not identify the track",
+        "status": result.get("status", {})
+    }
+
+
+async def recognize_audio_data(audio_data: bytes, audio_format: Optional[str] = None,
+                               known_result: Optional[dict] = None, workspace=None) -> dict:
+    """
+    Identify + enrich a decoded sample, reusing recent results for identical audio.
+    Without `audio_format` the container is detected from the bytes. When ACRCloud
+    returns the acrid of `known_result`, the enrichment is reused instead of redone.
+    `workspace` is the sample already decoded by the caller, if any.
+    """
+    digest = audio_hash(audio_data)
+    cached = recognition_cache.get(digest)
+    if cached is not None:
+        print(f"[ACRCloud] Recognition cache hit for audio {digest[:12]}")
+        return {**cached, "cached": True}
+    
+    task = recognitions_in_flight.get(digest)
+    if task is None:
+        task = asyncio.ensure_future(_recognize_uncached(audio_data, digest, audio_format, known_result, workspace))
+        recognitions_in_flight[digest] = task
+        task.add_done_callback(lambda _: recognitions_in_flight.pop(digest, None))
+    # Shielded: a client dropping its request doesn't cancel the call others wait on
+    recognition_result = await asyncio.shield(task)
+    return {**recognition_result, "cached": False}
+
+
+def acrcloud_top_track(result: dict) -> Optional[dict]:
+    """Best track of an ACRCloud result (custom_files first, then music)"""
+    metadata = result.get("metadata", {}) if result.get("status", {}).get("code", -1) == 0 else {}
+    tracks = metadata.get("custom_files") or metadata.get("music") or []
+    return tracks[0] if tracks else None
+
+
+async def _recognize_uncached(audio_data: bytes, digest: str, audio_format: Optional[str],
+                              known_result: Optional[dict] = None, workspace=None) -> dict:
+    report = await prepare_recognition_sample(audio_data, workspace=workspace)
+    if report and not report["ok"]:
+        return quality_rejection(report)
+    
+    sample, audio_format, extra_fields = recognition_payload(audio_data, report, audio_format)
+    result, source = await acrcloud_identify_hedged(sample, extra_fields, audio_format)
+    print(f"[ACRCloud] Full response ({source}): {json.dumps(result, indent=2)[:500]}")
+    
+    track = acrcloud_top_track(result)
+    if known_result and track and track.get("acrid") and track.get("acrid") == known_result.get("acrcloud_id"):
+        # Same track as the session's current one: skip the Spynners enrichment
+        recognition_result = {**known_result, "play_offset_ms": track.get("play_offset_ms", 0)}
+        recognition_result.pop("same_track", None)
+        recognition_result.pop("predicted", None)
+    else:
+        recognition_result = await enrich_recognition(result)
+    recognition_result["recognition_source"] = source
+    if result.get("status", {}).get("code", -1) in CACHEABLE_ACRCLOUD_CODES:
+        recognition_cache.set(digest, recognition_result)
+        acrcloud_result_cache.set(digest, (result, source))
+    return recognition_result
+
+
+def token_user_id(authorization: Optional[str]) -> Optional[str]:
+    """User id from a local "Bearer base64(user_id:timestamp)" token"""
+    if not authorization:
+        return None
+    try:
+        token_data = base64.b64decode(authorization.replace("Bearer ", "")).decode()
+        return token_data.split(":")[0] or None
+    except Exception:
+        return None
+
+
+async def save_recognition_history(authorization: Optional[str], recognition_result: dict):
+    """Save a successful recognition to the user's history (once per track in a session)"""
+    if not recognition_result.get("success") or recognition_result.get("same_track") or not authorization:
+        return
+    try:
+        user_id = token_user_id(authorization)
+        if not user_id:
+            return
+        await recognition_history_collection.insert_one({
+            "user_id": user_id,
+            "result": recognition_result,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    except:
+        pass
+
+
+# SPYN sessions: the current track of each session (keyed by session id, or user),
+# so repeated snippets of the same track skip ACRCloud, enrichment and history writes
+SPYN_SESSION_TTL = float(os.getenv("SPYN_SESSION_TTL", "900"))  # Idle sessions expire after this
+SPYN_SESSION_SHORTCUT_SECONDS = float(os.getenv("SPYN_SESSION_SHORTCUT_SECONDS", "30"))  # Max age of a match reused without ACRCloud
+SPYN_SESSION_END_MARGIN_MS = 20000  # Never predict into the last seconds of a track
+
+spyn_sessions = TTLCache("spyn_sessions", SPYN_SESSION_TTL, 10000)
+spyn_session_stats = {"short_circuited": 0, "same_track": 0, "track_changes": 0}
+lookup_caches.append(spyn_sessions)
+
+
+def spyn_session_key(session_id: Optional[str], authorization: Optional[str]) -> Optional[str]:
+    if session_id:
+        return f"session:{session_id}"
+    user_id = token_user_id(authorization)
+    return f"user:{user_id}" if user_id else None
+
+
+async def decode_snippet(audio_data: bytes):
+    """
+    Decode a snippet once (through ffmpeg for the app's m4a/AAC) -> (workspace,
+    spectral signature); the workspace is reused by the quality gate.
+    (None, None) when it can't be decoded.
+    """
+    workspace = await decode_recognition_audio(audio_data)
+    if workspace is None:
+        return None, None
+    head = workspace.head(STREAM_SIGNATURE_SECONDS * 2)
+    return workspace, await asyncio.to_thread(audio_analysis.band_signature, head.samples, head.sample_rate)
+
+
+async def recognize_in_session(audio_data: bytes, audio_format: Optional[str], session_key: Optional[str]) -> dict:
+    """
+    recognize_audio_data() with per-session track-change detection. While a
+    snippet is predicted to still be inside the session's current track
+    (recent match, before the end of the track, same spectral shape) the
+    known result is returned without calling ACRCloud. Results for the same
+    acrid are flagged "same_track" so history isn't written again.
+    """
+    state = spyn_sessions.get(session_key) if session_key else None
+    workspace = signature = None
+    if AUDIO_ANALYSIS_AVAILABLE and session_key:
+        workspace, signature = await decode_snippet(audio_data)
+    
+    if state:
+        elapsed_ms = (time.time() - state["verified_at"]) * 1000
+        predicted_offset = state["play_offset_ms"] + elapsed_ms
+        inside_track = not state["duration_ms"] or predicted_offset < state["duration_ms"] - SPYN_SESSION_END_MARGIN_MS
+        same_audio = (
+            signature is not None and state["signature"] is not None
+            and audio_analysis.signature_distance(signature, state["signature"]) <= STREAM_CHANGE_THRESHOLD
+        )
+        if elapsed_ms < SPYN_SESSION_SHORTCUT_SECONDS * 1000 and inside_track and same_audio:
+            spyn_session_stats["short_circuited"] += 1
+            print(f"[SPYN Session] Still playing '{state['result'].get('title')}' (predicted offset {predicted_offset / 1000:.0f}s)")
+            return {**state["result"], "play_offset_ms": int(predicted_offset), "same_track": True, "predicted": True, "cached": False}
+    
+    known_result = state["result"] if state else None
+    recognition_result = await recognize_audio_data(audio_data, audio_format, known_result, workspace)
+    if not session_key:
+        return recognition_result
+    
+    if recognition_result.get("success"):
+        same_track = bool(known_result) and recognition_track_key(recognition_result) == recognition_track_key(known_result)
+        if same_track:
+            spyn_session_stats["same_track"] += 1
+            recognition_result = {**recognition_result, "same_track": True}
+        else:
+            spyn_session_stats["track_changes"] += 1
+        spyn_sessions.set(session_key, {
+            "result": {k: v for k, v in recognition_result.items() if k not in ("same_track", "predicted", "cached")},
+            "play_offset_ms": recognition_result.get("play_offset_ms") or 0,
+            "duration_ms": recognition_result.get("duration_ms") or 0,
+            "verified_at": time.time(),
+            "signature": signature
+        })
+    elif recognition_result.get("status") is not None:
+        # ACRCloud heard no track: the previous one is over
+        spyn_sessions.invalidate(session_key)
+    return recognition_result
+
+
+@app.post("/api/recognize-audio")
+async def recognize_audio(request: AudioRecognitionRequest, authorization: Optional[str] = Header(None)):
+    """
+    Recognize audio using ACRCloud
+    Expects base64 encoded audio data
+    """
+    if not ACRCLOUD_ACCESS_KEY or not ACRCLOUD_ACCESS_SECRET:
+        raise HTTPException(
+            status_code=503, 
+            detail="ACRCloud not configured. Please set ACRCLOUD_ACCESS_KEY and ACRCLOUD_ACCESS_SECRET in backend/.env"
+        )
+    
+    try:
+        # Decode base64 audio
+        audio_data = base64.b64decode(request.audio_base64)
         
-        # Not recognized
-        return {
-            "success": False,
-            "message": "Could not identify the track",
-            "status": result.get("status", {})
-        }
+        print(f"[ACRCloud] Received audio: {len(audio_data)} bytes")
+        print(f"[ACRCloud] First 20 bytes (hex): {audio_data[:20].hex()}")
+        
+        # Decoded, trimmed and labelled with its real format in the recognition pipeline
+        session_key = spyn_session_key(request.session_id, authorization)
+        recognition_result = await recognize_in_session(audio_data, None, session_key)
+        await save_recognition_history(authorization, recognition_result)
+        return recognition_result
+        
+    except Exception as e:
+        print(f"ACRCloud error: {e}")
+        raise HTTPException(status_code=500, detail=f"Recognition failed: {str(e)}")
+
+
+@app.post("/api/recognize-audio/binary")
+async def recognize_audio_binary(request: Request, authorization: Optional[str] = Header(None)):
+    """
+    Recognize audio using ACRCloud
+    Expects the raw audio as the request body (application/octet-stream)
+    or as a multipart upload (field "audio" or "file"). wav, m4a/AAC, webm,
+    Ogg/Opus and mp3 are accepted. Same response as /api/recognize-audio,
+    without the base64 overhead. The SPYN session id can be passed as the
+    `session_id` query parameter or the X-Spyn-Session header.
+    """
+    if not ACRCLOUD_ACCESS_KEY or not ACRCLOUD_ACCESS_SECRET:
+        raise HTTPException(
+            status_code=503, 
+            detail="ACRCloud not configured. Please set ACRCLOUD_ACCESS_KEY and ACRCLOUD_ACCESS_SECRET in backend/.env"
+        )
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_RECOGNITION_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Audio sample too large")
+    
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("audio") or form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Missing audio file (field 'audio' or 'file')")
+            audio_data = await upload.read()
+        else:
+            audio_data = await request.body()
+        
+        if not audio_data:
+            raise HTTPException(status_code=400, detail="Empty audio sample")
+        if len(audio_data) > MAX_RECOGNITION_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Audio sample too large")
+        
+        audio_format = detect_audio_format(audio_data)
+        print(f"[ACRCloud] Received binary audio: {len(audio_data)} bytes ({audio_format})")
+        
+        session_id = request.query_params.get("session_id") or request.headers.get("x-spyn-session")
+        session_key = spyn_session_key(session_id, authorization)
+        recognition_result = await recognize_in_session(audio_data, audio_format, session_key)
+        await save_recognition_history(authorization, recognition_result)
+        return recognition_result
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ACRCloud error: {e}")
         raise HTTPException(status_code=500, detail=f"Recognition failed: {str(e)}")
 
 
-# ==================== AUDIO CONVERSION ====================
+# ==================== STREAMING RECOGNITION ====================
+# Continuous SPYN sessions stream audio over a WebSocket instead of POSTing a
+# snippet every few seconds. The server keeps a ring buffer per connection and
+# only calls ACRCloud when the audio changed (or to re-confirm now and then).
+#
+# Protocol (/api/ws/recognize?format=pcm16&sample_rate=16000&token=...):
+#   client -> binary frames: audio chunks (pcm16 = mono little-endian 16-bit PCM,
+#             aac = ADTS AAC frames)
+#   client -> {"type": "identify"} forces an identification, {"type": "stop"} closes
+#   server -> {"type": "ready"}, {"type": "now_playing", "track": {...}} when the
+#             track changes, {"type": "no_match"}, {"type": "error"}
+
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "10"))  # Audio sent per identification
+STREAM_MIN_SECONDS = 6.0  # Buffered audio needed before the first identification
+STREAM_MIN_INTERVAL = float(os.getenv("STREAM_MIN_INTERVAL", "5"))  # Never identify more often than this
+STREAM_RECHECK_INTERVAL = float(os.getenv("STREAM_RECHECK_INTERVAL", "60"))  # Re-identify unchanged audio after this
+STREAM_COMPRESSED_INTERVAL = float(os.getenv("STREAM_COMPRESSED_INTERVAL", "15"))  # AAC streams: no change detection
+STREAM_CHANGE_THRESHOLD = float(os.getenv("STREAM_CHANGE_THRESHOLD", "0.15"))  # Signature distance meaning "new audio"
+STREAM_SIGNATURE_SECONDS = 4.0
+STREAM_MAX_BUFFER_BYTES = 1024 * 1024  # Compressed streams: hard cap on top of the STREAM_WINDOW_SECONDS window
+STREAM_DEFAULT_SAMPLE_RATE = 16000
+
+stream_stats = {"connections": 0, "active": 0, "identifications": 0, "skipped_unchanged": 0, "track_changes": 0}
+
+
+def recognition_track_key(recognition_result: dict) -> Optional[str]:
+    """Identity of a recognized track, used to tell whether the track changed"""
+    if not recognition_result.get("success"):
+        return None
+    return (recognition_result.get("spynners_track_id")
+            or recognition_result.get("acrcloud_id")
+            or f"{recognition_result.get('title')}|{recognition_result.get('artist')}")
+
+
+class StreamRecognitionSession:
+    """Per-connection state of a streaming SPYN session"""
+
+    def __init__(self, audio_format: str, sample_rate: int):
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.pcm = None
+        self.pcm_remainder = b""
+        if audio_format == "pcm16":
+            self.pcm = audio_analysis.RingBuffer(int(STREAM_WINDOW_SECONDS * sample_rate))
+        self.chunks = deque()  # Compressed streams: (arrival time, chunk) of the last STREAM_WINDOW_SECONDS
+        self.buffered_bytes = 0
+        self.started_at = time.monotonic()
+        self.last_identify_at = 0.0
+        self.last_signature = None
+        self.force = False
+        self.now_playing_key = None
+        self.now_playing = None
+
+    def append(self, chunk: bytes):
+        if self.pcm is not None:
+            data = self.pcm_remainder + chunk
+            usable = len(data) - len(data) % 2
+            self.pcm_remainder = data[usable:]
+            if usable:
+                self.pcm.write(audio_analysis.pcm16_to_float(data[:usable]))
+            return
+        # Chunks arrive in real time: those received before the window are dropped
+        # once the next one is old enough to cover it on its own
+        now = time.monotonic()
+        self.chunks.append((now, chunk))
+        self.buffered_bytes += len(chunk)
+        while len(self.chunks) > 1 and (
+            self.chunks[1][0] <= now - STREAM_WINDOW_SECONDS or self.buffered_bytes > STREAM_MAX_BUFFER_BYTES
+        ):
+            self.buffered_bytes -= len(self.chunks.popleft()[1])
+
+    def buffered_seconds(self) -> float:
+        if self.pcm is not None:
+            return self.pcm.size / self.sample_rate
+        return time.monotonic() - self.started_at if self.chunks else 0.0
+
+    def should_identify(self):
+        """(identify now?, signature of the current audio)"""
+        since_last = time.monotonic() - self.last_identify_at
+        if self.buffered_seconds() < min(STREAM_MIN_SECONDS, STREAM_WINDOW_SECONDS) or since_last < STREAM_MIN_INTERVAL:
+            return False, None
+        if self.force:
+            return True, None
+        if self.pcm is None:
+            return since_last >= STREAM_COMPRESSED_INTERVAL, None
+        
+        signature = audio_analysis.band_signature(
+            self.pcm.latest(int(STREAM_SIGNATURE_SECONDS * self.sample_rate)), self.sample_rate
+        )
+        if self.last_signature is None or since_last >= STREAM_RECHECK_INTERVAL:
+            return True, signature
+        if audio_analysis.signature_distance(signature, self.last_signature) > STREAM_CHANGE_THRESHOLD:
+            return True, signature
+        stream_stats["skipped_unchanged"] += 1
+        return False, None
+
+    def window(self):
+        """(bytes, audio_format) of the audio to identify"""
+        if self.pcm is not None:
+            return audio_analysis.encode_wav(self.pcm.latest(), self.sample_rate), "wav"
+        return b"".join(chunk for _, chunk in self.chunks), self.audio_format
+
+
+@app.websocket("/api/ws/recognize")
+async def recognize_stream(websocket: WebSocket):
+    """
+    Streaming recognition for continuous SPYN sessions.
+    Pushes "now_playing" events whenever the identified track changes.
+    """
+    audio_format = websocket.query_params.get("format", "pcm16").lower()
+    try:
+        sample_rate = int(websocket.query_params.get("sample_rate", STREAM_DEFAULT_SAMPLE_RATE))
+    except ValueError:
+        sample_rate = 0
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization") or (f"Bearer {token}" if token else None)
+    
+    await websocket.accept()
+    
+    error = None
+    if not ACRCLOUD_ACCESS_KEY or not ACRCLOUD_ACCESS_SECRET:
+        error = "ACRCloud not configured"
+    elif audio_format not in ("pcm16", "aac"):
+        error = "Unsupported format (use pcm16 or aac)"
+    elif audio_format == "pcm16" and not AUDIO_ANALYSIS_AVAILABLE:
+        error = "PCM streaming unavailable (numpy/soundfile missing)"
+    elif audio_format == "pcm16" and not 8000 <= sample_rate <= 48000:
+        error = "sample_rate must be between 8000 and 48000"
+    if error:
+        await websocket.send_json({"type": "error", "message": error})
+        await websocket.close(code=1003)
+        return
+    
+    session = StreamRecognitionSession(audio_format, sample_rate)
+    send_lock = asyncio.Lock()
+    identify_task = None
+    stream_stats["connections"] += 1
+    stream_stats["active"] += 1
+    print(f"[Stream] Session started ({audio_format}, {sample_rate} Hz)")
+    
+    async def send(event: dict):
+        async with send_lock:
+            await websocket.send_json(event)
+    
+    async def identify(signature):
+        stream_stats["identifications"] += 1
+        try:
+            audio_data, window_format = session.window()
+            recognition_result = await recognize_audio_data(audio_data, window_format, session.now_playing)
+            track_key = recognition_track_key(recognition_result)
+            if track_key and track_key != session.now_playing_key:
+                session.now_playing_key = track_key
+                session.now_playing = recognition_result
+                stream_stats["track_changes"] += 1
+                print(f"[Stream] Now playing: {recognition_result.get('title')} by {recognition_result.get('artist')}")
+                await send({"type": "now_playing", "track": recognition_result})
+                await save_recognition_history(authorization, recognition_result)
+            elif not track_key:
+                await send({
+                    "type": "no_match",
+                    "message": recognition_result.get("message", "Could not identify the track"),
+                    "reason": recognition_result.get("reason")
+                })
+            # Only remember the audio we actually got an answer for
+            if signature is not None:
+                session.last_signature = signature
+        except Exception as e:
+            print(f"[Stream] Identification error: {e}")
+            try:
+                await send({"type": "error", "message": f"Recognition failed: {str(e)}"})
+            except Exception:
+                pass  # Socket already gone
+    
+    await send({
+        "type": "ready",
+        "format": audio_format,
+        "sample_rate": sample_rate if audio_format == "pcm16" else None,
+        "window_seconds": STREAM_WINDOW_SECONDS
+    })
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                session.append(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") == "stop":
+                    break
+                if control.get("type") == "identify":
+                    session.force = True
+            
+            if identify_task is None or identify_task.done():
+                due, signature = session.should_identify()
+                if due:
+                    session.force = False
+                    session.last_identify_at = time.monotonic()
+                    identify_task = asyncio.create_task(identify(signature))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if identify_task and not identify_task.done():
+            identify_task.cancel()
+        stream_stats["active"] -= 1
+        print(f"[Stream] Session ended")
+    
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+
+# ==================== AUDIO CONVERSION ====================
+
+# ffmpeg runs as an asyncio subprocess: the event loop keeps serving other
+# users, and at most FFMPEG_MAX_CONCURRENCY processes run at once (the others
+# wait in line, which is what queue depth in /api/metrics measures)
+FFMPEG_PATH = "/usr/bin/ffmpeg" if os.path.exists("/usr/bin/ffmpeg") else (shutil.which("ffmpeg") or "ffmpeg")
+FFMPEG_MAX_CONCURRENCY = int(os.getenv("FFMPEG_MAX_CONCURRENCY", str(max(1, (os.cpu_count() or 2) // 2))))
+FFMPEG_DISCONNECT_POLL_SECONDS = 0.5
+FFMPEG_CHUNK_SIZE = 64 * 1024
+
+ffmpeg_slots: Optional[asyncio.Semaphore] = None
+ffmpeg_stats = {
+    "running": 0, "queued": 0, "max_queued": 0,
+    "completed": 0, "failed": 0, "timeouts": 0, "cancelled": 0,
+    "started": 0, "wait_ms_total": 0.0, "run_ms_total": 0.0, "run_ms_max": 0.0
+}
+
+
+class ClientDisconnected(Exception):
+    """The client went away while its ffmpeg job was waiting or running"""
+
+
+class FFmpegError(Exception):
+    """ffmpeg exited with an error (message = end of its stderr)"""
+
+
+async def wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(FFMPEG_DISCONNECT_POLL_SECONDS)
+
+
+def abandon_ffmpeg_acquire(acquire: asyncio.Task):
+    """Cancel a pending slot acquisition, giving the slot back if it was acquired meanwhile"""
+    def release_if_acquired(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is None:
+            ffmpeg_slots.release()
+    acquire.cancel()
+    acquire.add_done_callback(release_if_acquired)
+
+
+async def acquire_ffmpeg_slot(watcher: Optional[asyncio.Task]) -> bool:
+    """Wait for a free ffmpeg slot; False if the client disconnected first"""
+    acquire = asyncio.create_task(ffmpeg_slots.acquire())
+    try:
+        done, _ = await asyncio.wait({acquire, watcher} if watcher else {acquire}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # The caller went away while waiting in line: the slot must not leak
+        abandon_ffmpeg_acquire(acquire)
+        if watcher:
+            watcher.cancel()
+        raise
+    if acquire in done:
+        return True
+    abandon_ffmpeg_acquire(acquire)
+    return False
+
+
+@asynccontextmanager
+async def ffmpeg_slot(request: Optional[Request] = None):
+    """
+    Hold one of the FFMPEG_MAX_CONCURRENCY ffmpeg slots, waiting in line for
+    it. Yields a task that completes when the client of `request` disconnects
+    (None without a request); raises ClientDisconnected if it leaves while waiting.
+    """
+    global ffmpeg_slots
+    if ffmpeg_slots is None:
+        ffmpeg_slots = asyncio.Semaphore(FFMPEG_MAX_CONCURRENCY)
+    
+    watcher = asyncio.create_task(wait_for_disconnect(request)) if request else None
+    queued_at = time.perf_counter()
+    ffmpeg_stats["queued"] += 1
+    ffmpeg_stats["max_queued"] = max(ffmpeg_stats["max_queued"], ffmpeg_stats["queued"])
+    try:
+        acquired = await acquire_ffmpeg_slot(watcher)
+    finally:
+        ffmpeg_stats["queued"] -= 1
+    if not acquired:
+        ffmpeg_stats["cancelled"] += 1
+        raise ClientDisconnected()
+    
+    started = time.perf_counter()
+    ffmpeg_stats["started"] += 1
+    ffmpeg_stats["running"] += 1
+    ffmpeg_stats["wait_ms_total"] += (started - queued_at) * 1000
+    try:
+        yield watcher
+    finally:
+        if watcher:
+            watcher.cancel()
+        run_ms = (time.perf_counter() - started) * 1000
+        ffmpeg_stats["running"] -= 1
+        ffmpeg_stats["run_ms_total"] += run_ms
+        ffmpeg_stats["run_ms_max"] = max(ffmpeg_stats["run_ms_max"], run_ms)
+        ffmpeg_slots.release()
+
+
+async def run_ffmpeg(args: List[str], timeout: float, request: Optional[Request] = None,
+                     input_data: Optional[bytes] = None):
+    """
+    Run ffmpeg with `args` without blocking the event loop -> (returncode, stdout, stderr).
+    `input_data` is piped to stdin. Raises asyncio.TimeoutError after `timeout`
+    seconds and ClientDisconnected when the client of `request` goes away; the
+    process is killed in both cases.
+    """
+    async with ffmpeg_slot(request) as watcher:
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_PATH, *args,
+                stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            communicate = asyncio.create_task(process.communicate(input_data))
+            done, _ = await asyncio.wait(
+                {communicate, watcher} if watcher else {communicate},
+                timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if communicate in done:
+                stdout, stderr = communicate.result()
+                ffmpeg_stats["completed" if process.returncode == 0 else "failed"] += 1
+                return process.returncode, stdout, stderr
+            communicate.cancel()
+            if watcher in done:
+                ffmpeg_stats["cancelled"] += 1
+                raise ClientDisconnected()
+            ffmpeg_stats["timeouts"] += 1
+            raise asyncio.TimeoutError(f"ffmpeg timed out after {timeout:g}s")
+        finally:
+            if process and process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+async def stream_ffmpeg(args: List[str], source, timeout: float, request: Optional[Request] = None):
+    """
+    Run ffmpeg and yield its stdout as it is produced. `source` (bytes or an
+    async iterator of chunks) is fed to stdin concurrently, or None when the
+    input is a file. Raises FFmpegError when ffmpeg fails, asyncio.TimeoutError
+    after `timeout` seconds and ClientDisconnected when the client of `request`
+    goes away; the process is killed as soon as the consumer stops.
+    """
+    deadline = time.monotonic() + timeout
+    async with ffmpeg_slot(request) as watcher:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_PATH, *args,
+            stdin=asyncio.subprocess.PIPE if source is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_tail = bytearray()
+        
+        async def feed():
+            try:
+                if isinstance(source, (bytes, bytearray)):
+                    for start in range(0, len(source), FFMPEG_CHUNK_SIZE):
+                        process.stdin.write(source[start:start + FFMPEG_CHUNK_SIZE])
+                        await process.stdin.drain()
+                else:
+                    async for chunk in source:
+                        process.stdin.write(chunk)
+                        await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg stopped reading; its exit code tells why
+            except ClientDisconnect:
+                raise ClientDisconnected()
+            finally:
+                process.stdin.close()
+        
+        async def read_stderr():
+            while True:
+                chunk = await process.stderr.read(4096)
+                if not chunk:
+                    break
+                stderr_tail.extend(chunk)
+                del stderr_tail[:-2048]
+        
+        feeder = asyncio.create_task(feed()) if source is not None else None
+        stderr_reader = asyncio.create_task(read_stderr())
+        outcome = "cancelled"  # Consumer stopped early or client went away
+        try:
+            while True:
+                if watcher and watcher.done():
+                    raise ClientDisconnected()
+                if feeder and feeder.done() and not feeder.cancelled() and feeder.exception():
+                    raise feeder.exception()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"ffmpeg timed out after {timeout:g}s")
+                chunk = await asyncio.wait_for(process.stdout.read(FFMPEG_CHUNK_SIZE), remaining)
+                if not chunk:
+                    break
+                yield chunk
+            await asyncio.wait_for(process.wait(), max(1.0, deadline - time.monotonic()))
+            await stderr_reader
+            if feeder:
+                await feeder  # Surfaces errors of the input stream (e.g. the upload was cut)
+            if process.returncode != 0:
+                outcome = "failed"
+                raise FFmpegError(stderr_tail.decode(errors="replace").strip() or f"ffmpeg exited with {process.returncode}")
+            outcome = "completed"
+        except asyncio.TimeoutError:
+            outcome = "timeouts"
+            raise asyncio.TimeoutError(f"ffmpeg timed out after {timeout:g}s")
+        finally:
+            ffmpeg_stats[outcome] += 1
+            for task in (feeder, stderr_reader):
+                if task and not task.done():
+                    task.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+def ffmpeg_metrics() -> dict:
+    started = ffmpeg_stats["started"]
+    return {
+        "max_concurrency": FFMPEG_MAX_CONCURRENCY,
+        "running": ffmpeg_stats["running"],
+        "queued": ffmpeg_stats["queued"],
+        "max_queued": ffmpeg_stats["max_queued"],
+        "completed": ffmpeg_stats["completed"],
+        "failed": ffmpeg_stats["failed"],
+        "timeouts": ffmpeg_stats["timeouts"],
+        "cancelled": ffmpeg_stats["cancelled"],
+        "avg_wait_ms": round(ffmpeg_stats["wait_ms_total"] / started, 1) if started else 0.0,
+        "avg_run_ms": round(ffmpeg_stats["run_ms_total"] / started, 1) if started else 0.0,
+        "max_run_ms": round(ffmpeg_stats["run_ms_max"], 1)
+    }
+
 
 class ConvertAudioRequest(BaseModel):
     audio_base64: str
     output_format: str = "mp3"  # mp3, wav, etc.
+    response_format: str = "base64"  # "base64" (JSON) or "binary" (streamed audio)
+
+# Output options per format; all muxers can write to a pipe (m4a as fragmented MP4)
+FFMPEG_OUTPUT_ARGS = {
+    "mp3": ["-codec:a", "libmp3lame", "-b:a", "320k", "-f", "mp3"],  # High quality MP3
+    "wav": ["-f", "wav"],
+    "aac": ["-codec:a", "aac", "-b:a", "256k", "-f", "adts"],
+    "m4a": ["-codec:a", "aac", "-b:a", "256k", "-movflags", "frag_keyframe+empty_moov", "-f", "mp4"],
+    "ogg": ["-codec:a", "libvorbis", "-f", "ogg"],
+    "flac": ["-f", "flac"],
+}
+CONVERT_TIMEOUT_SECONDS = 120
+CONVERT_HEAD_BYTES = 64 * 1024  # Read before choosing between piping and spooling the input
+DECODE_TIMEOUT_SECONDS = 20  # Recognition samples decoded to PCM (a few seconds of audio)
+
+
+def mp4_needs_seek(head: bytes) -> bool:
+    """
+    True when an MP4/M4A file has its index (moov) after the audio (mdat), as
+    iOS recordings do: ffmpeg can only read those from a seekable file.
+    """
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box = struct.unpack(">I4s", head[offset:offset + 8])
+        if box == b"moov":
+            return False
+        if box == b"mdat" or size == 0:
+            return True
+        if size == 1:
+            if offset + 16 > len(head):
+                return True
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]
+        if size < 8:
+            return True
+        offset += size
+    return True
+
+
+def convert_args(input_arg: str, output_format: str) -> List[str]:
+    output_args = FFMPEG_OUTPUT_ARGS.get(output_format, ["-f", output_format])
+    return ["-hide_banner", "-loglevel", "error", "-i", input_arg, "-ar", "44100", "-ac", "2", *output_args, "pipe:1"]
+
+
+def spool_file(data: bytes, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(data)
+        return f.name
+
+
+async def ffmpeg_decode_pcm(audio_data: bytes, sample_rate: int, max_seconds: Optional[float] = None) -> bytes:
+    """
+    Decode (the first `max_seconds` of) any format ffmpeg reads to mono
+    16-bit PCM at `sample_rate`, in an ffmpeg slot. MP4 input with its index
+    after the audio is spooled to a temp file. Raises FFmpegError on failure.
+    """
+    input_path = None
+    try:
+        if audio_data[4:8] == b"ftyp" and mp4_needs_seek(audio_data[:CONVERT_HEAD_BYTES]):
+            input_path = await asyncio.to_thread(spool_file, audio_data, ".m4a")
+        args = ["-hide_banner", "-loglevel", "error", "-i", input_path or "pipe:0"]
+        if max_seconds:
+            args += ["-t", f"{max_seconds:g}"]
+        args += ["-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+        returncode, stdout, stderr = await run_ffmpeg(
+            args, DECODE_TIMEOUT_SECONDS, input_data=None if input_path else audio_data
+        )
+        if returncode != 0 or not stdout:
+            raise FFmpegError(stderr.decode(errors="replace")[-500:] if stderr else "No audio decoded")
+        return stdout
+    finally:
+        if input_path:
+            try:
+                os.unlink(input_path)
+            except OSError:
+                pass
+
+
+async def transcode_stream(source, head: bytes, output_format: str, request: Optional[Request] = None):
+    """
+    Transcode through ffmpeg pipes, yielding the converted audio as it is
+    produced. `source` (bytes, or an async iterator of the whole input,
+    starting with `head`) is piped to stdin, except MP4 input that needs
+    seeking, which is spooled to a temp file first. `head` is only inspected.
+    """
+    input_path = None
+    try:
+        if head[4:8] == b"ftyp" and mp4_needs_seek(head):
+            with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as input_file:
+                input_path = input_file.name
+                if isinstance(source, (bytes, bytearray)):
+                    await asyncio.to_thread(input_file.write, source)
+                else:
+                    async for chunk in source:
+                        await asyncio.to_thread(input_file.write, chunk)
+            args, stdin = convert_args(input_path, output_format), None
+        else:
+            args, stdin = convert_args("pipe:0", output_format), source
+        
+        async for chunk in stream_ffmpeg(args, stdin, CONVERT_TIMEOUT_SECONDS, request):
+            yield chunk
+    finally:
+        if input_path:
+            try:
+                os.unlink(input_path)
+            except OSError:
+                pass
+
+
+class TranscodeResponse(StreamingResponse):
+    """
+    StreamingResponse that only starts listening for the client disconnecting
+    once the request body has been read: until then the ffmpeg input feeder
+    owns receive() (and notices a disconnect itself)
+    """
+    
+    def __init__(self, *args, input_done: Optional[asyncio.Event] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.input_done = input_done
+    
+    async def listen_for_disconnect(self, receive):
+        if self.input_done:
+            await self.input_done.wait()
+        await super().listen_for_disconnect(receive)
+
+
+async def conversion_response(chunks, output_format: str, input_done: Optional[asyncio.Event] = None):
+    """
+    Streamed response of a transcode. The first chunk is awaited before
+    answering so that an unreadable input still gets an error status.
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except FFmpegError as e:
+        print(f"[Audio Convert] Conversion failed: {e}")
+        return JSONResponse(status_code=422, content={"success": False, "message": f"Conversion failed: {str(e)[-500:]}"})
+    
+    async def body():
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except (FFmpegError, ClientDisconnected, asyncio.TimeoutError) as e:
+            # Headers are already sent: the response just ends early
+            print(f"[Audio Convert] Streamed conversion aborted: {type(e).__name__} {e}")
+    
+    return TranscodeResponse(
+        body(),
+        media_type=AUDIO_MIME_TYPES.get(output_format, "application/octet-stream"),
+        headers={"Content-Disposition": f'attachment; filename="converted.{output_format}"'},
+        input_done=input_done
+    )
+
 
 @app.post("/api/convert-audio")
-async def convert_audio(request: ConvertAudioRequest):
+async def convert_audio(request: ConvertAudioRequest, http_request: Request):
     """
     Convert audio from one format to another (e.g., m4a to mp3)
-    Returns the converted audio as base64
+    Returns the converted audio as base64, or streamed with response_format "binary"
     """
-    import subprocess
-    import tempfile
-    import os
-    
     try:
         # Decode base64 audio
         audio_data = base64.b64decode(request.audio_base64)
         print(f"[Audio Convert] Received {len(audio_data)} bytes for conversion to {request.output_format}")
+        print(f"[Audio Convert] Detected input format: {detect_audio_format(audio_data)}")
         
-        # Detect input format from magic bytes
-        input_extension = "m4a"  # Default
-        if audio_data[:4] == b'RIFF':
-            input_extension = "wav"
-        elif audio_data[:4] == b'\x1aE\xdf\xa3':
-            input_extension = "webm"
-        elif audio_data[:4] == b'ftyp' or audio_data[4:8] == b'ftyp':
-            input_extension = "m4a"
-        elif audio_data[:3] == b'ID3' or audio_data[:2] == b'\xff\xfb':
-            input_extension = "mp3"
-        elif audio_data[:4] == b'OggS':
-            input_extension = "ogg"
+        chunks = transcode_stream(audio_data, audio_data[:CONVERT_HEAD_BYTES], request.output_format, http_request)
+        if request.response_format == "binary":
+            return await conversion_response(chunks, request.output_format)
         
-        print(f"[Audio Convert] Detected input format: {input_extension}")
+        try:
+            converted_data = b"".join([chunk async for chunk in chunks])
+        except FFmpegError as e:
+            error_msg = str(e)[-500:]
+            print(f"[Audio Convert] Conversion failed: {error_msg}")
+            return {
+                "success": False,
+                "message": f"Conversion failed: {error_msg}"
+            }
         
-        # Create temp files
-        with tempfile.NamedTemporaryFile(suffix=f'.{input_extension}', delete=False) as input_file:
-            input_file.write(audio_data)
-            input_path = input_file.name
+        converted_base64 = base64.b64encode(converted_data).decode('utf-8')
+        print(f"[Audio Convert] Conversion successful! Output size: {len(converted_data)} bytes")
         
-        output_path = input_path.replace(f'.{input_extension}', f'.{request.output_format}')
+        return {
+            "success": True,
+            "audio_base64": converted_base64,
+            "format": request.output_format,
+            "size": len(converted_data)
+        }
         
-        try:
-            # Convert using ffmpeg
-            if request.output_format == "mp3":
-                # High quality MP3 conversion
-                cmd = [
-                    'ffmpeg', '-y', '-i', input_path,
-                    '-ar', '44100',      # 44.1kHz sample rate
-                    '-ac', '2',          # Stereo
-                    '-b:a', '320k',      # 320kbps bitrate
-                    '-codec:a', 'libmp3lame',
-                    output_path
-                ]
-            else:
-                # Generic conversion
-                cmd = [
-                    'ffmpeg', '-y', '-i', input_path,
-                    '-ar', '44100',
-                    '-ac', '2',
-                    output_path
-                ]
-            
-            print(f"[Audio Convert] Running: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, timeout=120)
-            
-            if result.returncode == 0 and os.path.exists(output_path):
-                with open(output_path, 'rb') as f:
-                    converted_data = f.read()
-                
-                converted_base64 = base64.b64encode(converted_data).decode('utf-8')
-                print(f"[Audio Convert] Conversion successful! Output size: {len(converted_data)} bytes")
-                
-                return {
-                    "success": True,
-                    "audio_base64": converted_base64,
-                    "format": request.output_format,
-                    "size": len(converted_data)
-                }
-            else:
-                error_msg = result.stderr.decode()[:500] if result.stderr else "Unknown error"
-                print(f"[Audio Convert] Conversion failed: {error_msg}")
-                return {
-                    "success": False,
-                    "message": f"Conversion failed: {error_msg}"
-                }
-                
-        finally:
-            # Cleanup temp files
+    except ClientDisconnected:
+        print("[Audio Convert] Client disconnected, conversion cancelled")
+        return {"success": False, "message": "Client disconnected"}
+    except asyncio.TimeoutError as e:
+        print(f"[Audio Convert] {e}")
+        raise HTTPException(status_code=504, detail="Conversion timed out")
+    except Exception as e:
+        print(f"[Audio Convert] Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+
+
+@app.post("/api/convert-audio/binary")
+async def convert_audio_binary(request: Request, output_format: str = "mp3"):
+    """
+    Streaming conversion: the raw audio body is piped into ffmpeg and the
+    converted audio streamed back as it is produced, so memory use does not
+    grow with the file size.
+    """
+    try:
+        input_done = asyncio.Event()
+        body = request.stream()
+        head = b""
+        async for chunk in body:
+            head += chunk
+            if len(head) >= CONVERT_HEAD_BYTES:
+                break
+        if not head:
+            raise HTTPException(status_code=400, detail="No audio data")
+        print(f"[Audio Convert] Streaming {detect_audio_format(head)} to {output_format}")
+        
+        async def source():
             try:
-                os.unlink(input_path)
-                if os.path.exists(output_path):
-                    os.unlink(output_path)
-            except:
-                pass
-                
+                yield head
+                async for chunk in body:
+                    yield chunk
+            finally:
+                input_done.set()
+        
+        # No disconnect watcher here: polling is_disconnected() would consume body messages
+        return await conversion_response(transcode_stream(source(), head, output_format), output_format, input_done)
+        
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        print("[Audio Convert] Client disconnected, conversion cancelled")
+        return {"success": False, "message": "Client disconnected"}
+    except asyncio.TimeoutError as e:
+        print(f"[Audio Convert] {e}")
+        raise HTTPException(status_code=504, detail="Conversion timed out")
     except Exception as e:
         print(f"[Audio Convert] Error: {e}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
@@ -713,15 +2329,11 @@ class ConcatenateAudioRequest(BaseModel):
     output_format: str = "m4a"  # Output format
 
 @app.post("/api/concatenate-audio")
-async def concatenate_audio(request: ConcatenateAudioRequest):
+async def concatenate_audio(request: ConcatenateAudioRequest, http_request: Request):
     """
     Concatenate multiple audio segments into a single file
     Returns the concatenated audio as base64
     """
-    import subprocess
-    import tempfile
-    import os
-    
     try:
         if not request.audio_segments:
             return {
@@ -756,23 +2368,17 @@ async def concatenate_audio(request: ConcatenateAudioRequest):
             # Output file
             output_path = os.path.join(temp_dir, f"concatenated.{request.output_format}")
             
-            # Find ffmpeg - try multiple paths
-            ffmpeg_path = '/usr/bin/ffmpeg'
-            if not os.path.exists(ffmpeg_path):
-                import shutil
-                ffmpeg_path = shutil.which('ffmpeg') or 'ffmpeg'
-            
             # Run ffmpeg concatenation
             cmd = [
-                ffmpeg_path, '-y', '-f', 'concat', '-safe', '0', '-i', concat_file_path,
+                '-y', '-f', 'concat', '-safe', '0', '-i', concat_file_path,
                 '-c', 'copy',  # Copy streams without re-encoding for speed
                 output_path
             ]
             
-            print(f"[Audio Concat] Running: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, timeout=300)  # 5 minute timeout
+            print(f"[Audio Concat] Running: ffmpeg {' '.join(cmd)}")
+            returncode, _, stderr = await run_ffmpeg(cmd, timeout=300, request=http_request)  # 5 minute timeout
             
-            if result.returncode == 0 and os.path.exists(output_path):
+            if returncode == 0 and os.path.exists(output_path):
                 with open(output_path, 'rb') as f:
                     concatenated_data = f.read()
                 
@@ -787,7 +2393,7 @@ async def concatenate_audio(request: ConcatenateAudioRequest):
                     "segments_count": len(request.audio_segments)
                 }
             else:
-                error_msg = result.stderr.decode()[:500] if result.stderr else "Unknown error"
+                error_msg = stderr.decode(errors="replace")[-500:] if stderr else "Unknown error"
                 print(f"[Audio Concat] Concatenation failed: {error_msg}")
                 return {
                     "success": False,
@@ -797,16 +2403,283 @@ async def concatenate_audio(request: ConcatenateAudioRequest):
         finally:
             # Cleanup temp files
             try:
-                import shutil
                 shutil.rmtree(temp_dir)
             except:
                 pass
                 
+    except ClientDisconnected:
+        print("[Audio Concat] Client disconnected, concatenation cancelled")
+        return {"success": False, "message": "Client disconnected"}
+    except asyncio.TimeoutError as e:
+        print(f"[Audio Concat] {e}")
+        raise HTTPException(status_code=504, detail="Concatenation timed out")
     except Exception as e:
         print(f"[Audio Concat] Error: {e}")
         raise HTTPException(status_code=500, detail=f"Concatenation failed: {str(e)}")
 
 
+# ==================== SPYN RECORD SESSIONS ====================
+
+# The app appends each SPYN Record segment as it is captured; segments are
+# kept on disk, so a crash or a lost phone never loses the whole set, and
+# finalize stream-copies them into one file without re-encoding.
+RECORDING_UPLOAD_DIR = os.getenv("RECORDING_UPLOAD_DIR", "/app/backend/uploads/recordings")
+RECORDING_MAX_SEGMENT_BYTES = int(os.getenv("RECORDING_MAX_SEGMENT_BYTES", str(200 * 1024 * 1024)))
+RECORDING_CONCAT_TIMEOUT_SECONDS = 300
+# An assembly not finished after this long died with its process: the session can be finalized again
+RECORDING_ASSEMBLY_STALE_SECONDS = int(os.getenv("RECORDING_ASSEMBLY_STALE_SECONDS", str(2 * RECORDING_CONCAT_TIMEOUT_SECONDS)))
+RECORDING_ABANDONED_DAYS = int(os.getenv("RECORDING_ABANDONED_DAYS", "7"))  # Unfinished sessions idle this long are deleted
+RECORDING_MAINTENANCE_INTERVAL = 3600
+
+
+class RecordingSessionRequest(BaseModel):
+    format: str = "m4a"  # Container of the segments and of the final file
+    title: Optional[str] = None
+
+class RecordingFinalizeRequest(BaseModel):
+    segmentsCount: Optional[int] = None  # Checked against the received segments when given
+
+
+def recording_path(recording_id: str, name: str) -> str:
+    return os.path.join(RECORDING_UPLOAD_DIR, recording_id, name)
+
+
+def recording_segment_name(index: int, audio_format: str) -> str:
+    return f"segment_{index:05d}.{audio_format}"
+
+
+def recording_status(recording: dict) -> dict:
+    segments = recording.get("segments", {})
+    download_path = f"/api/recording-sessions/{recording['recording_id']}/download"
+    return {
+        "success": True,
+        "recordingId": recording["recording_id"],
+        "status": recording.get("status"),
+        "format": recording.get("format"),
+        "segmentsReceived": sorted(int(index) for index in segments),
+        "bytesReceived": sum(segment.get("size", 0) for segment in segments.values()),
+        "size": recording.get("size"),
+        "downloadUrl": f"{os.environ.get('BACKEND_URL', '')}{download_path}" if recording.get("status") == "completed" else None,
+        "error": recording.get("error")
+    }
+
+
+async def release_stale_recordings() -> int:
+    """Put back to "recording" the sessions whose assembly was interrupted (crash, restart)"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=RECORDING_ASSEMBLY_STALE_SECONDS)).isoformat()
+    result = await recording_sessions_collection.update_many(
+        {"status": "assembling", "updated_at": {"$lt": cutoff}},
+        {"$set": {"status": "recording", "error": "Assembly interrupted", "updated_at": datetime.utcnow().isoformat()}}
+    )
+    return result.modified_count
+
+
+async def delete_abandoned_recordings() -> int:
+    """Delete the sessions never finalized (or whose assembly failed) and idle for RECORDING_ABANDONED_DAYS, with their segments"""
+    cutoff = (datetime.utcnow() - timedelta(days=RECORDING_ABANDONED_DAYS)).isoformat()
+    deleted = 0
+    async for recording in recording_sessions_collection.find(
+        {"status": {"$in": ["recording", "failed"]}, "updated_at": {"$lt": cutoff}}, {"recording_id": 1}
+    ):
+        await asyncio.to_thread(shutil.rmtree, recording_path(recording["recording_id"], ""), True)
+        await recording_sessions_collection.delete_one({"_id": recording["_id"]})
+        deleted += 1
+    return deleted
+
+
+async def recording_maintenance_loop():
+    """Background task: release interrupted assemblies and delete abandoned sessions"""
+    while True:
+        try:
+            released = await release_stale_recordings()
+            deleted = await delete_abandoned_recordings()
+            if released or deleted:
+                print(f"[Record] {released} interrupted assembly(ies) released, {deleted} abandoned session(s) deleted")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Record] Maintenance error: {e}")
+        await asyncio.sleep(RECORDING_MAINTENANCE_INTERVAL)
+
+
+@app.post("/api/recording-sessions")
+async def create_recording_session(request: RecordingSessionRequest, authorization: Optional[str] = Header(None)):
+    """Start a SPYN Record session; segments are then PUT one by one as they are captured"""
+    if not re.fullmatch(r"[a-z0-9]{2,5}", request.format):
+        raise HTTPException(status_code=400, detail="Invalid format")
+    try:
+        recording_id = str(uuid.uuid4())
+        now = datetime.utcnow().isoformat()
+        recording = {
+            "recording_id": recording_id,
+            "user_id": token_user_id(authorization),
+            "title": request.title,
+            "format": request.format,
+            "status": "recording",
+            "segments": {},
+            "created_at": now,
+            "updated_at": now
+        }
+        await recording_sessions_collection.insert_one(recording)
+        await asyncio.to_thread(os.makedirs, recording_path(recording_id, ""), exist_ok=True)
+        print(f"[Record] Session {recording_id} started ({request.format})")
+        return {
+            **recording_status(recording),
+            "uploadUrl": f"/api/recording-sessions/{recording_id}/segments/{{index}}"
+        }
+    except Exception as e:
+        print(f"[Record] Session creation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.put("/api/recording-sessions/{recording_id}/segments/{index}")
+async def upload_recording_segment(recording_id: str, index: int, request: Request):
+    """
+    Append a segment (raw audio body). The body is streamed to disk, so only
+    one chunk is in memory; re-sending a segment replaces it.
+    """
+    recording = await recording_sessions_collection.find_one({"recording_id": recording_id}, {"status": 1, "format": 1})
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording session not found")
+    if recording.get("status") != "recording":
+        raise HTTPException(status_code=409, detail=f"Recording session is {recording.get('status')}")
+    if index < 0:
+        raise HTTPException(status_code=400, detail="Invalid segment index")
+    
+    segment_path = recording_path(recording_id, recording_segment_name(index, recording["format"]))
+    partial_path = f"{segment_path}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        f = await asyncio.to_thread(open, partial_path, "wb")
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > RECORDING_MAX_SEGMENT_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Segment too large (max {RECORDING_MAX_SEGMENT_BYTES} bytes)")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        if not size:
+            raise HTTPException(status_code=400, detail="Empty segment")
+        await asyncio.to_thread(os.replace, partial_path, segment_path)
+    except BaseException:
+        try:
+            await asyncio.to_thread(os.unlink, partial_path)
+        except OSError:
+            pass
+        raise
+    
+    await recording_sessions_collection.update_one({"recording_id": recording_id}, {"$set": {
+        f"segments.{index}": {"size": size, "sha256": digest.hexdigest(), "received_at": datetime.utcnow().isoformat()},
+        "updated_at": datetime.utcnow().isoformat()
+    }})
+    print(f"[Record] Segment {index} of {recording_id}: {size} bytes")
+    return {"success": True, "index": index, "size": size, "sha256": digest.hexdigest()}
+
+
+@app.get("/api/recording-sessions/{recording_id}")
+async def get_recording_session(recording_id: str):
+    """Segments received so far (to resume after a crash) and the download URL once finalized"""
+    recording = await recording_sessions_collection.find_one({"recording_id": recording_id}, {"_id": 0})
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording session not found")
+    return recording_status(recording)
+
+
+@app.post("/api/recording-sessions/{recording_id}/finalize")
+async def finalize_recording_session(recording_id: str, request: RecordingFinalizeRequest):
+    """Concatenate the segments (ffmpeg stream copy) into the final file"""
+    recording = await recording_sessions_collection.find_one({"recording_id": recording_id}, {"_id": 0})
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording session not found")
+    if recording.get("status") == "completed":
+        return recording_status(recording)
+    
+    indexes = sorted(int(index) for index in recording.get("segments", {}))
+    expected = request.segmentsCount if request.segmentsCount is not None else (indexes[-1] + 1 if indexes else 0)
+    received = set(indexes)
+    missing = [index for index in range(expected) if index not in received]
+    if not indexes or missing:
+        return JSONResponse(status_code=409, content={
+            "success": False, "missing": missing, "detail": "No segments received" if not indexes else f"{len(missing)} segment(s) missing"
+        })
+    
+    # Only one finalize at a time per session (an assembly that died with its process can be taken over)
+    stale = (datetime.utcnow() - timedelta(seconds=RECORDING_ASSEMBLY_STALE_SECONDS)).isoformat()
+    claimed = await recording_sessions_collection.update_one(
+        {"recording_id": recording_id, "$or": [
+            {"status": {"$in": ["recording", "failed"]}},
+            {"status": "assembling", "updated_at": {"$lt": stale}}
+        ]},
+        {"$set": {"status": "assembling", "updated_at": datetime.utcnow().isoformat()}}
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Recording session is already being assembled")
+    
+    audio_format = recording["format"]
+    output_path = recording_path(recording_id, f"recording.{audio_format}")
+    concat_list_path = recording_path(recording_id, "concat_list.txt")
+    try:
+        with open(concat_list_path, "w") as f:
+            for index in range(expected):
+                f.write(f"file '{recording_path(recording_id, recording_segment_name(index, audio_format))}'\n")
+        
+        print(f"[Record] Assembling {expected} segments of {recording_id}")
+        started = time.perf_counter()
+        returncode, _, stderr = await run_ffmpeg(
+            ['-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', concat_list_path,
+             '-c', 'copy', output_path],
+            timeout=RECORDING_CONCAT_TIMEOUT_SECONDS
+        )
+        if returncode != 0 or not os.path.exists(output_path):
+            raise FFmpegError(stderr.decode(errors="replace")[-500:] if stderr else "Unknown error")
+        
+        size = os.path.getsize(output_path)
+        await recording_sessions_collection.update_one({"recording_id": recording_id}, {
+            "$set": {
+                "status": "completed",
+                "segments_count": expected,
+                "size": size,
+                "completed_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.utcnow().isoformat()
+            },
+            "$unset": {"error": ""}
+        })
+        print(f"[Record] {recording_id} assembled in {(time.perf_counter() - started) * 1000:.0f}ms: {size} bytes")
+        
+        # The segments are no longer needed once the final file exists
+        for index in indexes:
+            try:
+                os.unlink(recording_path(recording_id, recording_segment_name(index, audio_format)))
+            except OSError:
+                pass
+        
+    except Exception as e:
+        print(f"[Record] Assembly of {recording_id} failed: {e}")
+        await recording_sessions_collection.update_one({"recording_id": recording_id}, {"$set": {
+            "status": "failed", "error": str(e)[-500:], "updated_at": datetime.utcnow().isoformat()
+        }})
+        raise HTTPException(status_code=500, detail=f"Concatenation failed: {str(e)[-500:]}")
+    
+    recording = await recording_sessions_collection.find_one({"recording_id": recording_id}, {"_id": 0})
+    return recording_status(recording)
+
+
+@app.get("/api/recording-sessions/{recording_id}/download")
+async def download_recording_session(recording_id: str):
+    recording = await recording_sessions_collection.find_one({"recording_id": recording_id}, {"_id": 0})
+    if not recording or recording.get("status") != "completed":
+        raise HTTPException(status_code=404, detail="Recording not available")
+    audio_format = recording["format"]
+    return FileResponse(
+        recording_path(recording_id, f"recording.{audio_format}"),
+        media_type=AUDIO_MIME_TYPES.get(audio_format, "application/octet-stream"),
+        filename=f"{recording.get('title') or 'spyn-record'}.{audio_format}"
+    )
+
+
 # ==================== GOOGLE PLACES API ====================
 
 @app.get("/api/nearby-places")
@@ -825,7 +2698,7 @@ async def get_nearby_places(lat: float, lng: float):
         best_venue = None
         min_distance = float('inf')
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with upstream_client("google") as client:
             for place_type in types_to_search[:2]:  # Only search night_club and bar for speed
                 url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
                 params = {
@@ -881,12 +2754,12 @@ async def get_nearby_places(lat: float, lng: float):
 @app.get("/api/chat/messages")
 async def get_messages(user_id: str, contact_id: str, limit: int = 100):
     """Get chat messages between two users"""
-    messages = list(messages_collection.find({
+    messages = await messages_collection.find({
         "$or": [
             {"sender_id": user_id, "recipient_id": contact_id},
             {"sender_id": contact_id, "recipient_id": user_id}
         ]
-    }).sort("timestamp", 1).limit(limit))
+    }).sort("timestamp", 1).limit(limit).to_list(length=limit)
     
     return {
         "success": True,
@@ -908,7 +2781,7 @@ async def send_message(request: MessageSendRequest):
         "sent_from": "app"
     }
     
-    messages_collection.insert_one(message)
+    await messages_collection.insert_one(message)
     message.pop("_id", None)
     
     return {
@@ -948,7 +2821,7 @@ async def get_tracks(limit: int = 100, genre: Optional[str] = None):
     if genre:
         query["genre"] = genre
     
-    tracks = list(tracks_collection.find(query).sort("created_at", -1).limit(limit))
+    tracks = await tracks_collection.find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
     return {
         "success": True,
         "tracks": [serialize_doc(t) for t in tracks]
@@ -961,7 +2834,7 @@ async def get_track_by_id(track_id: str, authorization: Optional[str] = Header(N
         print(f"[Tracks] Getting track by ID: {track_id}")
         
         # Try local database first
-        track = tracks_collection.find_one({"_id": ObjectId(track_id)}) if ObjectId.is_valid(track_id) else None
+        track = await tracks_collection.find_one({"_id": ObjectId(track_id)}) if ObjectId.is_valid(track_id) else None
         
         if track:
             return serialize_doc(track)
@@ -971,12 +2844,13 @@ async def get_track_by_id(track_id: str, authorization: Optional[str] = Header(N
         if authorization:
             headers["Authorization"] = authorization
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with upstream_client("spynners") as client:
             # First try direct track endpoint
             try:
                 response = await client.get(
                     f"https://spynners.com/api/tracks/{track_id}",
-                    headers=headers
+                    headers=headers,
+                    timeout=15.0
                 )
                 if response.status_code == 200:
                     return response.json()
@@ -987,7 +2861,8 @@ async def get_track_by_id(track_id: str, authorization: Optional[str] = Header(N
             all_tracks_response = await client.post(
                 "https://spynners.com/api/functions/nativeGetTracks",
                 json={"limit": 500},
-                headers=headers
+                headers=headers,
+                timeout=15.0
             )
             
             if all_tracks_response.status_code == 200:
@@ -1015,24 +2890,27 @@ async def update_track(track_id: str, request: Request, authorization: Optional[
         if authorization:
             headers["Authorization"] = authorization
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with upstream_client("spynners") as client:
             # Try Spynners native API
             response = await client.put(
                 f"https://spynners.com/api/tracks/{track_id}",
                 json=body,
-                headers=headers
+                headers=headers,
+                timeout=15.0
             )
             
             if response.status_code in [200, 201]:
+                invalidate_track(track_id)
                 return response.json()
         
         # Fallback to local update
         if ObjectId.is_valid(track_id):
-            result = tracks_collection.update_one(
+            result = await tracks_collection.update_one(
                 {"_id": ObjectId(track_id)},
                 {"$set": body}
             )
             if result.modified_count > 0:
+                invalidate_track(track_id)
                 return {"success": True, "message": "Track updated"}
         
         raise HTTPException(status_code=404, detail="Failed to update track")
@@ -1071,9 +2949,13 @@ async def upload_track(
     try:
         # Process audio file
         audio_data = None
+        analysis = {}
         if audio:
             content = await audio.read()
             audio_data = f"data:audio/mpeg;base64,{base64.b64encode(content).decode()}"
+            # Fill in what the form left empty
+            if not (bpm and bpm.isdigit()) or not key or not energy_level:
+                analysis = await analyze_upload(content, "Upload")
         elif audio_url:
             audio_data = audio_url
         
@@ -1100,9 +2982,9 @@ async def upload_track(
             "producer_name": producer_name or artist,
             "collaborators": collab_list,
             "label": label,
-            "bpm": int(bpm) if bpm and bpm.isdigit() else None,
-            "key": key,
-            "energy_level": energy_level,
+            "bpm": int(bpm) if bpm and bpm.isdigit() else (int(round(analysis["bpm"])) if analysis.get("bpm") else None),
+            "key": key or analysis.get("key"),
+            "energy_level": energy_level or analysis.get("energy_level"),
             "mood": mood,
             "description": description,
             "is_vip": is_vip.lower() == "true",
@@ -1118,7 +3000,7 @@ async def upload_track(
             "download_count": 0
         }
         
-        result = tracks_collection.insert_one(track)
+        result = await tracks_collection.insert_one(track)
         track["_id"] = str(result.inserted_id)
         
         return {
@@ -1138,7 +3020,7 @@ async def upload_track(
 @app.get("/api/playlists")
 async def get_playlists(user_id: str):
     """Get user's playlists"""
-    playlists = list(playlists_collection.find({"user_id": user_id}))
+    playlists = await playlists_collection.find({"user_id": user_id}).to_list(length=None)
     return {
         "success": True,
         "playlists": [serialize_doc(p) for p in playlists]
@@ -1153,7 +3035,7 @@ async def create_playlist(name: str = Form(...), user_id: str = Form(...)):
         "tracks": [],
         "created_at": datetime.utcnow().isoformat()
     }
-    result = playlists_collection.insert_one(playlist)
+    result = await playlists_collection.insert_one(playlist)
     playlist["_id"] = str(result.inserted_id)
     
     return {"success": True, "playlist": playlist}
@@ -1161,7 +3043,7 @@ async def create_playlist(name: str = Form(...), user_id: str = Form(...)):
 @app.post("/api/playlists/{playlist_id}/tracks")
 async def add_track_to_playlist(playlist_id: str, track_id: str = Form(...)):
     """Add a track to a playlist"""
-    playlists_collection.update_one(
+    await playlists_collection.update_one(
         {"_id": ObjectId(playlist_id)},
         {"$addToSet": {"tracks": track_id}}
     )
@@ -1195,7 +3077,7 @@ async def get_nearby_places(lat: float, lng: float, radius: int = 5000, type: st
         }
     
     try:
-        async with httpx.AsyncClient() as client:
+        async with upstream_client("google") as client:
             response = await client.get(
                 "https://maps.googleapis.com/maps/api/place/nearbysearch/json",
                 params={
@@ -1279,7 +3161,7 @@ async def notify_producer(request: SpynNotificationRequest, authorization: Optio
         if user_token:
             headers["Authorization"] = f"Bearer {user_token}"
         
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.post(
                 BASE44_FUNCTION_URL,
                 json=payload,
@@ -1330,7 +3212,7 @@ class Base44SignupRequest(BaseModel):
 async def base44_login(request: Base44LoginRequest):
     """Proxy login request to Base44 to avoid CORS issues"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.post(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/auth/login",
                 json={"email": request.email, "password": request.password},
@@ -1362,7 +3244,7 @@ async def base44_login(request: Base44LoginRequest):
 async def base44_signup(request: Base44SignupRequest):
     """Proxy signup request to Base44 to avoid CORS issues"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.post(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/auth/signup",
                 json={
@@ -1387,59 +3269,172 @@ async def base44_signup(request: Base44SignupRequest):
     except httpx.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Base44 service unavailable: {str(e)}")
 
+# ==================== AUDIO ANALYSIS POOL ====================
+
+# CPU-bound analysis (tempo/key/energy, librosa BPM detection) runs in worker
+# processes so it never blocks the event loop. Workers are spawned at startup and warmed up
+# (librosa imported, numba kernels compiled) before the first upload arrives.
+# Past ANALYSIS_MAX_QUEUE jobs in flight new jobs get a 503 instead of queueing.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+ANALYSIS_MAX_QUEUE = int(os.getenv("ANALYSIS_MAX_QUEUE", str(ANALYSIS_WORKERS * 4)))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "60"))
+# Start of an uploaded track decoded once and shared by every stage (analysis,
+# ACRCloud sample, waveform) - decoding is the dominant cost of ingestion
+TRACK_INGEST_SECONDS = float(os.getenv("TRACK_INGEST_SECONDS", "120"))
+
+analysis_pool: Optional[ProcessPoolExecutor] = None
+analysis_stats = {
+    "in_flight": 0, "max_in_flight": 0, "finished": 0,
+    "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0, "restarts": 0,
+    "run_ms_total": 0.0, "run_ms_max": 0.0
+}
+
+
+def start_analysis_pool() -> Optional[ProcessPoolExecutor]:
+    """Create the worker pool and submit one no-op per worker so they all spawn and warm up now"""
+    global analysis_pool
+    if not AUDIO_ANALYSIS_AVAILABLE:
+        return None
+    # spawn, not fork: the web process already runs threads (Motor, asyncio executors)
+    analysis_pool = ProcessPoolExecutor(
+        max_workers=ANALYSIS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=audio_analysis.warm_up_worker
+    )
+    for _ in range(ANALYSIS_WORKERS):
+        analysis_pool.submit(audio_analysis.worker_ready)
+    print(f"[Analysis] Pool started: {ANALYSIS_WORKERS} workers, max {ANALYSIS_MAX_QUEUE} jobs in flight, timeout {ANALYSIS_TIMEOUT_SECONDS:g}s")
+    return analysis_pool
+
+
+def stop_analysis_pool():
+    global analysis_pool
+    if analysis_pool:
+        analysis_pool.shutdown(wait=False, cancel_futures=True)
+        analysis_pool = None
+
+
+def analysis_job_done(future, started: float):
+    # Runs when the worker actually finishes, which may be long after a timeout:
+    # a timed-out job keeps its worker busy, so it keeps counting against the queue limit
+    run_ms = (time.perf_counter() - started) * 1000
+    analysis_stats["in_flight"] -= 1
+    analysis_stats["finished"] += 1
+    analysis_stats["run_ms_total"] += run_ms
+    analysis_stats["run_ms_max"] = max(analysis_stats["run_ms_max"], run_ms)
+
+
+async def run_analysis(fn, *args, timeout: float = ANALYSIS_TIMEOUT_SECONDS):
+    """
+    Run `fn(*args)` (a module-level function of audio_analysis) in the
+    analysis pool. Raises HTTPException 503 when the pool is unavailable or
+    full, asyncio.TimeoutError after `timeout` seconds; exceptions from `fn`
+    propagate.
+    """
+    if analysis_pool is None:
+        raise HTTPException(status_code=503, detail="Audio analysis is not available")
+    if analysis_stats["in_flight"] >= ANALYSIS_MAX_QUEUE:
+        analysis_stats["rejected"] += 1
+        print(f"[Analysis] Rejected {fn.__name__}: {analysis_stats['in_flight']} jobs in flight")
+        raise HTTPException(status_code=503, detail="Audio analysis is busy, please retry shortly")
+    
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(analysis_pool, fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed) - start a fresh pool for the next jobs
+        analysis_stats["restarts"] += 1
+        stop_analysis_pool()
+        start_analysis_pool()
+        raise HTTPException(status_code=503, detail="Audio analysis restarting, please retry shortly")
+    
+    analysis_stats["in_flight"] += 1
+    analysis_stats["max_in_flight"] = max(analysis_stats["max_in_flight"], analysis_stats["in_flight"])
+    started = time.perf_counter()
+    future.add_done_callback(lambda f: analysis_job_done(f, started))
+    try:
+        # shield: a timeout must not cancel the future, or the in-flight count
+        # would drop while the worker is still busy with the job
+        result = await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        analysis_stats["timeouts"] += 1
+        raise asyncio.TimeoutError(f"{fn.__name__} timed out after {timeout:g}s")
+    except BrokenProcessPool:
+        analysis_stats["failed"] += 1
+        analysis_stats["restarts"] += 1
+        stop_analysis_pool()
+        start_analysis_pool()
+        raise HTTPException(status_code=503, detail="Audio analysis restarting, please retry shortly")
+    except Exception:
+        analysis_stats["failed"] += 1
+        raise
+    analysis_stats["completed"] += 1
+    return result
+
+
+async def analyze_upload(content: bytes, label: str) -> dict:
+    """
+    Tempo, key and energy of an uploaded track (audio_analysis.analyze_track),
+    {} when it can't be analysed - a busy pool or an unsupported format never
+    fails the upload itself.
+    """
+    if analysis_pool is None or not content:
+        return {}
+    try:
+        analysis = await run_analysis(audio_analysis.analyze_track, content)
+        print(f"[{label}] Analysis: bpm={analysis['bpm']}, key={analysis['key']}, energy={analysis['energy_level']} ({analysis['elapsed_ms']}ms)")
+        return analysis
+    except HTTPException as e:
+        print(f"[{label}] Analysis skipped: {e.detail}")
+    except Exception as e:
+        print(f"[{label}] Analysis failed: {e}")
+    return {}
+
+
+def analysis_metrics() -> dict:
+    finished = analysis_stats["finished"]
+    return {
+        "enabled": analysis_pool is not None,
+        "workers": ANALYSIS_WORKERS,
+        "max_queue": ANALYSIS_MAX_QUEUE,
+        "timeout_seconds": ANALYSIS_TIMEOUT_SECONDS,
+        "in_flight": analysis_stats["in_flight"],
+        "max_in_flight": analysis_stats["max_in_flight"],
+        "completed": analysis_stats["completed"],
+        "failed": analysis_stats["failed"],
+        "timeouts": analysis_stats["timeouts"],
+        "rejected": analysis_stats["rejected"],
+        "restarts": analysis_stats["restarts"],
+        "avg_run_ms": round(analysis_stats["run_ms_total"] / finished, 1) if finished else 0.0,
+        "max_run_ms": round(analysis_stats["run_ms_max"], 1)
+    }
+
+
 # ==================== MP3 METADATA EXTRACTION ====================
 
-async def detect_bpm_with_acrcloud(audio_data: bytes) -> dict:
+async def detect_bpm_with_acrcloud(audio_data: bytes, report: Optional[dict] = None) -> dict:
     """
     Use ACRCloud to detect BPM and other audio features.
     This is more accurate than librosa for electronic music.
+    `report` is a recognition sample already cut from the track (see ingest in
+    extract_mp3_metadata); without it the track is decoded here.
     """
     if not ACRCLOUD_ACCESS_KEY or not ACRCLOUD_ACCESS_SECRET:
         print("[ACRCloud BPM] ACRCloud not configured")
         return {}
     
     try:
-        # ACRCloud API parameters
-        http_method = "POST"
-        http_uri = "/v1/identify"
-        data_type = "audio"
-        signature_version = "1"
-        timestamp = str(int(time.time()))
-        
-        # Generate signature
-        signature = generate_acrcloud_signature(
-            http_method, http_uri, ACRCLOUD_ACCESS_KEY,
-            data_type, signature_version, timestamp, ACRCLOUD_ACCESS_SECRET
-        )
-        
-        # Prepare request - send first 30 seconds of audio for faster processing
-        # ACRCloud can identify from a small sample
-        sample_size = min(len(audio_data), 30 * 44100 * 2)  # ~30 sec at 44.1kHz stereo
-        audio_sample = audio_data[:sample_size] if len(audio_data) > sample_size else audio_data
-        
-        files = {
-            'sample': ('audio.mp3', BytesIO(audio_sample), 'audio/mpeg')
-        }
-        
-        data = {
-            'access_key': ACRCLOUD_ACCESS_KEY,
-            'sample_bytes': len(audio_sample),
-            'timestamp': timestamp,
-            'signature': signature,
-            'data_type': data_type,
-            'signature_version': signature_version
-        }
+        # Send a compact window from the start of the track - ACRCloud can identify from a small sample
+        if report is None:
+            report = await prepare_recognition_sample(audio_data, check_quality=False, max_seconds=TRACK_SAMPLE_SECONDS)
+        if report and report["prepared"]:
+            audio_sample, audio_format, extra_fields = recognition_payload(audio_data, report)
+        else:
+            audio_sample, audio_format, extra_fields = mp3_head(audio_data, 30), "mp3", None
         
         print(f"[ACRCloud BPM] Sending {len(audio_sample)} bytes for analysis...")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"https://{ACRCLOUD_HOST}{http_uri}",
-                data=data,
-                files=files
-            )
-        
-        result = response.json()
+        result = await acrcloud_identify(audio_sample, extra_fields, audio_format)
         print(f"[ACRCloud BPM] Response status: {result.get('status', {})}")
         
         extracted = {}
@@ -1478,6 +3473,111 @@ async def detect_bpm_with_acrcloud(audio_data: bytes) -> dict:
         return {}
 
 
+COVER_THUMBNAIL_SIZE = int(os.getenv("COVER_THUMBNAIL_SIZE", "600"))  # Max width/height of extracted covers
+COVER_UPLOAD_DIR = "/app/backend/uploads"  # Served by /api/uploads/{filename}
+
+
+def id3_tag_size(content: bytes) -> int:
+    """Bytes taken by a leading ID3v2 tag (0 without one)"""
+    if len(content) < 10 or content[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in content[6:10]:  # Syncsafe integer
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size + (10 if content[5] & 0x10 else 0)  # Header + tag + optional footer
+
+
+def parse_audio_tags(content: bytes) -> dict:
+    """
+    Title/artist/album/genre/BPM, duration and raw cover art of an audio file,
+    parsed once from memory. MP3 tags are read from the tag region only.
+    """
+    metadata = {"title": None, "artist": None, "album": None, "genre": None, "bpm": None, "duration": None,
+                "cover": None, "cover_mime": None}
+    
+    tag_size = id3_tag_size(content)
+    if tag_size:
+        try:
+            tags = ID3(BytesIO(memoryview(content)[:tag_size]))
+        except Exception as id3_error:
+            # A corrupt tag still leaves the duration and the audio analysis
+            print(f"[MP3 Metadata] ID3 tags error: {id3_error}")
+            tags = None
+        # Duration from the first frames (Xing/VBRI header) right after the tag
+        try:
+            metadata["duration"] = int(MPEGInfo(BytesIO(content), tag_size).length)
+        except Exception as info_error:
+            print(f"[MP3 Metadata] Could not read duration: {info_error}")
+    else:
+        audio = mutagen.File(BytesIO(content))  # WAV/AIFF (ID3 chunk), tagless MP3...
+        if audio is None:
+            raise ValueError("Unsupported audio file")
+        if audio.info:
+            metadata["duration"] = int(audio.info.length)
+        tags = audio.tags if isinstance(audio.tags, ID3) else None
+    if not tags:
+        return metadata
+    
+    def text(frame_id):
+        frame = tags.get(frame_id)
+        return str(frame.text[0]) if frame and frame.text else None
+    
+    metadata["title"] = text("TIT2")
+    metadata["artist"] = text("TPE1")
+    metadata["album"] = text("TALB")
+    metadata["genre"] = text("TCON")
+    try:
+        metadata["bpm"] = int(float(text("TBPM"))) if text("TBPM") else None
+    except ValueError:
+        pass
+    
+    for frame in tags.values():
+        # TXXX frames for custom tags (BPM, genre might be there)
+        if frame.FrameID == "TXXX" and frame.text:
+            desc = (frame.desc or "").lower()
+            if "bpm" in desc and not metadata["bpm"]:
+                try:
+                    metadata["bpm"] = int(float(str(frame.text[0])))
+                except ValueError:
+                    pass
+            elif "genre" in desc and not metadata["genre"]:
+                metadata["genre"] = str(frame.text[0])
+        elif frame.FrameID == "APIC" and frame.data and metadata["cover"] is None:
+            metadata["cover"] = frame.data
+            metadata["cover_mime"] = frame.mime or "image/jpeg"
+    return metadata
+
+
+def save_cover_thumbnail(cover: bytes, mime: str) -> str:
+    """
+    Store a resized JPEG of a cover under uploads -> filename. Named after
+    the image hash, so the same artwork is only resized once.
+    """
+    filename = f"cover_{hashlib.sha256(cover).hexdigest()[:24]}.jpg"
+    path = os.path.join(COVER_UPLOAD_DIR, filename)
+    if os.path.exists(path):
+        return filename
+    os.makedirs(COVER_UPLOAD_DIR, exist_ok=True)
+    if PIL_AVAILABLE:
+        image = Image.open(BytesIO(cover))
+        image.draft("RGB", (COVER_THUMBNAIL_SIZE, COVER_THUMBNAIL_SIZE))  # JPEG: decode at reduced scale
+        image = image.convert("RGB")
+        image.thumbnail((COVER_THUMBNAIL_SIZE, COVER_THUMBNAIL_SIZE))
+        output = BytesIO()
+        image.save(output, "JPEG", quality=85, optimize=True)
+        data = output.getvalue()
+    elif mime in ("image/jpeg", "image/jpg"):
+        data = cover  # Stored as is without Pillow
+    else:
+        raise ValueError(f"Cannot convert {mime} cover without Pillow")
+    # Written under a temporary name so a concurrent request never serves a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return filename
+
+
 @app.post("/api/extract-mp3-metadata")
 async def extract_mp3_metadata(file: UploadFile = File(...)):
     """Extract metadata from MP3 file including cover art, BPM, genre using ACRCloud"""
@@ -1485,147 +3585,98 @@ async def extract_mp3_metadata(file: UploadFile = File(...)):
         raise HTTPException(status_code=503, detail="MP3 metadata extraction not available")
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Save file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        result = {
-            "title": None,
-            "artist": None,
-            "album": None,
-            "genre": None,
-            "bpm": None,
-            "cover_image": None,
-            "duration": None,
-        }
-        
-        try:
-            # Try to read MP3 metadata from ID3 tags
-            audio = MP3(tmp_path)
-            
-            # Get duration
-            if audio.info:
-                result["duration"] = int(audio.info.length)
-            
-            # Try ID3 tags first
-            try:
-                tags = ID3(tmp_path)
-                
-                # Title
-                if 'TIT2' in tags:
-                    result["title"] = str(tags['TIT2'].text[0])
-                
-                # Artist
-                if 'TPE1' in tags:
-                    result["artist"] = str(tags['TPE1'].text[0])
-                
-                # Album
-                if 'TALB' in tags:
-                    result["album"] = str(tags['TALB'].text[0])
-                
-                # Genre - try multiple tag formats
-                if 'TCON' in tags:
-                    result["genre"] = str(tags['TCON'].text[0])
-                
-                # BPM - try multiple tag formats
-                if 'TBPM' in tags:
-                    try:
-                        bpm_val = str(tags['TBPM'].text[0])
-                        result["bpm"] = int(float(bpm_val))
-                    except:
-                        pass
-                
-                # Try TXXX frames for custom tags (BPM, genre might be there)
-                for key in tags.keys():
-                    if key.startswith('TXXX'):
-                        frame = tags[key]
-                        desc = frame.desc.lower() if hasattr(frame, 'desc') else ''
-                        if 'bpm' in desc and not result["bpm"]:
-                            try:
-                                result["bpm"] = int(float(str(frame.text[0])))
-                            except:
-                                pass
-                        elif 'genre' in desc and not result["genre"]:
-                            result["genre"] = str(frame.text[0])
-                
-                # Cover art
-                for key in tags.keys():
-                    if key.startswith('APIC'):
-                        apic = tags[key]
-                        if apic.data:
-                            # Convert to base64
-                            cover_base64 = base64.b64encode(apic.data).decode('utf-8')
-                            mime_type = apic.mime if hasattr(apic, 'mime') else 'image/jpeg'
-                            result["cover_image"] = f"data:{mime_type};base64,{cover_base64}"
-                            break
-                            
-            except Exception as id3_error:
-                print(f"ID3 tags error: {id3_error}")
-            
-            # Try EasyID3 as fallback for missing fields
+        # Read file content
+        content = await file.read()
+        
+        result = {
+            "title": None,
+            "artist": None,
+            "album": None,
+            "genre": None,
+            "bpm": None,
+            "key": None,
+            "energy_level": None,
+            "cover_image": None,
+            "duration": None,
+            "waveform": None,
+        }
+        
+        # One pass over the tags, in memory (no temp file)
+        metadata = await asyncio.to_thread(parse_audio_tags, content)
+        cover, cover_mime = metadata.pop("cover"), metadata.pop("cover_mime")
+        result.update(metadata)
+        
+        # Cover art as a URL to a resized thumbnail instead of a full-size data URI
+        if cover:
             try:
-                easy_tags = EasyID3(tmp_path)
-                if not result["title"] and 'title' in easy_tags:
-                    result["title"] = str(easy_tags['title'][0])
-                if not result["artist"] and 'artist' in easy_tags:
-                    result["artist"] = str(easy_tags['artist'][0])
-                if not result["genre"] and 'genre' in easy_tags:
-                    result["genre"] = str(easy_tags['genre'][0])
-                if not result["bpm"] and 'bpm' in easy_tags:
-                    try:
-                        result["bpm"] = int(float(str(easy_tags['bpm'][0])))
-                    except:
-                        pass
-            except Exception as easy_error:
-                print(f"EasyID3 error: {easy_error}")
-            
-            print(f"[MP3 Metadata] Extracted from ID3 tags: title={result['title']}, artist={result['artist']}, genre={result['genre']}, bpm={result['bpm']}, has_cover={result['cover_image'] is not None}")
+                filename = await asyncio.to_thread(save_cover_thumbnail, cover, cover_mime)
+                backend_base_url = os.environ.get('BACKEND_URL', 'https://app-recovery-spyn.preview.emergentagent.com')
+                result["cover_image"] = f"{backend_base_url}/api/uploads/{filename}"
+            except Exception as cover_error:
+                print(f"[MP3 Metadata] Cover error: {cover_error}")
+        
+        print(f"[MP3 Metadata] Extracted from ID3 tags: title={result['title']}, artist={result['artist']}, genre={result['genre']}, bpm={result['bpm']}, has_cover={result['cover_image'] is not None}")
+        
+        # ========== One decode for every analysis stage ==========
+        # Key/energy/BPM analysis, the ACRCloud sample and the waveform all come from it.
+        # A busy pool only leaves key/energy empty, it never fails the extraction
+        ingest = None
+        pool_busy = False
+        if analysis_pool is not None:
+            try:
+                ingest = await run_analysis(
+                    audio_analysis.ingest_track, content, TRACK_INGEST_SECONDS, None,
+                    recognition_sample_options(check_quality=False, max_seconds=TRACK_SAMPLE_SECONDS)
+                )
+                record_quality_report(content, ingest["sample"])
+                result["key"] = ingest["analysis"]["key"]
+                result["energy_level"] = ingest["analysis"]["energy_level"]
+                result["waveform"] = ingest["waveform"]
+                print(f"[MP3 Metadata] Decoded {ingest['duration_s']}s in {ingest['decode_ms']}ms, analysed in {ingest['elapsed_ms']}ms")
+            except HTTPException as e:
+                pool_busy = True
+                print(f"[MP3 Metadata] Analysis skipped: {e.detail}")
+            except Exception as analysis_error:
+                print(f"[MP3 Metadata] Analysis error: {analysis_error}")
+        
+        # ========== ACRCloud Detection for BPM (Primary Method) ==========
+        # Use ACRCloud if BPM not found in tags - this is more accurate for electronic music
+        if result["bpm"] is None:
+            print(f"[MP3 Metadata] BPM not in tags, trying ACRCloud detection...")
+            acr_result = await detect_bpm_with_acrcloud(content, ingest["sample"] if ingest else None)
             
-            # ========== ACRCloud Detection for BPM (Primary Method) ==========
-            # Use ACRCloud if BPM not found in tags - this is more accurate for electronic music
-            if result["bpm"] is None:
-                print(f"[MP3 Metadata] BPM not in tags, trying ACRCloud detection...")
-                acr_result = await detect_bpm_with_acrcloud(content)
-                
-                if acr_result.get("bpm"):
-                    result["bpm"] = acr_result["bpm"]
-                    print(f"[MP3 Metadata] ACRCloud detected BPM: {result['bpm']}")
-                
-                # Also use ACRCloud genre if not found in tags
-                if not result["genre"] and acr_result.get("genre"):
-                    result["genre"] = acr_result["genre"]
-                    print(f"[MP3 Metadata] ACRCloud detected genre: {result['genre']}")
+            if acr_result.get("bpm"):
+                result["bpm"] = acr_result["bpm"]
+                print(f"[MP3 Metadata] ACRCloud detected BPM: {result['bpm']}")
             
-            # ========== Fallback to librosa if ACRCloud didn't find BPM ==========
-            if result["bpm"] is None and LIBROSA_AVAILABLE:
-                try:
-                    print(f"[MP3 Metadata] Fallback: Attempting BPM detection with librosa...")
-                    # Load audio file (first 60 seconds for faster processing)
-                    y, sr = librosa.load(tmp_path, sr=None, duration=60)
-                    # Detect tempo (BPM)
-                    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-                    if tempo is not None:
-                        # tempo can be an array, get the first value
-                        if hasattr(tempo, '__iter__'):
-                            bpm_value = float(tempo[0]) if len(tempo) > 0 else float(tempo)
-                        else:
-                            bpm_value = float(tempo)
-                        result["bpm"] = int(round(bpm_value))
-                        print(f"[MP3 Metadata] Librosa detected BPM: {result['bpm']}")
-                except Exception as bpm_error:
-                    print(f"[MP3 Metadata] Librosa BPM detection error: {bpm_error}")
-                
-        finally:
-            # Clean up temp file
-            os.unlink(tmp_path)
-        
-        print(f"[MP3 Metadata] Final result: title={result['title']}, artist={result['artist']}, genre={result['genre']}, bpm={result['bpm']}")
+            # Also use ACRCloud genre if not found in tags
+            if not result["genre"] and acr_result.get("genre"):
+                result["genre"] = acr_result["genre"]
+                print(f"[MP3 Metadata] ACRCloud detected genre: {result['genre']}")
+        
+        # ========== Local analysis if ACRCloud didn't find BPM ==========
+        if result["bpm"] is None and ingest and ingest["analysis"]["bpm"]:
+            result["bpm"] = int(round(ingest["analysis"]["bpm"]))
+            print(f"[MP3 Metadata] Analyzer detected BPM: {result['bpm']}")
+        
+        # ========== Fallback to librosa for formats the analyzer can't decode ==========
+        if result["bpm"] is None and ingest is None and not pool_busy and analysis_pool is not None and LIBROSA_AVAILABLE:
+            print(f"[MP3 Metadata] Fallback: Attempting BPM detection with librosa...")
+            try:
+                bpm_value = await run_analysis(audio_analysis.librosa_bpm, content)
+                if bpm_value:
+                    result["bpm"] = int(round(bpm_value))
+                    print(f"[MP3 Metadata] Librosa detected BPM: {result['bpm']}")
+            except HTTPException as e:
+                print(f"[MP3 Metadata] Librosa BPM detection skipped: {e.detail}")
+            except Exception as bpm_error:
+                print(f"[MP3 Metadata] Librosa BPM detection error: {bpm_error}")
+        
+        print(f"[MP3 Metadata] Final result: title={result['title']}, artist={result['artist']}, genre={result['genre']}, bpm={result['bpm']}, key={result['key']}, energy={result['energy_level']}")
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[MP3 Metadata] Error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to extract metadata: {str(e)}")
@@ -1641,7 +3692,7 @@ async def base44_me(authorization: Optional[str] = Header(None)):
         if authorization:
             headers["Authorization"] = authorization
             
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.get(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/auth/me",
                 headers=headers
@@ -1708,7 +3759,7 @@ async def base44_list_entities(
         if read:
             params["read"] = read
             
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.get(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/{entity_name}",
                 headers=headers,
@@ -1742,11 +3793,12 @@ async def base44_create_entity(
         print(f"[Base44] Creating entity {entity_name}")
         print(f"[Base44] Data keys: {list(request_body.keys())}")
         
-        async with httpx.AsyncClient(timeout=60.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.post(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/{entity_name}",
                 headers=headers,
-                json=request_body
+                json=request_body,
+                timeout=60.0
             )
             
             print(f"[Base44] Create response: {response.status_code}")
@@ -1781,15 +3833,21 @@ async def base44_update_entity(
         
         print(f"[Base44] Updating entity {entity_name}/{entity_id}")
         
-        async with httpx.AsyncClient(timeout=60.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.put(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/{entity_name}/{entity_id}",
                 headers=headers,
-                json=request_body
+                json=request_body,
+                timeout=60.0
             )
             
             if response.status_code == 200:
-                return response.json()
+                updated = response.json()
+                if entity_name == "Track":
+                    invalidate_track(entity_id, updated)
+                elif entity_name == "User":
+                    invalidate_user(entity_id)
+                return updated
             else:
                 print(f"Base44 update error: {response.status_code} - {response.text[:500]}")
                 raise HTTPException(
@@ -1843,7 +3901,7 @@ async def base44_invoke_function(
             print(f"[Base44] Request body: {request_body}")
             print(f"[Base44] Auth header present: {bool(authorization)}")
             
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
+            async with upstream_client("spynners") as http_client:
                 response = await http_client.post(
                     app_function_url,
                     json=request_body,
@@ -1861,7 +3919,7 @@ async def base44_invoke_function(
                     # Fall through to try standard API
         
         # Standard Base44 function invocation via platform API
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async with upstream_client("base44") as http_client:
             response = await http_client.post(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/functions/invoke/{function_name}",
                 json=request_body,
@@ -1898,7 +3956,7 @@ async def award_diamond(request: AwardDiamondRequest, authorization: Optional[st
         today = datetime.utcnow().strftime("%Y-%m-%d")
         
         # Check if user already earned a diamond today
-        existing_award = db["diamond_awards"].find_one({
+        existing_award = await db["diamond_awards"].find_one({
             "user_id": user_id,
             "type": request.type,
             "date": today
@@ -1920,7 +3978,7 @@ async def award_diamond(request: AwardDiamondRequest, authorization: Optional[st
             "date": today,
             "awarded_at": datetime.utcnow().isoformat()
         }
-        db["diamond_awards"].insert_one(award)
+        await db["diamond_awards"].insert_one(award)
         
         # Update user's diamond count in Base44
         if authorization:
@@ -1932,7 +3990,7 @@ async def award_diamond(request: AwardDiamondRequest, authorization: Optional[st
                 }
                 
                 # Get current user data to increment diamonds
-                async with httpx.AsyncClient(timeout=30.0) as http_client:
+                async with upstream_client("base44") as http_client:
                     # Try to update user's diamonds in Base44
                     user_response = await http_client.get(
                         f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User/{user_id}",
@@ -1967,299 +4025,894 @@ async def award_diamond(request: AwardDiamondRequest, authorization: Optional[st
         }
 
 
-# ==================== OFFLINE SPYN PROCESSING ====================
+# ==================== OFFLINE SPYN PROCESSING ====================
+
+class OfflineRecordingData(BaseModel):
+    audioBase64: str
+    timestamp: str
+    location: Optional[dict] = None
+
+class OfflineSessionRequest(BaseModel):
+    sessionId: str
+    recordings: List[OfflineRecordingData]
+    userId: str
+    djName: str
+    startTime: str
+    endTime: Optional[str] = None
+    location: Optional[dict] = None
+
+class OfflineSessionCreateRequest(BaseModel):
+    sessionId: str
+    userId: str
+    djName: str
+    startTime: str
+    endTime: Optional[str] = None
+    location: Optional[dict] = None
+
+class OfflineSessionFinalizeRequest(BaseModel):
+    recordingsCount: int
+    endTime: Optional[str] = None
+
+OFFLINE_CONCURRENCY = int(os.getenv("OFFLINE_CONCURRENCY", "6"))  # Recordings identified at once per session
+OFFLINE_UPLOAD_DIR = os.getenv("OFFLINE_UPLOAD_DIR", "/app/backend/uploads/offline")  # Recordings waiting for identification
+OFFLINE_MAX_RECORDING_BYTES = int(os.getenv("OFFLINE_MAX_RECORDING_BYTES", str(50 * 1024 * 1024)))
+
+
+def add_stage_time(timings: dict, stage: str, started: float) -> float:
+    """Add the time since `started` to timings[stage] (ms) and return the new start"""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (now - started) * 1000
+    return now
+
+
+async def identify_offline_recording(idx: int, total: int, audio_data: bytes, timestamp: str, timings: dict) -> dict:
+    """Identify one offline recording (catalog must be loaded) -> result entry of the session"""
+    print(f"[Offline] Processing recording {idx + 1}/{total}")
+    
+    try:
+        stage_started = time.perf_counter()
+        
+        # Skip hopeless samples, submit a compact mono window of the others
+        report = await prepare_recognition_sample(audio_data)
+        stage_started = add_stage_time(timings, "quality", stage_started)
+        if report and not report["ok"]:
+            return {**quality_rejection(report), "timestamp": timestamp}
+        sample, audio_format, extra_fields = recognition_payload(audio_data, report)
+        
+        # Send to ACRCloud (identical resubmitted audio is served from cache)
+        result, recognition_source, cached = await acrcloud_identify_cached(sample, extra_fields, audio_format)
+        stage_started = add_stage_time(timings, "acrcloud", stage_started)
+        status_code = result.get("status", {}).get("code", -1)
+        status_msg = result.get("status", {}).get("msg", "Unknown")
+        
+        print(f"[Offline] ACRCloud response: code={status_code}, msg={status_msg}")
+        print(f"[Offline] Full result: {json.dumps(result, indent=2)[:1000]}")
+        
+        if status_code == 0:
+            # Check for custom_files first (Spynners tracks), then music, then humming
+            custom_files = result.get("metadata", {}).get("custom_files", [])
+            music = result.get("metadata", {}).get("music", [])
+            humming = result.get("metadata", {}).get("humming", [])
+            
+            track = None
+            is_custom = False
+            source = "unknown"
+            
+            if custom_files:
+                track = custom_files[0]
+                is_custom = True
+                source = "custom_files"
+            elif music:
+                track = music[0]
+                source = "music"
+            elif humming:
+                track = humming[0]
+                source = "humming"
+            
+            print(f"[Offline] Track found in: {source}")
+            
+            if track:
+                track_title = track.get("title", "Unknown")
+                
+                # Get artist name based on source
+                if is_custom:
+                    track_artist = track.get("producer_name") or track.get("artist", "Unknown")
+                else:
+                    artists = track.get("artists", [])
+                    if artists:
+                        track_artist = ", ".join([a.get("name", "") for a in artists if a.get("name")])
+                    else:
+                        track_artist = track.get("artist", "Unknown")
+                
+                if not track_artist:
+                    track_artist = "Unknown"
+                
+                # For non-custom tracks, try to find matching Spynners track
+                spynners_track_id = None
+                producer_id = None
+                cover_image = None
+                
+                if is_custom:
+                    spynners_track_id = track.get("spynners_track_id")
+                    producer_id = track.get("producer_id")
+                    cover_image = track.get("artwork_url")
+                else:
+                    # Try to match with the approved tracks of the Spynners catalog
+                    try:
+                        best_match, best_score = spynners_catalog.match(track_title, track_artist, approved_only=True, strict=True)
+                        
+                        if best_match:
+                            print(f"[Offline] Matched to Spynners track: {best_match.get('title')} (score: {best_score:.2f})")
+                            spynners_track_id = best_match.get("id")
+                            producer_id = best_match.get("producer_id")
+                            cover_image = best_match.get("artwork_url")
+                            is_custom = True  # Mark as Spynners track
+                        else:
+                            print(f"[Offline] No match found for: {track_title} by {track_artist}")
+                    except Exception as match_error:
+                        print(f"[Offline] Matching error: {match_error}")
+                    add_stage_time(timings, "match", stage_started)
+                
+                track_result = {
+                    "success": True,
+                    "title": track_title,
+                    "artist": track_artist,
+                    "cover_image": cover_image,
+                    "spynners_track_id": spynners_track_id,
+                    "producer_id": producer_id,
+                    "timestamp": timestamp,
+                    "is_spynners_track": is_custom and spynners_track_id is not None,
+                    "source": source,
+                    "recognition_source": recognition_source,
+                    "cached": cached
+                }
+                
+                print(f"[Offline] ✅ Identified: {track_title} by {track_artist} (Spynners: {is_custom and spynners_track_id is not None})")
+                return track_result
+            else:
+                return {
+                    "success": False,
+                    "message": "No track in response",
+                    "timestamp": timestamp
+                }
+        else:
+            print(f"[Offline] ❌ Not identified: {result.get('status', {}).get('msg', 'Unknown error')}")
+            return {
+                "success": False,
+                "message": result.get("status", {}).get("msg", "Recognition failed"),
+                "timestamp": timestamp
+            }
+            
+    except Exception as rec_error:
+        print(f"[Offline] Error processing recording {idx + 1}/{total}: {rec_error}")
+        return {
+            "success": False,
+            "message": str(rec_error),
+            "timestamp": timestamp
+        }
+
+
+OFFLINE_JOB_WORKERS = int(os.getenv("OFFLINE_JOB_WORKERS", "2"))  # Offline sessions processed at once
+OFFLINE_NOTIFY_CONCURRENCY = max(1, int(os.getenv("OFFLINE_NOTIFY_CONCURRENCY", "4")))  # Producer notification calls at once
+OFFLINE_NOTIFY_ATTEMPTS = max(1, int(os.getenv("OFFLINE_NOTIFY_ATTEMPTS", "3")))  # Tries per notification call, at least one (backoff 1s, 2s, ...)
+# Spynners function sending one digest per producer ({"producerId", ..., "tracks": [...]});
+# empty = one sendTrackPlayedEmail per track
+PRODUCER_DIGEST_FUNCTION = os.getenv("PRODUCER_DIGEST_FUNCTION", "")
+
+# Job ids waiting for a worker (created with the workers); jobs themselves live in offline_sessions
+offline_job_queue: Optional[asyncio.Queue] = None
+offline_jobs_scheduled = set()  # Queued or running
+offline_jobs_rerun = set()  # Recordings landed while the job was running
+
+
+def schedule_offline_job(job_id: str):
+    """Queue a job unless it is already waiting; a running job is run once more"""
+    if job_id in offline_jobs_scheduled:
+        offline_jobs_rerun.add(job_id)
+        return
+    offline_jobs_scheduled.add(job_id)
+    offline_job_queue.put_nowait(job_id)
+
+
+def offline_recording_path(job_id: str, name: str) -> str:
+    """Upload file of a job: "<index>.part" while receiving, "<content hash>.audio" once complete"""
+    return os.path.join(OFFLINE_UPLOAD_DIR, job_id, name)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def ensure_offline_indexes():
+    """
+    One job per (user, sessionId) and one recording per content hash within
+    a job, so retried uploads never create duplicates
+    """
+    try:
+        # Sessions stored before jobs existed have no job_id and are left out
+        await offline_sessions_collection.create_index(
+            [("user_id", 1), ("session_id", 1)], unique=True,
+            partialFilterExpression={"job_id": {"$exists": True}}
+        )
+        await offline_sessions_collection.create_index("job_id")
+        await offline_recordings_collection.create_index([("job_id", 1), ("content_hash", 1)], unique=True)
+        await offline_recordings_collection.create_index([("job_id", 1), ("index", 1)])
+    except Exception as e:
+        print(f"[Offline] Could not create indexes: {e}")
+
+
+async def get_or_create_offline_job(request):
+    """(job, created): the existing job of the session, or a new one still receiving recordings"""
+    job = new_offline_job(str(uuid.uuid4()), request)
+    try:
+        await offline_sessions_collection.insert_one(job)
+        return job, True
+    except DuplicateKeyError:
+        existing = await offline_sessions_collection.find_one({"user_id": request.userId, "session_id": request.sessionId})
+        return existing, False
+
+
+async def add_offline_recording(job_id: str, index: int, timestamp: str, content_hash: str,
+                                location: Optional[dict] = None) -> bool:
+    """Register a fully received recording and start identifying it. False if the job already has this audio"""
+    try:
+        await offline_recordings_collection.insert_one({
+            "job_id": job_id,
+            "index": index,
+            "timestamp": timestamp,
+            "location": location,
+            "content_hash": content_hash,
+            "path": offline_recording_path(job_id, f"{content_hash}.audio"),
+            "result": None
+        })
+    except DuplicateKeyError:
+        await offline_recordings_collection.update_one(
+            {"job_id": job_id, "content_hash": content_hash}, {"$addToSet": {"aliases": index}}
+        )
+        return False
+    await offline_sessions_collection.update_one({"job_id": job_id}, {"$inc": {"received_count": 1}})
+    schedule_offline_job(job_id)
+    return True
+
+
+async def finalize_offline_job(job_id: str, authorization: Optional[str] = None, end_time: Optional[str] = None):
+    """
+    Mark every recording of a job as received (re-opening a finished job) and
+    queue it. The caller's token is only kept until the producer notifications
+    are sent (or the job fails).
+    """
+    update = {
+        "finalized": True,
+        "status": "queued",
+        "recordings_count": await offline_recordings_collection.count_documents({"job_id": job_id}),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+    if authorization:
+        update["authorization"] = authorization
+    if end_time:
+        update["end_time"] = end_time
+    await offline_sessions_collection.update_one({"job_id": job_id}, {"$set": update, "$unset": {"error": ""}})
+    schedule_offline_job(job_id)
+
+
+def new_offline_job(job_id: str, request) -> dict:
+    now = datetime.utcnow().isoformat()
+    return {
+        "job_id": job_id,
+        "session_id": request.sessionId,
+        "user_id": request.userId,
+        "dj_name": request.djName,
+        "start_time": request.startTime,
+        "end_time": request.endTime,
+        "location": request.location,
+        "status": "uploading",
+        "finalized": False,  # All recordings received
+        "recordings_count": 0,
+        "received_count": 0,
+        "processed_count": 0,
+        "identified_count": 0,
+        "failed_count": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+async def offline_job_progress(job_id: str):
+    """(counters, ordered results) of the recordings of a job processed so far"""
+    results = []
+    cursor = offline_recordings_collection.find(
+        {"job_id": job_id, "result": {"$ne": None}}, {"_id": 0, "index": 1, "result": 1}
+    ).sort("index", 1)
+    async for recording in cursor:
+        results.append(recording["result"])
+    counters = {
+        "processed_count": len(results),
+        "identified_count": sum(1 for r in results if r.get("is_spynners_track")),
+        "failed_count": sum(1 for r in results if not r.get("success"))
+    }
+    return counters, results
+
+
+def offline_notifications(job: dict, identified_tracks: List[dict]) -> List[dict]:
+    """Identified tracks collapsed to one notification per (producer, track, venue) of the session"""
+    venue = (job.get("location") or {}).get("venue", "")
+    notifications = {}
+    for track in identified_tracks:
+        if not track.get("producer_id"):
+            continue
+        key = f"{track['producer_id']}|{track.get('spynners_track_id') or track.get('title')}|{venue}"
+        if key in notifications:
+            notifications[key]["plays"] += 1
+            continue
+        notifications[key] = {
+            "key": key,
+            "producer_id": track["producer_id"],
+            "spynners_track_id": track.get("spynners_track_id"),
+            "title": track.get("title"),
+            "cover_image": track.get("cover_image"),
+            "played_at": track["timestamp"],  # First play
+            "plays": 1,
+            "status": "pending"
+        }
+    return list(notifications.values())
+
+
+async def send_offline_notifications(job: dict):
+    """
+    Notify the producers of the Spynners tracks identified in a session (if in
+    valid venue), OFFLINE_NOTIFY_CONCURRENCY calls at a time, and record the
+    delivery status of each notification in the session as soon as it is
+    known. Notifications already sent for the session are never sent again, so
+    a send interrupted by a restart resumes with the others. Calls are tried
+    OFFLINE_NOTIFY_ATTEMPTS times; notifications still failing leave the
+    session "failed", retried with POST /api/offline-sessions/{job_id}/notifications/retry.
+    """
+    job_id = job["job_id"]
+    location = job.get("location") or {}
+    authorization = job.get("authorization")
+    started = time.perf_counter()
+    
+    _, results = await offline_job_progress(job_id)
+    notifications = offline_notifications(job, [r for r in results if r.get("is_spynners_track")])
+    if not location.get("is_valid_venue", False) or not authorization:
+        notifications_status = "skipped"
+        for notification in notifications:
+            notification["status"] = "skipped"
+        pending = []
+    else:
+        notifications_status = "done"
+        previous = {n["key"]: n for n in job.get("notifications", [])}
+        for notification in notifications:
+            if previous.get(notification["key"], {}).get("status") == "sent":
+                notification.update(status="sent", sent_at=previous[notification["key"]].get("sent_at"))
+        pending = [n for n in notifications if n["status"] != "sent"]
+    
+    # Stored before sending, so each delivery can update its own entry
+    await offline_sessions_collection.update_one({"job_id": job_id}, {"$set": {
+        "notifications": notifications, "updated_at": datetime.utcnow().isoformat()
+    }})
+    positions = {n["key"]: i for i, n in enumerate(notifications)}
+    
+    if pending:
+        print(f"[Offline] Valid venue detected - Sending {len(pending)} producer notifications")
+        headers = {
+            "Content-Type": "application/json",
+            "X-Base44-App-Id": BASE44_APP_ID,
+            "Authorization": authorization
+        }
+        session_fields = {
+            "djName": job.get("dj_name"),
+            "city": location.get("city", ""),
+            "country": location.get("country", ""),
+            "venue": location.get("venue", ""),
+        }
+        semaphore = asyncio.Semaphore(OFFLINE_NOTIFY_CONCURRENCY)
+        
+        async def deliver(function_name: str, payload: dict, batch: List[dict]):
+            async with semaphore:
+                for attempt in range(OFFLINE_NOTIFY_ATTEMPTS):
+                    try:
+                        async with upstream_client("spynners") as http_client:
+                            response = await http_client.post(
+                                f"https://spynners.com/api/functions/{function_name}",
+                                json=payload,
+                                headers=headers
+                            )
+                        response.raise_for_status()
+                        update = {"status": "sent", "error": None, "sent_at": datetime.utcnow().isoformat()}
+                        print(f"[Offline] ✅ Email sent for: {', '.join(n['title'] for n in batch)}")
+                        break
+                    except Exception as email_error:
+                        update = {"status": "failed", "error": str(email_error), "failed_at": datetime.utcnow().isoformat()}
+                        print(f"[Offline] ❌ Email error for {', '.join(n['title'] for n in batch)} (attempt {attempt + 1}): {email_error}")
+                        if attempt < OFFLINE_NOTIFY_ATTEMPTS - 1:
+                            await asyncio.sleep(2 ** attempt)
+            for notification in batch:
+                notification.update(update)
+                notification.pop("sent_at" if update["status"] == "failed" else "failed_at", None)
+            await offline_sessions_collection.update_one({"job_id": job_id}, {"$set": {
+                f"notifications.{positions[n['key']]}": n for n in batch
+            }})
+        
+        deliveries = []
+        if PRODUCER_DIGEST_FUNCTION:
+            # One digest call per producer listing all their tracks played in the session
+            by_producer = {}
+            for notification in pending:
+                by_producer.setdefault(notification["producer_id"], []).append(notification)
+            for producer_id, batch in by_producer.items():
+                deliveries.append(deliver(PRODUCER_DIGEST_FUNCTION, {
+                    "producerId": producer_id,
+                    **session_fields,
+                    "tracks": [
+                        {"trackTitle": n["title"], "trackArtworkUrl": n.get("cover_image") or "", "playedAt": n["played_at"], "plays": n["plays"]}
+                        for n in batch
+                    ]
+                }, batch))
+        else:
+            for notification in pending:
+                deliveries.append(deliver("sendTrackPlayedEmail", {
+                    "producerId": notification["producer_id"],
+                    "trackTitle": notification["title"],
+                    **session_fields,
+                    "trackArtworkUrl": notification.get("cover_image") or "",
+                    "playedAt": notification["played_at"],
+                }, [notification]))
+        await asyncio.gather(*deliveries)
+    
+    summary = Counter(n["status"] for n in notifications)
+    if summary.get("failed"):
+        notifications_status = "failed"
+    await offline_sessions_collection.update_one({"job_id": job_id}, {
+        "$set": {
+            "notifications": notifications,
+            "notifications_status": notifications_status,
+            "notifications_summary": {
+                "sent": summary.get("sent", 0),
+                "failed": summary.get("failed", 0),
+                "skipped": summary.get("skipped", 0),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            },
+            "updated_at": datetime.utcnow().isoformat()
+        },
+        "$unset": {"authorization": ""}
+    })
+
+
+async def retry_offline_notifications(job_id: str, authorization: str) -> bool:
+    """Send the failed notifications of a completed session again, with the caller's fresh token"""
+    result = await offline_sessions_collection.update_one(
+        {"job_id": job_id, "status": "completed", "notifications_status": "failed"},
+        {"$set": {"notifications_status": "pending", "authorization": authorization, "updated_at": datetime.utcnow().isoformat()}}
+    )
+    if result.modified_count:
+        schedule_offline_job(job_id)
+    return bool(result.modified_count)
+
+
+async def run_offline_job(job_id: str):
+    """
+    Identify the received recordings of a job that have no result yet,
+    OFFLINE_CONCURRENCY at a time, and complete the job once it is
+    finalized and every recording is processed. Each result is written to
+    its recording as soon as it is known, so a job interrupted by a restart
+    resumes with the recordings still missing one.
+    """
+    job = await offline_sessions_collection.find_one({"job_id": job_id})
+    if job and job.get("status") == "completed" and job.get("notifications_status") == "pending":
+        # Interrupted between the results and the notifications
+        await send_offline_notifications(job)
+        return
+    if not job or job.get("status") not in ("uploading", "queued", "processing"):
+        return
+    
+    total = job.get("recordings_count", 0)
+    counters, _ = await offline_job_progress(job_id)
+    resumed = job.get("status") == "processing"
+    print(f"[Offline] Processing session {job['session_id']} (job {job_id}): {counters['processed_count']} recordings already done")
+    await offline_sessions_collection.update_one({"job_id": job_id}, {"$set": {
+        **counters,
+        "status": "processing" if job.get("finalized") else "uploading",
+        "updated_at": datetime.utcnow().isoformat()
+    }})
+    
+    session_started = time.perf_counter()
+    timings = {}
+    
+    # The approved-track catalog is loaded once for the whole session
+    stage_started = time.perf_counter()
+    try:
+        await spynners_catalog.ensure_loaded()
+    except Exception as catalog_error:
+        print(f"[Offline] Catalog unavailable, matching skipped: {catalog_error}")
+    add_stage_time(timings, "catalog", stage_started)
+    
+    semaphore = asyncio.Semaphore(OFFLINE_CONCURRENCY)
+    
+    async def process(recording: dict):
+        try:
+            audio_data = await asyncio.to_thread(read_file, recording["path"])
+            result = await identify_offline_recording(recording["index"], total, audio_data, recording["timestamp"], timings)
+            await offline_recordings_collection.update_one({"_id": recording["_id"]}, {"$set": {"result": result}})
+            await offline_sessions_collection.update_one({"job_id": job_id}, {
+                "$inc": {
+                    "processed_count": 1,
+                    "identified_count": 1 if result.get("is_spynners_track") else 0,
+                    "failed_count": 0 if result.get("success") else 1
+                },
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            })
+        finally:
+            semaphore.release()
+    
+    # Only OFFLINE_CONCURRENCY recordings (and their audio) are held in memory at once
+    identify_started = time.perf_counter()
+    tasks = []
+    cursor = offline_recordings_collection.find({"job_id": job_id, "result": None}).sort("index", 1).batch_size(OFFLINE_CONCURRENCY)
+    async for recording in cursor:
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(process(recording)))
+    await asyncio.gather(*tasks)
+    identify_ms = (time.perf_counter() - identify_started) * 1000
+    
+    job = await offline_sessions_collection.find_one({"job_id": job_id})
+    counters, results = await offline_job_progress(job_id)
+    if not job.get("finalized") or counters["processed_count"] < job.get("recordings_count", 0):
+        # More recordings to come: the upload of the next one schedules the job again
+        return
+    identified_tracks = [r for r in results if r.get("is_spynners_track")]
+    
+    wall_ms = (time.perf_counter() - session_started) * 1000
+    # Store session in database for history; the recordings' audio is no longer needed,
+    # their results and content hashes are kept so retries of the session are recognized
+    await offline_sessions_collection.update_one({"job_id": job_id}, {
+        "$set": {
+            **counters,
+            "status": "completed",
+            "notifications_status": "pending",
+            "results": results,
+            "processed_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+            "timings": {
+                "wall_ms": round(wall_ms, 1),
+                "identify_ms": round(identify_ms, 1),
+                "concurrency": OFFLINE_CONCURRENCY,
+                "resumed": resumed,
+                # quality/acrcloud/match are summed over recordings processed concurrently
+                "stages_ms": {stage: round(ms, 1) for stage, ms in timings.items()}
+            }
+        }
+    })
+    await asyncio.to_thread(shutil.rmtree, os.path.join(OFFLINE_UPLOAD_DIR, job_id), True)
+    
+    print(f"[Offline] Session processed in {wall_ms:.0f}ms: {len(results)} recordings, {len(identified_tracks)} Spynners tracks identified")
+    
+    # The results are visible as soon as they are stored; delivery status follows in the session
+    await send_offline_notifications(job)
+
+
+async def offline_job_worker(worker_id: int):
+    while True:
+        job_id = await offline_job_queue.get()
+        try:
+            await run_offline_job(job_id)
+        except Exception as e:
+            print(f"[Offline] Worker {worker_id}: job {job_id} failed: {e}")
+            try:
+                await offline_sessions_collection.update_one({"job_id": job_id}, {
+                    "$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow().isoformat()},
+                    "$unset": {"authorization": ""}  # Re-finalizing the session brings a fresh token
+                })
+            except Exception as update_error:
+                print(f"[Offline] Could not mark job {job_id} as failed: {update_error}")
+        finally:
+            offline_job_queue.task_done()
+            offline_jobs_scheduled.discard(job_id)
+            if job_id in offline_jobs_rerun:
+                offline_jobs_rerun.discard(job_id)
+                schedule_offline_job(job_id)
+
+
+async def resume_offline_jobs():
+    """Re-queue the jobs a previous process accepted but did not finish"""
+    try:
+        cursor = offline_sessions_collection.find(
+            {"$or": [
+                {"status": {"$in": ["uploading", "queued", "processing"]}},
+                {"status": "completed", "notifications_status": "pending"}
+            ]}, {"job_id": 1}
+        ).sort("created_at", 1)
+        resumed = 0
+        async for job in cursor:
+            schedule_offline_job(job["job_id"])
+            resumed += 1
+        if resumed:
+            print(f"[Offline] Resuming {resumed} unfinished session job(s)")
+    except Exception as e:
+        print(f"[Offline] Could not resume session jobs: {e}")
+
+
+def start_offline_job_workers() -> List[asyncio.Task]:
+    global offline_job_queue
+    offline_job_queue = asyncio.Queue()
+    return [asyncio.create_task(offline_job_worker(i)) for i in range(OFFLINE_JOB_WORKERS)]
+
+
+async def offline_session_status(job: dict) -> dict:
+    """Progress and (partial) results of an offline session job"""
+    if job.get("status") == "completed":
+        results = job.get("results", [])
+    else:
+        _, results = await offline_job_progress(job["job_id"])
+    return {
+        "success": True,
+        "jobId": job["job_id"],
+        "sessionId": job.get("session_id"),
+        "status": job.get("status"),
+        "totalRecordings": job.get("recordings_count", 0),
+        "received": job.get("received_count", 0),
+        "processed": job.get("processed_count", 0),
+        "identified": job.get("identified_count", 0),
+        "failed": job.get("failed_count", 0),
+        "identifiedTracks": job.get("identified_count", 0),
+        "results": results,
+        "timings": job.get("timings"),
+        "notifications": job.get("notifications_summary"),
+        "notificationsStatus": job.get("notifications_status"),
+        "error": job.get("error"),
+        "statusUrl": f"/api/offline-sessions/{job['job_id']}"
+    }
+
+
+@app.post("/api/process-offline-session")
+async def process_offline_session(request: OfflineSessionRequest, authorization: Optional[str] = Header(None)):
+    """
+    Queue offline SPYN recordings for identification when the device comes back online.
+    Returns a job id immediately; poll GET /api/offline-sessions/{job_id} for progress.
+    Retries are idempotent: recordings already received (same content) are not
+    identified again, and a finished session is answered with its stored results.
+    Large sessions should use the resumable upload (POST /api/offline-sessions) instead.
+    """
+    try:
+        job, created = await get_or_create_offline_job(request)
+        job_id = job["job_id"]
+        print(f"[Offline] {'Queueing' if created else 'Retry of'} session {request.sessionId} with {len(request.recordings)} recordings (job {job_id})")
+        
+        added = 0
+        for idx, recording in enumerate(request.recordings):
+            audio_data = base64.b64decode(recording.audioBase64)
+            content_hash = audio_hash(audio_data)
+            if await offline_recordings_collection.find_one({"job_id": job_id, "content_hash": content_hash}, {"_id": 1}):
+                continue
+            await asyncio.to_thread(write_file, offline_recording_path(job_id, f"{content_hash}.audio"), audio_data)
+            if await add_offline_recording(job_id, idx, recording.timestamp, content_hash, recording.location):
+                added += 1
+        
+        if created or added or not job.get("finalized") or job.get("status") == "failed":
+            await finalize_offline_job(job_id, authorization)
+        elif authorization and await retry_offline_notifications(job_id, authorization):
+            print(f"[Offline] Session {request.sessionId} already processed, retrying its failed notifications")
+        else:
+            print(f"[Offline] Session {request.sessionId} already received, returning stored results")
+        
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"_id": 0, "authorization": 0})
+        return {**await offline_session_status(job), "duplicate": not created, "newRecordings": added}
+        
+    except Exception as e:
+        print(f"[Offline] Session queueing error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process offline session: {str(e)}")
+
+
+# Resumable upload: create the session, PUT each recording (whole, or in byte
+# ranges with Content-Range: bytes start-end/total), then finalize. Recordings
+# are identified as soon as they are complete.
+
+@app.post("/api/offline-sessions")
+async def create_offline_session(request: OfflineSessionCreateRequest):
+    """
+    Start a resumable offline session upload (or get the existing job of the
+    session). The Authorization used for producer notifications is sent with
+    the finalize call, not stored for the whole upload.
+    """
+    try:
+        job, created = await get_or_create_offline_job(request)
+        job_id = job["job_id"]
+        if created:
+            print(f"[Offline] Upload started for session {request.sessionId} (job {job_id})")
+        job.pop("_id", None)
+        return {
+            **await offline_session_status(job),
+            "duplicate": not created,
+            "uploadUrl": f"/api/offline-sessions/{job_id}/recordings/{{index}}"
+        }
+    except Exception as e:
+        print(f"[Offline] Session creation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def offline_upload_state(job_id: str, index: int) -> dict:
+    """{"offset", "complete"} of a recording upload"""
+    recording = await offline_recordings_collection.find_one(
+        {"job_id": job_id, "$or": [{"index": index}, {"aliases": index}]}, {"path": 1}
+    )
+    path = recording["path"] if recording else offline_recording_path(job_id, f"{index}.part")
+    return {"offset": os.path.getsize(path) if os.path.exists(path) else 0, "complete": recording is not None}
+
+
+offline_upload_locks = {}  # (job id, index) -> [lock, holders]: one request writes a recording at a time
+
+
+@asynccontextmanager
+async def offline_upload_lock(job_id: str, index: int):
+    """Serialize the uploads of one recording so concurrent retries can't interleave appends"""
+    key = (job_id, index)
+    entry = offline_upload_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            offline_upload_locks.pop(key, None)
+
 
-class OfflineRecordingData(BaseModel):
-    audioBase64: str
-    timestamp: str
-    location: Optional[dict] = None
+@app.get("/api/offline-sessions/{job_id}/recordings/{index}")
+async def get_offline_upload(job_id: str, index: int):
+    """Bytes received so far for a recording, to resume an interrupted upload"""
+    return {"success": True, "index": index, **await offline_upload_state(job_id, index)}
 
-class OfflineSessionRequest(BaseModel):
-    sessionId: str
-    recordings: List[OfflineRecordingData]
-    userId: str
-    djName: str
-    startTime: str
-    endTime: Optional[str] = None
-    location: Optional[dict] = None
 
-@app.post("/api/process-offline-session")
-async def process_offline_session(request: OfflineSessionRequest, authorization: Optional[str] = Header(None)):
+@app.put("/api/offline-sessions/{job_id}/recordings/{index}")
+async def upload_offline_recording(job_id: str, index: int, request: Request, timestamp: str,
+                                   offset: int = 0, total: Optional[int] = None):
     """
-    Process offline SPYN recordings when the device comes back online.
-    Each recording is sent to ACRCloud for identification.
+    Upload a recording, or a byte range of it. The range comes from the
+    Content-Range header or the offset/total query parameters and must start
+    where the previous one ended (see GET on the same URL). Without a total
+    the body is the whole recording.
     """
+    job = await offline_sessions_collection.find_one({"job_id": job_id}, {"finalized": 1, "status": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Offline session not found")
+    if index < 0:
+        raise HTTPException(status_code=400, detail="Invalid recording index")
+    
+    async with offline_upload_lock(job_id, index):
+        return await receive_offline_recording(job, job_id, index, request, timestamp, offset, total)
+
+
+async def receive_offline_recording(job: dict, job_id: str, index: int, request: Request, timestamp: str,
+                                    offset: int, total: Optional[int]) -> dict:
+    """Body of upload_offline_recording, run while holding the recording's upload lock"""
+    state = await offline_upload_state(job_id, index)
+    if state["complete"]:
+        return {"success": True, "index": index, **state}
+    if job.get("finalized"):
+        raise HTTPException(status_code=409, detail="Offline session already finalized")
+    
+    content_range = request.headers.get("content-range")
+    if content_range:
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+)", content_range.strip())
+        if not match:
+            raise HTTPException(status_code=400, detail="Invalid Content-Range header")
+        offset, total = int(match.group(1)), int(match.group(3))
+    if total is not None and total > OFFLINE_MAX_RECORDING_BYTES:
+        raise HTTPException(status_code=413, detail=f"Recording too large (max {OFFLINE_MAX_RECORDING_BYTES} bytes)")
+    if offset != state["offset"]:
+        return JSONResponse(status_code=409, content={
+            "success": False, "index": index, "offset": state["offset"], "complete": False,
+            "detail": f"Expected offset {state['offset']}"
+        })
+    
+    # Stream the body to the partial file instead of buffering it
+    partial_path = offline_recording_path(job_id, f"{index}.part")
+    await asyncio.to_thread(os.makedirs, os.path.dirname(partial_path), exist_ok=True)
+    received = offset
+    f = await asyncio.to_thread(open, partial_path, "ab")
     try:
-        print(f"[Offline] Processing session {request.sessionId} with {len(request.recordings)} recordings")
-        
-        results = []
-        identified_tracks = []
-        
-        for idx, recording in enumerate(request.recordings):
-            print(f"[Offline] Processing recording {idx + 1}/{len(request.recordings)}")
-            
-            try:
-                # Decode base64 audio
-                audio_data = base64.b64decode(recording.audioBase64)
-                
-                # ACRCloud API parameters
-                http_method = "POST"
-                http_uri = "/v1/identify"
-                data_type = "audio"
-                signature_version = "1"
-                timestamp = str(int(time.time()))
-                
-                # Generate signature
-                signature = generate_acrcloud_signature(
-                    http_method, http_uri, ACRCLOUD_ACCESS_KEY,
-                    data_type, signature_version, timestamp, ACRCLOUD_ACCESS_SECRET
-                )
-                
-                # Prepare request - Use same format as online mode
-                files = {
-                    'sample': ('audio.wav', BytesIO(audio_data), 'audio/wav')
-                }
-                
-                data = {
-                    'access_key': ACRCLOUD_ACCESS_KEY,
-                    'sample_bytes': len(audio_data),
-                    'timestamp': timestamp,
-                    'signature': signature,
-                    'data_type': data_type,
-                    'signature_version': signature_version
-                }
-                
-                print(f"[Offline] Sending {len(audio_data)} bytes to ACRCloud...")
-                
-                # Send to ACRCloud
-                async with httpx.AsyncClient(timeout=30.0) as acr_client:
-                    response = await acr_client.post(
-                        f"https://{ACRCLOUD_HOST}{http_uri}",
-                        data=data,
-                        files=files
-                    )
-                
-                result = response.json()
-                status_code = result.get("status", {}).get("code", -1)
-                status_msg = result.get("status", {}).get("msg", "Unknown")
-                
-                print(f"[Offline] ACRCloud response: code={status_code}, msg={status_msg}")
-                print(f"[Offline] Full result: {json.dumps(result, indent=2)[:1000]}")
-                
-                if status_code == 0:
-                    # Check for custom_files first (Spynners tracks), then music, then humming
-                    custom_files = result.get("metadata", {}).get("custom_files", [])
-                    music = result.get("metadata", {}).get("music", [])
-                    humming = result.get("metadata", {}).get("humming", [])
-                    
-                    track = None
-                    is_custom = False
-                    source = "unknown"
-                    
-                    if custom_files:
-                        track = custom_files[0]
-                        is_custom = True
-                        source = "custom_files"
-                    elif music:
-                        track = music[0]
-                        source = "music"
-                    elif humming:
-                        track = humming[0]
-                        source = "humming"
-                    
-                    print(f"[Offline] Track found in: {source}")
-                    
-                    if track:
-                        track_title = track.get("title", "Unknown")
-                        
-                        # Get artist name based on source
-                        if is_custom:
-                            track_artist = track.get("producer_name") or track.get("artist", "Unknown")
-                        else:
-                            artists = track.get("artists", [])
-                            if artists:
-                                track_artist = ", ".join([a.get("name", "") for a in artists if a.get("name")])
-                            else:
-                                track_artist = track.get("artist", "Unknown")
-                        
-                        if not track_artist:
-                            track_artist = "Unknown"
-                        
-                        # For non-custom tracks, try to find matching Spynners track
-                        spynners_track_id = None
-                        producer_id = None
-                        cover_image = None
-                        
-                        if is_custom:
-                            spynners_track_id = track.get("spynners_track_id")
-                            producer_id = track.get("producer_id")
-                            cover_image = track.get("artwork_url")
-                        else:
-                            # Try to match with Spynners database using Base44 API
-                            try:
-                                from difflib import SequenceMatcher
-                                
-                                # Fetch tracks from Base44 API - use the correct URL format
-                                base44_url = f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track"
-                                headers = {
-                                    "Content-Type": "application/json"
-                                }
-                                
-                                print(f"[Offline] Fetching tracks from: {base44_url}")
-                                
-                                async with httpx.AsyncClient(timeout=30.0) as http_client:
-                                    tracks_response = await http_client.get(
-                                        f"{base44_url}?status=approved&limit=500",
-                                        headers=headers
-                                    )
-                                
-                                print(f"[Offline] Base44 response status: {tracks_response.status_code}")
-                                
-                                if tracks_response.status_code == 200:
-                                    all_tracks = tracks_response.json()
-                                    print(f"[Offline] Got {len(all_tracks)} tracks from Base44")
-                                    best_match = None
-                                    best_score = 0
-                                    
-                                    for db_track in all_tracks:
-                                        db_title = db_track.get("title", "").lower()
-                                        acr_title = track_title.lower()
-                                        
-                                        # Calculate similarity
-                                        title_ratio = SequenceMatcher(None, db_title, acr_title).ratio()
-                                        
-                                        # Check artist match too
-                                        db_artist = (db_track.get("producer_name") or db_track.get("artist", "")).lower()
-                                        artist_ratio = SequenceMatcher(None, db_artist, track_artist.lower()).ratio()
-                                        
-                                        # Combined score
-                                        combined_score = (title_ratio * 0.7) + (artist_ratio * 0.3)
-                                        
-                                        if combined_score > best_score and combined_score > 0.5:
-                                            best_score = combined_score
-                                            best_match = db_track
-                                    
-                                    if best_match:
-                                        print(f"[Offline] Matched to Spynners track: {best_match.get('title')} (score: {best_score:.2f})")
-                                        spynners_track_id = best_match.get("id")
-                                        producer_id = best_match.get("producer_id")
-                                        cover_image = best_match.get("artwork_url")
-                                        is_custom = True  # Mark as Spynners track
-                                    else:
-                                        print(f"[Offline] No match found for: {track_title} by {track_artist}")
-                                else:
-                                    print(f"[Offline] Failed to fetch tracks from Base44: {tracks_response.status_code}")
-                                    print(f"[Offline] Response: {tracks_response.text[:500]}")
-                            except Exception as match_error:
-                                print(f"[Offline] Matching error: {match_error}")
-                        
-                        track_result = {
-                            "success": True,
-                            "title": track_title,
-                            "artist": track_artist,
-                            "cover_image": cover_image,
-                            "spynners_track_id": spynners_track_id,
-                            "producer_id": producer_id,
-                            "timestamp": recording.timestamp,
-                            "is_spynners_track": is_custom and spynners_track_id is not None,
-                            "source": source
-                        }
-                        
-                        # Only count Spynners tracks
-                        if is_custom and spynners_track_id:
-                            identified_tracks.append(track_result)
-                        
-                        results.append(track_result)
-                        print(f"[Offline] ✅ Identified: {track_title} by {track_artist} (Spynners: {is_custom and spynners_track_id is not None})")
-                    else:
-                        results.append({
-                            "success": False,
-                            "message": "No track in response",
-                            "timestamp": recording.timestamp
-                        })
-                else:
-                    results.append({
-                        "success": False,
-                        "message": result.get("status", {}).get("msg", "Recognition failed"),
-                        "timestamp": recording.timestamp
-                    })
-                    print(f"[Offline] ❌ Not identified: {result.get('status', {}).get('msg', 'Unknown error')}")
-                    
-            except Exception as rec_error:
-                print(f"[Offline] Error processing recording {idx + 1}: {rec_error}")
-                results.append({
-                    "success": False,
-                    "message": str(rec_error),
-                    "timestamp": recording.timestamp
-                })
-        
-        # Store session in database for history
-        offline_session = {
-            "session_id": request.sessionId,
-            "user_id": request.userId,
-            "dj_name": request.djName,
-            "start_time": request.startTime,
-            "end_time": request.endTime,
-            "location": request.location,
-            "recordings_count": len(request.recordings),
-            "identified_count": len(identified_tracks),
-            "results": results,
-            "processed_at": datetime.utcnow().isoformat()
-        }
-        
-        db["offline_sessions"].insert_one(offline_session)
-        
-        # Send notifications for identified Spynners tracks (if in valid venue)
-        location = request.location or {}
-        is_valid_venue = location.get("is_valid_venue", False)
-        
-        if is_valid_venue and identified_tracks and authorization:
-            print(f"[Offline] Valid venue detected - Sending producer notifications for {len(identified_tracks)} tracks")
-            
-            for track in identified_tracks:
-                if track.get("producer_id"):
-                    try:
-                        # Call Base44 sendTrackPlayedEmail function
-                        headers = {
-                            "Content-Type": "application/json",
-                            "X-Base44-App-Id": BASE44_APP_ID,
-                            "Authorization": authorization
-                        }
-                        
-                        email_payload = {
-                            "producerId": track["producer_id"],
-                            "trackTitle": track["title"],
-                            "djName": request.djName,
-                            "city": location.get("city", ""),
-                            "country": location.get("country", ""),
-                            "venue": location.get("venue", ""),
-                            "trackArtworkUrl": track.get("cover_image", ""),
-                            "playedAt": track["timestamp"],
-                        }
-                        
-                        async with httpx.AsyncClient(timeout=30.0) as http_client:
-                            await http_client.post(
-                                f"https://spynners.com/api/functions/sendTrackPlayedEmail",
-                                json=email_payload,
-                                headers=headers
-                            )
-                        print(f"[Offline] ✅ Email sent for: {track['title']}")
-                    except Exception as email_error:
-                        print(f"[Offline] ❌ Email error for {track['title']}: {email_error}")
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > OFFLINE_MAX_RECORDING_BYTES or (total is not None and received > total):
+                await asyncio.to_thread(f.truncate, offset)
+                raise HTTPException(status_code=413, detail="Recording larger than announced")
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    
+    complete = total is None or received == total
+    if complete:
+        # Identical audio already received for the session is not identified twice
+        content_hash = await asyncio.to_thread(file_hash, partial_path)
+        await asyncio.to_thread(os.replace, partial_path, offline_recording_path(job_id, f"{content_hash}.audio"))
+        added = await add_offline_recording(job_id, index, timestamp, content_hash)
+        print(f"[Offline] Recording {index} of job {job_id} received ({received} bytes{'' if added else ', duplicate'})")
+    return {"success": True, "index": index, "offset": received, "complete": complete}
+
+
+@app.post("/api/offline-sessions/{job_id}/finalize")
+async def finalize_offline_session(job_id: str, request: OfflineSessionFinalizeRequest,
+                                   authorization: Optional[str] = Header(None)):
+    """Declare the upload complete; the job completes once every recording is identified"""
+    try:
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"finalized": 1})
+        if not job:
+            raise HTTPException(status_code=404, detail="Offline session not found")
+        if job.get("finalized"):
+            job = await offline_sessions_collection.find_one({"job_id": job_id}, {"_id": 0, "authorization": 0})
+            return await offline_session_status(job)
+        
+        received = set()
+        async for recording in offline_recordings_collection.find({"job_id": job_id}, {"_id": 0, "index": 1, "aliases": 1}):
+            received.add(recording["index"])
+            received.update(recording.get("aliases", []))
+        missing = [idx for idx in range(request.recordingsCount) if idx not in received]
+        if missing:
+            return JSONResponse(status_code=409, content={
+                "success": False, "missing": missing, "detail": f"{len(missing)} recording(s) not uploaded"
+            })
+        
+        await finalize_offline_job(job_id, authorization, end_time=request.endTime)
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"_id": 0, "authorization": 0})
+        return await offline_session_status(job)
         
-        print(f"[Offline] Session processed: {len(results)} recordings, {len(identified_tracks)} Spynners tracks identified")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[Offline] Session finalize error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/offline-sessions/{job_id}/notifications/retry")
+async def retry_offline_session_notifications(job_id: str, authorization: Optional[str] = Header(None)):
+    """Retry the producer notifications of a session that could not be delivered"""
+    try:
+        if not authorization:
+            raise HTTPException(status_code=401, detail="Authorization required")
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"notifications_status": 1})
+        if not job:
+            raise HTTPException(status_code=404, detail="Offline session not found")
+        if not await retry_offline_notifications(job_id, authorization):
+            raise HTTPException(status_code=409, detail=f"No failed notifications to retry (notifications {job.get('notifications_status')})")
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"_id": 0, "authorization": 0})
+        return await offline_session_status(job)
         
-        return {
-            "success": True,
-            "sessionId": request.sessionId,
-            "totalRecordings": len(request.recordings),
-            "identifiedTracks": len(identified_tracks),
-            "results": results
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[Offline] Notification retry error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/offline-sessions/{job_id}")
+async def get_offline_session(job_id: str):
+    """Progress and (partial) results of an offline session job"""
+    try:
+        job = await offline_sessions_collection.find_one({"job_id": job_id}, {"_id": 0, "authorization": 0})
+        if not job:
+            raise HTTPException(status_code=404, detail="Offline session not found")
+        return await offline_session_status(job)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[Offline] Session processing error: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to process offline session: {str(e)}")
+        print(f"[Offline] Session status error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 # ==================== SPYNNERS NATIVE API PROXY ====================
@@ -2275,7 +4928,7 @@ async def call_spynners_function(function_name: str, body: dict, authorization:
     
     print(f"[Spynners API] Calling {function_name} with body: {body}")
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with upstream_client("spynners") as client:
         response = await client.post(url, headers=headers, json=body)
         print(f"[Spynners API] Response status: {response.status_code}")
         
@@ -2782,7 +5435,7 @@ async def send_dj_message(request: SendDJMessageRequest, authorization: str = He
         }
         
         # Save to MongoDB
-        result = db.dj_messages.insert_one(message_doc)
+        result = await db.dj_messages.insert_one(message_doc)
         print(f"[DJ Message] Saved to database with id: {result.inserted_id}")
         
         # Try to send via Base44 notification system
@@ -2853,7 +5506,7 @@ async def update_user_diamonds(request: UpdateDiamondsRequest, authorization: st
             }
             headers["Authorization"] = authorization
             
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
+            async with upstream_client("base44") as http_client:
                 me_response = await http_client.get(
                     f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/auth/me",
                     headers=headers
@@ -3232,12 +5885,13 @@ async def get_admin_users(authorization: str = Header(None), limit: int = 10000)
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as http_client:
+            async with upstream_client("base44") as http_client:
                 while attempts < max_attempts and len(all_users) < limit:
                     response = await http_client.get(
                         f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User",
                         params={"limit": page_size, "offset": offset},
-                        headers=headers
+                        headers=headers,
+                        timeout=60.0
                     )
                     
                     if response.status_code == 200:
@@ -3364,8 +6018,8 @@ async def generate_missing_avatars(authorization: str = Header(None)):
                     "Content-Type": "application/json"
                 }
                 
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.put(base44_url, json={"avatar_url": avatar_url}, headers=headers)
+                async with upstream_client("base44") as client:
+                    response = await client.put(base44_url, json={"avatar_url": avatar_url}, headers=headers, timeout=10.0)
                     if response.status_code == 200:
                         generated_count += 1
                         print(f"[Admin] Generated cartoon avatar for: {user_name}")
@@ -3412,10 +6066,11 @@ async def update_user_role(user_id: str, request: Request, authorization: str =
             "user_type": new_role if new_role in ['dj', 'producer'] else None
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with upstream_client("base44") as client:
             response = await client.put(base44_url, json=update_data, headers=headers)
             
             if response.status_code == 200:
+                invalidate_user(user_id)
                 print(f"[Admin] User {user_id} role updated to {new_role}")
                 return {"success": True, "message": f"Rôle mis à jour: {new_role}"}
             else:
@@ -3470,12 +6125,13 @@ async def update_user(user_id: str, request: Request, authorization: str = Heade
         if 'read_only' in body:
             update_data['read_only'] = body['read_only']
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with upstream_client("base44") as client:
             response = await client.put(base44_url, json=update_data, headers=headers)
             
             print(f"[Admin] Update user response: {response.status_code}")
             
             if response.status_code == 200:
+                invalidate_user(user_id)
                 print(f"[Admin] User {user_id} updated successfully")
                 return {"success": True, "message": "Utilisateur mis à jour", "user": response.json() if response.text else {}}
             else:
@@ -3596,7 +6252,7 @@ async def approve_track(track_id: str, authorization: str = Header(None)):
             "is_approved": True
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with upstream_client("base44") as client:
             # Use PUT for updates (Base44 preference)
             response = await client.put(
                 base44_url,
@@ -3608,7 +6264,9 @@ async def approve_track(track_id: str, authorization: str = Header(None)):
             
             if response.status_code == 200:
                 print(f"[Admin] Track {track_id} approved successfully")
-                return {"success": True, "message": "Track approved", "track": response.json() if response.text else {}}
+                updated = response.json() if response.text else {}
+                invalidate_track(track_id, updated)
+                return {"success": True, "message": "Track approved", "track": updated}
             
             print(f"[Admin] Failed to approve track. Response: {response.text[:200] if response.text else 'empty'}")
             raise HTTPException(status_code=500, detail=f"Failed to approve track: {response.text[:200] if response.text else 'No response'}")
@@ -3644,7 +6302,7 @@ async def reject_track(track_id: str, reason: str = None, authorization: str = H
             "rejection_reason": reason or "Rejeté par l'admin"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with upstream_client("base44") as client:
             # Try PUT first (Base44 uses PUT for updates)
             response = await client.put(
                 base44_url,
@@ -3656,7 +6314,9 @@ async def reject_track(track_id: str, reason: str = None, authorization: str = H
             
             if response.status_code == 200:
                 print(f"[Admin] Track {track_id} rejected successfully via PUT")
-                return {"success": True, "message": "Track rejected", "track": response.json() if response.text else {}}
+                updated = response.json() if response.text else {}
+                invalidate_track(track_id, updated)
+                return {"success": True, "message": "Track rejected", "track": updated}
             
             # If PUT fails, try PATCH
             response = await client.patch(
@@ -3669,7 +6329,9 @@ async def reject_track(track_id: str, reason: str = None, authorization: str = H
             
             if response.status_code == 200:
                 print(f"[Admin] Track {track_id} rejected via PATCH")
-                return {"success": True, "message": "Track rejected", "track": response.json() if response.text else {}}
+                updated = response.json() if response.text else {}
+                invalidate_track(track_id, updated)
+                return {"success": True, "message": "Track rejected", "track": updated}
             
             # If both fail, try POST to a function
             function_url = f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/functions/invoke/updateTrackStatus"
@@ -3682,6 +6344,7 @@ async def reject_track(track_id: str, reason: str = None, authorization: str = H
             print(f"[Admin] Function response: {response.status_code}")
             
             if response.status_code == 200:
+                invalidate_track(track_id)
                 return {"success": True, "message": "Track rejected", "track": response.json() if response.text else {}}
             
             print(f"[Admin] All methods failed. Last response: {response.text}")
@@ -3714,10 +6377,11 @@ async def get_admin_sessions(authorization: str = Header(None), limit: int = 100
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with upstream_client("base44") as client:
                 response = await client.get(
                     f"{base44_url}?limit={limit}",
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if response.status_code == 200:
@@ -3734,7 +6398,7 @@ async def get_admin_sessions(authorization: str = Header(None), limit: int = 100
                     print(f"[Admin Sessions] Rate limit exceeded - waiting 2 seconds and retrying...")
                     await asyncio.sleep(2)
                     # Retry once
-                    response2 = await client.get(f"{base44_url}?limit={limit}", headers=headers)
+                    response2 = await client.get(f"{base44_url}?limit={limit}", headers=headers, timeout=60.0)
                     if response2.status_code == 200:
                         data = response2.json()
                         if isinstance(data, list):
@@ -3845,10 +6509,11 @@ async def export_admin_sessions_pdf(request: AdminSessionsPDFRequest, authorizat
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with upstream_client("spynners") as client:
                 response = await client.get(
                     f"{base44_url}?limit=10000",
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if response.status_code == 200:
@@ -3949,10 +6614,11 @@ async def export_admin_sessions_pdf(request: AdminSessionsPDFRequest, authorizat
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with upstream_client("spynners") as client:
                 response = await client.get(
                     f"{base44_plays_url}?limit=10000",
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if response.status_code == 200:
@@ -3968,7 +6634,7 @@ async def export_admin_sessions_pdf(request: AdminSessionsPDFRequest, authorizat
                 elif response.status_code == 429:
                     print(f"[Admin Sessions PDF] Rate limit - waiting and retrying...")
                     await asyncio.sleep(2)
-                    response2 = await client.get(f"{base44_plays_url}?limit=10000", headers=headers)
+                    response2 = await client.get(f"{base44_plays_url}?limit=10000", headers=headers, timeout=60.0)
                     if response2.status_code == 200:
                         data = response2.json()
                         if isinstance(data, list):
@@ -4405,70 +7071,6 @@ async def clean_duplicates(authorization: str = Header(None)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/admin/fix-bpm")
-async def fix_missing_bpm(authorization: str = Header(None)):
-    """
-    Fix missing BPM for tracks.
-    Finds tracks without BPM and calls detectBPM for each.
-    """
-    try:
-        if not authorization:
-            raise HTTPException(status_code=401, detail="Authorization required")
-        
-        print("[Admin] Fixing missing BPM...")
-        
-        # First, get all tracks to find those without BPM
-        tracks_result = await call_spynners_function("nativeGetTracks", {"limit": 500}, authorization)
-        
-        if not tracks_result:
-            return {"success": True, "message": "Aucun track trouvé", "fixed": 0}
-        
-        tracks = tracks_result.get('tracks', []) if isinstance(tracks_result, dict) else tracks_result
-        
-        # Find tracks without BPM that have audio_url
-        tracks_without_bpm = [t for t in tracks if not t.get('bpm') and t.get('audio_url')]
-        
-        if not tracks_without_bpm:
-            return {
-                "success": True,
-                "message": "Tous les tracks ont déjà un BPM ou n'ont pas d'audio",
-                "fixed": 0,
-                "total_checked": len(tracks)
-            }
-        
-        print(f"[Admin] Found {len(tracks_without_bpm)} tracks without BPM")
-        
-        fixed_count = 0
-        errors = []
-        
-        # Process each track (limit to first 10 to avoid timeout)
-        for track in tracks_without_bpm[:10]:
-            try:
-                result = await call_spynners_function("detectBPM", {
-                    "audio_url": track.get('audio_url'),
-                    "trackId": track.get('id')
-                }, authorization)
-                
-                if result:
-                    fixed_count += 1
-                    print(f"[Admin] Fixed BPM for: {track.get('title')}")
-            except Exception as e:
-                errors.append(f"{track.get('title')}: {str(e)}")
-                print(f"[Admin] Error fixing BPM for {track.get('title')}: {e}")
-        
-        return {
-            "success": True,
-            "message": f"BPM corrigé pour {fixed_count} tracks sur {len(tracks_without_bpm)} sans BPM",
-            "fixed": fixed_count,
-            "total_without_bpm": len(tracks_without_bpm),
-            "errors": errors[:5] if errors else []
-        }
-        
-    except Exception as e:
-        print(f"[Admin] Fix BPM error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @app.get("/api/admin/downloads")
 async def get_admin_downloads(authorization: str = Header(None), limit: int = 500):
     """
@@ -4556,11 +7158,12 @@ async def export_admin_downloads_pdf(request: AdminDownloadsPDFRequest, authoriz
         
         tracks = []
         try:
-            async with httpx.AsyncClient(timeout=60.0) as http_client:
+            async with upstream_client("base44") as http_client:
                 response = await http_client.get(
                     f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track",
                     params={"limit": 1000},
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 if response.status_code == 200:
                     data = response.json()
@@ -4797,6 +7400,441 @@ async def export_admin_downloads_pdf(request: AdminDownloadsPDFRequest, authoriz
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
 
 
+# ==================== CATALOG BACKFILL ====================
+
+# Background job filling in missing BPM / key / energy level across the whole
+# Spynners catalog: pages through nativeGetTracks, analyses the audio of the
+# tracks missing a field in the analysis pool, and writes the results back to
+# the Track entities in batches. Progress is checkpointed (the catalog offset
+# whose tracks are all written back, with the counters up to it) so an
+# interrupted job resumes there from the next fix-bpm call, which brings a
+# fresh token: the admin token is never reused across restarts.
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "100"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", str(ANALYSIS_WORKERS)))  # Tracks downloaded/analysed at once
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "20"))  # Track updates written back together
+BACKFILL_WRITE_CONCURRENCY = int(os.getenv("BACKFILL_WRITE_CONCURRENCY", "4"))
+BACKFILL_MAX_DOWNLOAD_BYTES = int(os.getenv("BACKFILL_MAX_DOWNLOAD_BYTES", str(8 * 1024 * 1024)))  # Only the start is analysed
+BACKFILL_FIELDS = ("bpm", "key", "energy_level")
+BACKFILL_BUSY_RETRIES = 5
+BACKFILL_PAGE_RETRIES = 3  # Transient nativeGetTracks failures tolerated per page
+
+backfill_tasks = {}  # job id -> running asyncio task
+backfill_progress = {}  # job id -> (counters up to the checkpoint, pages in flight) of the running job
+
+
+def new_backfill_counters() -> dict:
+    return {"scanned": 0, "candidates": 0, "analysed": 0, "updated": 0, "unchanged": 0, "failed": 0, "remote": 0}
+
+
+def live_backfill_counters(job_id: str) -> Optional[dict]:
+    """Counters of a running job including the pages past its checkpoint"""
+    if job_id not in backfill_progress:
+        return None
+    committed, pages = backfill_progress[job_id]
+    counters = dict(committed)
+    for page in pages:
+        for name, value in page["counters"].items():
+            counters[name] += value
+    return counters
+
+
+def backfill_missing_fields(track: dict) -> List[str]:
+    """Fields of a catalog track the backfill can fill in (none without a downloadable audio_url)"""
+    audio_url = track.get("audio_url") or ""
+    if not audio_url.startswith(("http://", "https://")):
+        return []
+    return [field for field in BACKFILL_FIELDS if not track.get(field)]
+
+
+async def download_track_head(audio_url: str, max_bytes: int = BACKFILL_MAX_DOWNLOAD_BYTES) -> bytes:
+    """The first `max_bytes` of a track's audio file (enough for the analysed start)"""
+    chunks, size = [], 0
+    async with upstream_client("media") as http_client:
+        async with http_client.stream("GET", audio_url, follow_redirects=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"Audio download returned {response.status_code}")
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    break
+    return b"".join(chunks)[:max_bytes]
+
+
+async def put_track_fields(track_id: str, fields: dict, authorization: str) -> dict:
+    """Update fields of a Track entity through the Base44 REST API"""
+    async with upstream_client("base44") as http_client:
+        response = await http_client.put(
+            f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track/{track_id}",
+            json=fields,
+            headers={
+                "Authorization": authorization,
+                "X-Base44-App-Id": BASE44_APP_ID,
+                "Content-Type": "application/json"
+            }
+        )
+    if response.status_code != 200:
+        raise Exception(f"Base44 returned {response.status_code}: {response.text[:200]}")
+    updated = response.json() if response.text else {}
+    invalidate_track(track_id, updated)
+    return updated
+
+
+async def analyze_catalog_track(track: dict, missing: List[str], authorization: str) -> dict:
+    """
+    Values for the `missing` fields of a track. Analysed locally from the
+    start of its audio; when the format can't be decoded here, the Spynners
+    detectBPM function is asked instead (it writes the BPM itself) -> {}.
+    """
+    audio_data = await download_track_head(track["audio_url"])
+    for attempt in range(BACKFILL_BUSY_RETRIES):
+        try:
+            analysis = await run_analysis(audio_analysis.analyze_track, audio_data)
+            break
+        except HTTPException as e:
+            # Pool full with interactive uploads: back off instead of failing the track
+            if e.status_code != 503 or attempt == BACKFILL_BUSY_RETRIES - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+        except Exception as analysis_error:
+            if "bpm" not in missing:
+                raise
+            print(f"[Backfill] Local analysis failed for '{track.get('title')}' ({analysis_error}), using detectBPM")
+            await call_spynners_function("detectBPM", {"audio_url": track["audio_url"], "trackId": track.get("id")}, authorization)
+            return {"remote": True}
+    
+    values = {
+        "bpm": int(round(analysis["bpm"])) if analysis.get("bpm") else None,
+        "key": analysis.get("key"),
+        "energy_level": analysis.get("energy_level"),
+    }
+    return {field: values[field] for field in missing if values.get(field)}
+
+
+class BackfillWriter:
+    """Buffers track updates and writes them back BACKFILL_BATCH_SIZE at a time"""
+
+    def __init__(self, authorization: str, errors: list):
+        self.authorization = authorization
+        self.errors = errors
+        self.pending = []
+        self.slots = asyncio.Semaphore(BACKFILL_WRITE_CONCURRENCY)
+        self.lock = asyncio.Lock()
+
+    async def add(self, track: dict, fields: dict, counters: dict):
+        self.pending.append((track, fields, counters))
+        if len(self.pending) >= BACKFILL_BATCH_SIZE:
+            await self.flush()
+
+    async def write(self, track: dict, fields: dict, counters: dict):
+        async with self.slots:
+            try:
+                await put_track_fields(track["id"], fields, self.authorization)
+                counters["updated"] += 1
+            except Exception as e:
+                counters["failed"] += 1
+                self.errors.append({"track_id": track["id"], "title": track.get("title"), "error": str(e)[:200]})
+
+    async def flush(self):
+        async with self.lock:
+            batch, self.pending = self.pending, []
+            if batch:
+                await asyncio.gather(*(self.write(*update) for update in batch))
+
+
+async def fetch_backfill_page(offset: int, authorization: str) -> list:
+    """One catalog page; network errors, 429 and 5xx are retried with backoff"""
+    for attempt in range(BACKFILL_PAGE_RETRIES):
+        try:
+            result = await call_spynners_function("nativeGetTracks", {"limit": BACKFILL_PAGE_SIZE, "offset": offset}, authorization)
+            return result.get("tracks", []) if isinstance(result, dict) else (result or [])
+        except (HTTPException, httpx.RequestError) as e:
+            transient = not isinstance(e, HTTPException) or e.status_code == 429 or e.status_code >= 500
+            if not transient or attempt == BACKFILL_PAGE_RETRIES - 1:
+                raise
+            print(f"[Backfill] Page at offset {offset} failed ({e}), retrying")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def save_backfill_checkpoint(job_id: str, offset: int, counters: dict, errors: list, started: float):
+    await backfill_jobs_collection.update_one({"job_id": job_id}, {"$set": {
+        "checkpoint": {"offset": offset, "saved_at": datetime.utcnow().isoformat()},
+        "counters": counters,
+        "errors": errors[-20:],
+        "run_seconds": round(time.perf_counter() - started, 1),
+        "updated_at": datetime.utcnow().isoformat()
+    }})
+
+
+async def run_backfill_job(job_id: str):
+    """
+    Page through the catalog from the job's checkpoint. Tracks missing a field
+    are analysed BACKFILL_CONCURRENCY at a time while the next pages are
+    fetched; the checkpoint (and its counters) moves past a page once all its
+    updates are written, so the pages redone after a resume are counted once.
+    """
+    job = await backfill_jobs_collection.find_one({"job_id": job_id})
+    if not job or job.get("status") not in ("queued", "running"):
+        return
+    authorization = job["authorization"]
+    offset = job.get("checkpoint", {}).get("offset", 0)
+    counters = {**new_backfill_counters(), **job.get("counters", {})}  # Saved with the checkpoint
+    errors = list(job.get("errors", []))
+    pages = deque()  # {"offset" after the page, "tasks" of its tracks, "counters"}, oldest first
+    backfill_progress[job_id] = (counters, pages)
+    previous_seconds = job.get("run_seconds", 0.0)
+    started = time.perf_counter() - previous_seconds
+    
+    total = None
+    try:
+        await spynners_catalog.ensure_loaded()
+        total = len(spynners_catalog) or None  # Estimate used for the ETA
+    except Exception as catalog_error:
+        print(f"[Backfill] Catalog size unknown: {catalog_error}")
+    await backfill_jobs_collection.update_one({"job_id": job_id}, {"$set": {
+        "status": "running", "total_estimate": total, "resumed_from": offset,
+        "updated_at": datetime.utcnow().isoformat()
+    }})
+    print(f"[Backfill] Job {job_id} running from offset {offset} (catalog ~{total} tracks)")
+    
+    semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+    writer = BackfillWriter(authorization, errors)
+    
+    async def process(track: dict, missing: List[str], page_counters: dict):
+        try:
+            fields = await analyze_catalog_track(track, missing, authorization)
+            page_counters["analysed"] += 1
+            if fields.pop("remote", False):
+                page_counters["remote"] += 1
+            elif fields:
+                await writer.add(track, fields, page_counters)
+            else:
+                page_counters["unchanged"] += 1
+        except Exception as e:
+            page_counters["failed"] += 1
+            errors.append({"track_id": track.get("id"), "title": track.get("title"), "error": str(e)[:200]})
+            print(f"[Backfill] '{track.get('title')}' failed: {e}")
+        finally:
+            semaphore.release()
+    
+    async def advance_checkpoint():
+        done = []
+        while pages and all(task.done() for task in pages[0]["tasks"]):
+            done.append(pages[0])
+            pages.popleft()
+        if done:
+            # Writes still buffered for these pages land before the checkpoint passes them
+            await writer.flush()
+            for page in done:
+                for name, value in page["counters"].items():
+                    counters[name] += value
+            await save_backfill_checkpoint(job_id, done[-1]["offset"], counters, errors, started)
+    
+    try:
+        while True:
+            job = await backfill_jobs_collection.find_one({"job_id": job_id}, {"status": 1})
+            if job and job.get("status") == "cancelling":
+                break
+            page = await fetch_backfill_page(offset, authorization)
+            offset += len(page)
+            entry = {"offset": offset, "tasks": [], "counters": new_backfill_counters()}
+            pages.append(entry)
+            for track in page:
+                entry["counters"]["scanned"] += 1
+                missing = backfill_missing_fields(track)
+                if track.get("id") and missing:
+                    entry["counters"]["candidates"] += 1
+                    await semaphore.acquire()
+                    entry["tasks"].append(asyncio.create_task(process(track, missing, entry["counters"])))
+            await advance_checkpoint()
+            if len(page) < BACKFILL_PAGE_SIZE:
+                break
+        
+        for entry in list(pages):
+            await asyncio.gather(*entry["tasks"])
+            await advance_checkpoint()
+    except BaseException:
+        # Job failing (or the server stopping): don't leave analyses running behind it.
+        # Updates already buffered are still written; the checkpoint stays before the
+        # unfinished pages, so they are redone on resume.
+        tasks = [task for entry in pages for task in entry["tasks"]]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await writer.flush()
+        except Exception as flush_error:
+            print(f"[Backfill] Could not write buffered updates of job {job_id}: {flush_error}")
+        raise
+    
+    job = await backfill_jobs_collection.find_one({"job_id": job_id}, {"status": 1})
+    status = "cancelled" if job and job.get("status") == "cancelling" else "completed"
+    await backfill_jobs_collection.update_one({"job_id": job_id}, {
+        "$set": {"status": status, "finished_at": datetime.utcnow().isoformat(), "updated_at": datetime.utcnow().isoformat()},
+        "$unset": {"authorization": ""}
+    })
+    print(f"[Backfill] Job {job_id} {status}: {counters}")
+
+
+async def backfill_job_runner(job_id: str):
+    try:
+        await run_backfill_job(job_id)
+    except Exception as e:
+        print(f"[Backfill] Job {job_id} failed: {e}")
+        try:
+            await backfill_jobs_collection.update_one({"job_id": job_id}, {
+                "$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow().isoformat()},
+                "$unset": {"authorization": ""}
+            })
+        except Exception as update_error:
+            print(f"[Backfill] Could not mark job {job_id} as failed: {update_error}")
+    finally:
+        backfill_tasks.pop(job_id, None)
+        backfill_progress.pop(job_id, None)
+
+
+def start_backfill_job(job_id: str):
+    if job_id not in backfill_tasks:
+        backfill_tasks[job_id] = asyncio.create_task(backfill_job_runner(job_id))
+
+
+async def interrupt_backfill_jobs():
+    """
+    Mark the backfill a previous process was running as interrupted and drop
+    its token (likely expired by now): the next fix-bpm call resumes it from
+    its checkpoint with a fresh one
+    """
+    try:
+        now = datetime.utcnow().isoformat()
+        await backfill_jobs_collection.update_many(
+            {"status": "cancelling"}, {"$set": {"status": "cancelled", "updated_at": now}, "$unset": {"authorization": ""}}
+        )
+        result = await backfill_jobs_collection.update_many(
+            {"status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "interrupted", "updated_at": now}, "$unset": {"authorization": ""}}
+        )
+        if result.modified_count:
+            print(f"[Backfill] {result.modified_count} job(s) interrupted by the restart, resumable with fix-bpm")
+    except Exception as e:
+        print(f"[Backfill] Could not release jobs: {e}")
+
+
+def backfill_job_status(job: dict) -> dict:
+    """Progress of a backfill job with throughput and ETA"""
+    counters = live_backfill_counters(job["job_id"]) or {**new_backfill_counters(), **job.get("counters", {})}
+    total = job.get("total_estimate")
+    offset = job.get("checkpoint", {}).get("offset", 0)
+    run_seconds = job.get("run_seconds", 0.0)
+    scanned_this_run = max(0, counters["scanned"] - job.get("resumed_from", 0))
+    rate = counters["scanned"] / run_seconds if run_seconds else None  # Tracks scanned per second
+    eta_seconds = None
+    if job.get("status") == "running" and rate and total:
+        eta_seconds = round(max(0, total - max(offset, counters["scanned"])) / rate)
+    return {
+        "success": True,
+        "jobId": job["job_id"],
+        "status": job.get("status"),
+        "fields": list(BACKFILL_FIELDS),
+        "checkpointOffset": offset,
+        "totalEstimate": total,
+        "progress": round(min(1.0, offset / total), 3) if total else None,
+        **counters,
+        "scannedThisRun": scanned_this_run,
+        "tracksPerSecond": round(rate, 2) if rate else None,
+        "etaSeconds": eta_seconds,
+        "errors": job.get("errors", [])[-5:],
+        "error": job.get("error"),
+        "createdAt": job.get("created_at"),
+        "updatedAt": job.get("updated_at"),
+        "finishedAt": job.get("finished_at"),
+        "statusUrl": f"/api/admin/backfill/{job['job_id']}"
+    }
+
+
+@app.post("/api/admin/fix-bpm")
+async def fix_missing_bpm(authorization: str = Header(None), resume: bool = True):
+    """
+    Start the catalog backfill (BPM, key, energy level) in the background,
+    or return the one already running. With `resume`, the last interrupted
+    job continues from its checkpoint instead of starting over.
+    """
+    try:
+        if not authorization:
+            raise HTTPException(status_code=401, detail="Authorization required")
+        if analysis_pool is None:
+            raise HTTPException(status_code=503, detail="Audio analysis is not available")
+        
+        job = await backfill_jobs_collection.find_one(
+            {"status": {"$in": ["queued", "running", "cancelling"]}}, sort=[("created_at", -1)]
+        )
+        if job:
+            message = "Analyse BPM déjà en cours"
+        else:
+            job = await backfill_jobs_collection.find_one(
+                {"status": {"$in": ["failed", "cancelled", "interrupted"]}}, sort=[("created_at", -1)]
+            ) if resume else None
+            if job:
+                await backfill_jobs_collection.update_one({"job_id": job["job_id"]}, {
+                    "$set": {"status": "queued", "authorization": authorization, "updated_at": datetime.utcnow().isoformat()},
+                    "$unset": {"error": "", "finished_at": ""}
+                })
+                message = f"Analyse BPM reprise à partir du track {job.get('checkpoint', {}).get('offset', 0)}"
+            else:
+                job = {
+                    "job_id": uuid.uuid4().hex,
+                    "status": "queued",
+                    "authorization": authorization,
+                    "checkpoint": {"offset": 0},
+                    "counters": new_backfill_counters(),
+                    "errors": [],
+                    "created_at": datetime.utcnow().isoformat(),
+                    "updated_at": datetime.utcnow().isoformat()
+                }
+                await backfill_jobs_collection.insert_one(job)
+                message = "Analyse BPM lancée en arrière-plan sur tout le catalogue"
+            job = await backfill_jobs_collection.find_one({"job_id": job["job_id"]})
+        
+        start_backfill_job(job["job_id"])
+        print(f"[Admin] {message} (job {job['job_id']})")
+        return {**backfill_job_status(job), "message": message}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[Admin] Fix BPM error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/admin/backfill/{job_id}")
+async def get_backfill_job(job_id: str, authorization: str = Header(None)):
+    """Progress and ETA of a catalog backfill job"""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization required")
+    job = await backfill_jobs_collection.find_one({"job_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return backfill_job_status(job)
+
+
+@app.post("/api/admin/backfill/{job_id}/cancel")
+async def cancel_backfill_job(job_id: str, authorization: str = Header(None)):
+    """Stop a backfill after the tracks in progress; it can be resumed from its checkpoint"""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization required")
+    result = await backfill_jobs_collection.update_one(
+        {"job_id": job_id, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "cancelling", "updated_at": datetime.utcnow().isoformat()}}
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=409, detail="Backfill job is not running")
+    if job_id not in backfill_tasks:
+        await backfill_jobs_collection.update_one({"job_id": job_id}, {
+            "$set": {"status": "cancelled"}, "$unset": {"authorization": ""}
+        })
+    job = await backfill_jobs_collection.find_one({"job_id": job_id})
+    return backfill_job_status(job)
+
+
 # ==================== ADMIN BROADCAST EMAIL ====================
 
 class BroadcastEmailRequest(BaseModel):
@@ -4954,7 +7992,7 @@ async def send_broadcast_email(request: BroadcastEmailRequest, authorization: st
         # Get list of recipients based on type
         recipients = []
         
-        async with httpx.AsyncClient(timeout=60.0) as http_client:
+        async with upstream_client("base44") as http_client:
             if request.recipient_type == 'individual' and request.individual_email:
                 recipients = [{"email": request.individual_email, "name": ""}]
                 
@@ -4963,7 +8001,8 @@ async def send_broadcast_email(request: BroadcastEmailRequest, authorization: st
                 users_response = await http_client.get(
                     f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/User",
                     params={"limit": 10000},
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if users_response.status_code == 200:
@@ -5057,7 +8096,7 @@ async def send_broadcast_email(request: BroadcastEmailRequest, authorization: st
         
         # Save to BroadcastEmail entity for history
         try:
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
+            async with upstream_client("base44") as http_client:
                 await http_client.post(
                     f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/BroadcastEmail",
                     headers=headers,
@@ -5285,6 +8324,7 @@ async def upload_vip_track(
         audio_filename = audio.filename or "track.mp3"
         audio_content_type = audio.content_type or "audio/mpeg"
         print(f"[Admin VIP Upload] Audio file: {audio_filename}, size: {len(audio_content)} bytes")
+        analysis = await analyze_upload(audio_content, "Admin VIP Upload")
         
         # Read image file if provided
         image_data = None
@@ -5296,7 +8336,7 @@ async def upload_vip_track(
         
         # First, try to upload the audio file to Base44 files storage
         audio_url = None
-        async with httpx.AsyncClient(timeout=180.0) as client:
+        async with upstream_client("base44") as client:
             print(f"[Admin VIP Upload] Attempting to upload audio to Base44...")
             
             # Try the functions/invoke endpoint for file upload
@@ -5315,7 +8355,8 @@ async def upload_vip_track(
                     'Authorization': authorization,
                     'X-Base44-App-Id': BASE44_APP_ID,
                     'Content-Type': 'application/json'
-                }
+                },
+                timeout=180.0
             )
             
             print(f"[Admin VIP Upload] Function upload response: {upload_response.status_code}")
@@ -5370,7 +8411,8 @@ async def upload_vip_track(
                     headers={
                         'Authorization': authorization,
                         'Content-Type': 'application/json'
-                    }
+                    },
+                    timeout=180.0
                 )
                 
                 if image_response.status_code == 200:
@@ -5387,7 +8429,9 @@ async def upload_vip_track(
             "artist_name": artist or "Unknown Artist",
             "description": description or "",
             "genre": genre or "Electronic",
-            "bpm": int(bpm) if bpm and bpm.isdigit() else 0,
+            "bpm": int(bpm) if bpm and bpm.isdigit() else (int(round(analysis["bpm"])) if analysis.get("bpm") else 0),
+            "key": analysis.get("key"),
+            "energy_level": analysis.get("energy_level"),
             "audio_url": audio_url,
             "artwork_url": artwork_url,
             # VIP fields - matching Spynners Track entity schema
@@ -5404,14 +8448,15 @@ async def upload_vip_track(
         print(f"[Admin VIP Upload] Track data: {track_data}")
         
         # Use the base44 entities API to create the Track directly
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with upstream_client("base44") as client:
             create_response = await client.post(
                 f"{BASE44_API_URL}/apps/{BASE44_APP_ID}/entities/Track",
                 json=track_data,
                 headers={
                     'Authorization': authorization,
                     'Content-Type': 'application/json'
-                }
+                },
+                timeout=60.0
             )
             
             print(f"[Admin VIP Upload] Create response status: {create_response.status_code}")
@@ -5722,10 +8767,11 @@ async def export_sessions_pdf(request: AnalyticsCSVRequest, authorization: str =
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with upstream_client("base44") as client:
                 response = await client.get(
                     f"{base44_url}?limit=10000",
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if response.status_code == 200:
@@ -5738,7 +8784,7 @@ async def export_sessions_pdf(request: AnalyticsCSVRequest, authorization: str =
                 elif response.status_code == 429:
                     print(f"[Analytics PDF] Rate limit - waiting and retrying...")
                     await asyncio.sleep(2)
-                    response2 = await client.get(f"{base44_url}?limit=10000", headers=headers)
+                    response2 = await client.get(f"{base44_url}?limit=10000", headers=headers, timeout=60.0)
                     if response2.status_code == 200:
                         data = response2.json()
                         sessions_data = data if isinstance(data, list) else data.get('items', data.get('data', []))
@@ -5795,10 +8841,11 @@ async def export_sessions_pdf(request: AnalyticsCSVRequest, authorization: str =
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with upstream_client("base44") as client:
                 response = await client.get(
                     f"{base44_plays_url}?limit=10000",
-                    headers=headers
+                    headers=headers,
+                    timeout=60.0
                 )
                 
                 if response.status_code == 200:
@@ -5811,7 +8858,7 @@ async def export_sessions_pdf(request: AnalyticsCSVRequest, authorization: str =
                 elif response.status_code == 429:
                     print(f"[Analytics PDF] Rate limit on TrackPlay - waiting...")
                     await asyncio.sleep(2)
-                    response2 = await client.get(f"{base44_plays_url}?limit=10000", headers=headers)
+                    response2 = await client.get(f"{base44_plays_url}?limit=10000", headers=headers, timeout=60.0)
                     if response2.status_code == 200:
                         data = response2.json()
                         all_plays = data if isinstance(data, list) else data.get('items', data.get('data', []))
@@ -6227,6 +9274,39 @@ async def health_check():
         "service": "SPYNNERS API",
         "version": "1.0.0",
         "acrcloud_configured": bool(ACRCLOUD_ACCESS_KEY and ACRCLOUD_ACCESS_SECRET),
+        "catalog": spynners_catalog.stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process counters: catalog index and lookup caches"""
+    return {
+        "catalog": spynners_catalog.stats(),
+        "caches": {cache.name: cache.stats() for cache in lookup_caches},
+        "quality_gate": {
+            "enabled": QUALITY_GATE_ENABLED and AUDIO_ANALYSIS_AVAILABLE,
+            "sample_rate": ACRCLOUD_SAMPLE_RATE,
+            **{k: v for k, v in quality_gate_stats.items() if k != "total_ms"},
+            # Share of samples the gate could inspect: saved_calls only covers these
+            "coverage": round(quality_gate_stats["checked"] / quality_gate_stats["samples"], 3) if quality_gate_stats["samples"] else None,
+            "avg_ms": round(quality_gate_stats["total_ms"] / quality_gate_stats["checked"], 2) if quality_gate_stats["checked"] else None
+        },
+        "streaming": stream_stats,
+        "ffmpeg": ffmpeg_metrics(),
+        "analysis": analysis_metrics(),
+        "offline_jobs": {
+            "workers": OFFLINE_JOB_WORKERS,
+            "concurrency": OFFLINE_CONCURRENCY,
+            "queued": offline_job_queue.qsize() if offline_job_queue else 0
+        },
+        "backfill": {
+            "running": list(backfill_tasks),
+            "concurrency": BACKFILL_CONCURRENCY,
+            "batch_size": BACKFILL_BATCH_SIZE
+        },
+        "spyn_sessions": spyn_session_stats,
+        "acrcloud_hedging": {"mode": ACRCLOUD_RECOGNITION_MODE, "delay_ms": ACRCLOUD_HEDGE_DELAY_MS, **hedge_stats},
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -9,6 +9,9 @@ import json
 import sys
 import os
 import base64
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Get backend URL from frontend .env file
@@ -361,6 +364,45 @@ def test_audio_concatenation():
         log_test("7. Audio Concatenation", False, f"Request failed: {str(e)}")
         return False
 
+def test_mongo_non_blocking():
+    """
+    Test 8: Mongo access doesn't block the event loop
+    Flood Mongo-backed endpoints (GET /api/chat/messages, /api/tracks, /api/playlists)
+    and check that GET /api/health latency stays close to its idle baseline
+    """
+    def timed_get(url, params=None):
+        started = time.perf_counter()
+        requests.get(url, params=params, timeout=30)
+        return time.perf_counter() - started
+    
+    try:
+        baseline = statistics.median(timed_get(f"{API_URL}/health") for _ in range(5))
+        
+        mongo_calls = [
+            (f"{API_URL}/chat/messages", {"user_id": "latency-test", "contact_id": "latency-test-2", "limit": 500}),
+            (f"{API_URL}/tracks", {"limit": 500}),
+            (f"{API_URL}/playlists", {"user_id": "latency-test"}),
+        ] * 10
+        
+        with ThreadPoolExecutor(max_workers=len(mongo_calls) + 5) as pool:
+            load = [pool.submit(timed_get, url, params) for url, params in mongo_calls]
+            time.sleep(0.05)
+            probes = [pool.submit(timed_get, f"{API_URL}/health") for _ in range(5)]
+            under_load = statistics.median(p.result() for p in probes)
+            mongo_latency = statistics.median(f.result() for f in load)
+        
+        details = f"health idle {baseline * 1000:.0f}ms, under Mongo load {under_load * 1000:.0f}ms (Mongo calls {mongo_latency * 1000:.0f}ms)"
+        # Health doesn't touch Mongo: it may only pay for network/CPU contention, not for Mongo round-trips
+        if under_load <= baseline + 0.5:
+            log_test("8. Mongo Non-Blocking", True, f"✅ {details}")
+            return True
+        log_test("8. Mongo Non-Blocking", False, f"Health latency grew with Mongo load: {details}")
+        return False
+        
+    except Exception as e:
+        log_test("8. Mongo Non-Blocking", False, f"Request failed: {str(e)}")
+        return False
+
 def run_all_tests():
     """Run all critical API tests for iOS native build preparation"""
     print("🧪 Running Critical API Tests for iOS Native Build...")
@@ -374,7 +416,8 @@ def run_all_tests():
         ("Admin Downloads", test_admin_downloads),
         ("Audio Recognition", test_audio_recognition),
         ("Nearby Places", test_nearby_places),
-        ("Audio Concatenation", test_audio_concatenation)
+        ("Audio Concatenation", test_audio_concatenation),
+        ("Mongo Non-Blocking", test_mongo_non_blocking)
     ]
     
     passed = 0
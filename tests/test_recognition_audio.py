@@ -0,0 +1,134 @@
+"""
+Recognition sample preparation for the formats the app actually records.
+
+The app records m4a/AAC (Audio.RecordingOptionsPresets.HIGH_QUALITY), which
+soundfile can't read: these snippets are decoded through ffmpeg. Needs the
+backend requirements and an ffmpeg binary; skipped otherwise.
+"""
+import asyncio
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+sys.path.insert(0, BACKEND_DIR)
+
+pytest.importorskip("numpy")
+pytest.importorskip("soundfile")
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+import audio_analysis  # noqa: E402
+import server  # noqa: E402
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which(server.FFMPEG_PATH) is None, reason="ffmpeg not installed")
+
+
+def fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def fresh_ffmpeg_slots():
+    # The slot semaphore is created lazily; each test runs in its own event loop
+    server.ffmpeg_slots = None
+    yield
+    server.ffmpeg_slots = None
+
+
+def test_soundfile_cannot_decode_app_recordings():
+    report = audio_analysis.prepare_sample(fixture("spyn_snippet.m4a"))
+    assert report["reason"] == audio_analysis.REASON_UNDECODABLE
+    assert not report["prepared"]
+
+
+@requires_ffmpeg
+def test_m4a_snippet_is_decoded_through_ffmpeg():
+    audio_data = fixture("spyn_snippet.m4a")
+    assert server.mp4_needs_seek(audio_data[:server.CONVERT_HEAD_BYTES])  # moov after mdat, like iOS
+    workspace = asyncio.run(server.decode_recognition_audio(audio_data))
+    assert workspace is not None
+    assert workspace.decoder == "ffmpeg"
+    assert workspace.sample_rate == (server.ACRCLOUD_SAMPLE_RATE or 16000)
+    assert 5.5 < workspace.duration < 6.5
+
+
+@requires_ffmpeg
+def test_m4a_snippet_is_trimmed_for_acrcloud(monkeypatch):
+    monkeypatch.setattr(server, "RECOGNITION_WINDOW_SECONDS", 3.0)
+    audio_data = fixture("spyn_snippet.m4a")
+    report = asyncio.run(server.prepare_recognition_sample(audio_data))
+    assert report["ok"] and report["reason"] is None
+    assert report["decoder"] == "ffmpeg"
+    assert report["trimmed"] and report["prepared"]
+    assert len(report["audio"]) < len(audio_data)
+    sample, audio_format, extra_fields = server.recognition_payload(audio_data, report)
+    assert sample[:4] == b"RIFF" and audio_format == "wav"
+    assert extra_fields["sample_rate"] == str(report["sample_rate"])
+
+
+@requires_ffmpeg
+def test_short_m4a_snippet_keeps_the_compressed_bytes():
+    # Shorter than the window and decoded at the ACRCloud rate: nothing to cut, the AAC is sent as is
+    audio_data = fixture("spyn_snippet.m4a")
+    report = asyncio.run(server.prepare_recognition_sample(audio_data))
+    assert report["ok"] and not report["prepared"]
+    sample, audio_format, _ = server.recognition_payload(audio_data, report)
+    assert sample is audio_data and audio_format == "m4a"
+
+
+@requires_ffmpeg
+def test_quality_gate_rejects_silent_m4a(monkeypatch):
+    monkeypatch.setattr(server, "QUALITY_GATE_ENABLED", True)
+    monkeypatch.setattr(server, "quality_gate_stats", {**server.quality_gate_stats, "by_reason": {}, "by_decoder": {}})
+    stats = server.quality_gate_stats
+    before = dict(stats)
+    report = asyncio.run(server.prepare_recognition_sample(fixture("silence.m4a")))
+    assert not report["ok"] and report["reason"] == audio_analysis.REASON_SILENCE
+    assert stats["checked"] == before["checked"] + 1
+    assert stats["saved_calls"] == before["saved_calls"] + 1
+    assert stats["undecodable"] == before["undecodable"]
+    assert stats["by_decoder"] == {"ffmpeg": 1}
+
+
+@requires_ffmpeg
+def test_undecodable_samples_are_not_counted_as_checked(monkeypatch):
+    monkeypatch.setattr(server, "quality_gate_stats", {**server.quality_gate_stats, "by_reason": {}, "by_decoder": {}})
+    stats = server.quality_gate_stats
+    before = dict(stats)
+    report = asyncio.run(server.prepare_recognition_sample(b"\x00not audio\x00" * 64))
+    assert report["ok"] and report["reason"] == audio_analysis.REASON_UNDECODABLE
+    assert stats["undecodable"] == before["undecodable"] + 1
+    assert stats["samples"] == before["samples"] + 1
+    assert stats["checked"] == before["checked"]
+
+
+@requires_ffmpeg
+def test_spyn_session_shortcut_works_for_m4a_snippets(monkeypatch):
+    calls = []
+
+    async def fake_recognize(audio_data, audio_format=None, known_result=None, workspace=None):
+        calls.append(workspace)
+        return {"success": True, "title": "Track", "artist": "Artist", "acrcloud_id": "acr-1",
+                "play_offset_ms": 30000, "duration_ms": 300000, "cached": False}
+
+    monkeypatch.setattr(server, "recognize_audio_data", fake_recognize)
+    audio_data = fixture("spyn_snippet.m4a")
+    session_key = "session:test-m4a"
+    server.spyn_sessions.invalidate(session_key)
+
+    async def run():
+        first = await server.recognize_in_session(audio_data, None, session_key)
+        second = await server.recognize_in_session(audio_data, None, session_key)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert calls[0] is not None and calls[0].decoder == "ffmpeg"  # Decoded once, reused by the gate
+    assert server.spyn_sessions.get(session_key)["signature"] is not None
+    assert not first.get("predicted")
+    assert second["predicted"] and second["same_track"]
+    assert len(calls) == 1  # ACRCloud skipped for the second snippet